@@ -2,8 +2,10 @@ import json
 import os
 
 from channels.generic.websocket import AsyncWebsocketConsumer
-from rest_framework_simplejwt.exceptions import TokenError
-from rest_framework_simplejwt.tokens import AccessToken
+from django.conf import settings
+
+from .profiling import ProfiledConsumerMixin
+from .relay import RelayGuardMixin
 
 
 def _qs_param(scope, key: str) -> str | None:
@@ -18,16 +20,22 @@ def _group(profile_id: str) -> str:
     return f"chat_{profile_id}"
 
 
-class ChatConsumer(AsyncWebsocketConsumer):
+class ChatConsumer(ProfiledConsumerMixin, RelayGuardMixin, AsyncWebsocketConsumer):
     """
     Frontend connects here:
         ws://<host>/ws/chat/<profile_id>/?token=<jwt_access_token>
 
     Receives messages from the AI agent via the shared channel group
-    and forwards frontend messages to the AI agent.
+    and forwards frontend messages to the AI agent. Frames are rate-limited
+    per connection and per user, and idle or unresponsive sockets are
+    closed (see api/relay.py).
     """
 
     async def connect(self):
+        # Deferred: simplejwt pulls in DRF settings and crypto backends.
+        from rest_framework_simplejwt.exceptions import TokenError
+        from rest_framework_simplejwt.tokens import AccessToken
+
         token_str = _qs_param(self.scope, "token")
         if not token_str:
             await self.close(code=4001)
@@ -44,12 +52,15 @@ class ChatConsumer(AsyncWebsocketConsumer):
 
         await self.channel_layer.group_add(self.group_name, self.channel_name)
         await self.accept()
+        self.guard_start(rate_limit_user=self.user_id, idle_timeout=settings.WS_IDLE_TIMEOUT)
 
     async def disconnect(self, close_code):
-        await self.channel_layer.group_discard(self.group_name, self.channel_name)
+        await self.guard_release()
 
     async def receive(self, text_data=None, bytes_data=None):
         """Frontend → agent: broadcast to group so the AgentConsumer picks it up."""
+        if not await self.guard_receive(text_data, bytes_data):
+            return
         await self.channel_layer.group_send(self.group_name, {
             "type": "to_agent",
             "text": text_data,
@@ -60,6 +71,7 @@ class ChatConsumer(AsyncWebsocketConsumer):
     async def to_frontend(self, event):
         """Agent → frontend: relay to the connected browser."""
         if event.get("text"):
+            self.guard_activity()
             await self.send(text_data=event["text"])
 
     async def to_agent(self, event):
@@ -67,7 +79,7 @@ class ChatConsumer(AsyncWebsocketConsumer):
         pass
 
 
-class AgentConsumer(AsyncWebsocketConsumer):
+class AgentConsumer(ProfiledConsumerMixin, RelayGuardMixin, AsyncWebsocketConsumer):
     """
     AI agents connect here:
         ws://<host>/ws/agent/<profile_id>/?secret=<AGENT_SECRET>
@@ -77,6 +89,10 @@ class AgentConsumer(AsyncWebsocketConsumer):
 
     Set AGENT_SECRET env var to require authentication (recommended in prod).
     When AGENT_SECRET is not set, any connection is accepted (dev mode).
+
+    With WS_AGENT_KEEPALIVE set, agents get {"type": "ping"} and must answer
+    {"type": "pong"} (or send anything) or be reaped; waiting for a chat is
+    never idleness.
     """
 
     async def connect(self):
@@ -92,12 +108,15 @@ class AgentConsumer(AsyncWebsocketConsumer):
 
         await self.channel_layer.group_add(self.group_name, self.channel_name)
         await self.accept()
+        self.guard_start(keepalive=settings.WS_AGENT_KEEPALIVE)
 
     async def disconnect(self, close_code):
-        await self.channel_layer.group_discard(self.group_name, self.channel_name)
+        await self.guard_release()
 
     async def receive(self, text_data=None, bytes_data=None):
         """Agent → frontend: broadcast to group so the ChatConsumer picks it up."""
+        if not await self.guard_receive(text_data, bytes_data):
+            return
         await self.channel_layer.group_send(self.group_name, {
             "type": "to_frontend",
             "text": text_data,
@@ -0,0 +1,318 @@
+"""
+Materialized per-viewer Discover feeds.
+
+A viewer's feed is the FEED_SIZE best-scoring other profiles, stored as
+FeedEntry rows and indexed by (feed, -score, candidate). Serving a page is
+one index range scan after a keyset cursor, so its cost depends on the page
+size, not on how many profiles exist.
+
+Feeds are built off the request path by `./manage.py build_feeds`. Each
+feed records the highest profile change_version it has scored (`cursor`),
+so a refresh rescores only the profiles changed since then. A feed is
+rebuilt from scratch when the viewer's own scoring fields change, detected
+through a digest of those fields (`basis`). build_feeds also creates feeds
+for human profiles that have none. Until a viewer's feed is built, requests
+get newest_page(), an indexed newest-first listing, rather than scoring
+every profile on the request path.
+
+Marking profiles seen and trimming to FEED_SIZE both remove entries, and
+rescoring only adds profiles that changed. A feed whose entry count falls
+below FEED_LOW_WATER is therefore rebuilt from the full unseen pool,
+provided that pool holds more than the feed does.
+
+Profiles the viewer has seen are recorded in Feed.seen as sorted, delta-
+encoded varints, so it grows with the number of profiles seen rather than
+with the largest profile id. Marking a profile seen drops its entry, and
+writes re-check `seen` under the feed's row lock, so serving a page trusts
+the entries and never reads `seen` at all.
+"""
+import functools
+import hashlib
+import heapq
+import json
+import math
+import operator
+from typing import NamedTuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from . import geo
+from .models import Feed, FeedEntry, Profile
+
+SCORING_FIELDS = ('age', 'looking_for', 'interests', 'latitude', 'longitude')
+_FEATURE_FIELDS = ('pk', *SCORING_FIELDS, 'compatibility_score', 'change_version')
+
+
+class Features(NamedTuple):
+    pk: int
+    age: int
+    looking_for: str
+    interests: frozenset
+    latitude: float | None
+    longitude: float | None
+    compatibility_score: float
+    change_version: int
+
+
+def _features(values) -> Features:
+    pk, age, looking_for, interests, lat, lon, compatibility, version = values
+    return Features(
+        pk, age, looking_for.strip().casefold(),
+        frozenset(str(i).casefold() for i in interests or ()),
+        lat, lon, compatibility, version,
+    )
+
+
+def load_features(queryset=None) -> list[Features]:
+    queryset = Profile.objects.all() if queryset is None else queryset
+    return [_features(row) for row in queryset.values_list(*_FEATURE_FIELDS)]
+
+
+def basis(profile) -> str:
+    """Digest of the viewer fields score() reads."""
+    data = json.dumps([getattr(profile, name) for name in SCORING_FIELDS], sort_keys=True, default=str)
+    return hashlib.md5(data.encode()).hexdigest()
+
+
+def score(viewer: Features, candidate: Features) -> float:
+    """Higher is a better match: shared interests, then distance, age and intent."""
+    total = 0.0
+    if viewer.interests and candidate.interests:
+        total += 50 * len(viewer.interests & candidate.interests) / len(viewer.interests | candidate.interests)
+    if viewer.latitude is not None and candidate.latitude is not None:
+        km = geo.haversine_km(viewer.latitude, viewer.longitude, candidate.latitude, candidate.longitude)
+        total += 25 * math.exp(-km / 50)
+    total += 15 * max(0.0, 1 - abs(viewer.age - candidate.age) / 10)
+    if viewer.looking_for and viewer.looking_for == candidate.looking_for:
+        total += 5
+    total += min(max(candidate.compatibility_score, 0.0), 100.0) / 20
+    return round(total, 6)
+
+
+# ── Seen set ──────────────────────────────────────────────────────────────────
+
+def seen_encode(ids) -> bytes:
+    """Sorted ids as LEB128 varints of the gaps between them."""
+    out = bytearray()
+    previous = 0
+    for n in sorted(set(ids)):
+        gap, previous = n - previous, n
+        while gap >= 0x80:
+            out.append(gap & 0x7f | 0x80)
+            gap >>= 7
+        out.append(gap)
+    return bytes(out)
+
+
+def seen_decode(blob: bytes) -> set[int]:
+    ids, n, gap, shift = set(), 0, 0, 0
+    for byte in blob:
+        gap |= (byte & 0x7f) << shift
+        shift += 7
+        if not byte & 0x80:
+            n += gap
+            ids.add(n)
+            gap = shift = 0
+    return ids
+
+
+def _locked_seen(feed) -> set[int]:
+    """The feed's seen set, read under its row lock. Call inside a transaction."""
+    return seen_decode(bytes(Feed.objects.select_for_update().values_list('seen', flat=True).get(pk=feed.pk)))
+
+
+# ── Building ──────────────────────────────────────────────────────────────────
+
+def _trim(feed):
+    """Drop entries ranked below FEED_SIZE."""
+    overflow = list(
+        feed.entries.order_by('-score', 'candidate_id').values_list('pk', flat=True)[settings.FEED_SIZE:]
+    )
+    if overflow:
+        FeedEntry.objects.filter(pk__in=overflow).delete()
+
+
+def build(viewer, candidates=None) -> Feed:
+    """(Re)build `viewer`'s feed from scratch. `candidates` lets callers share one load_features()."""
+    candidates = load_features() if candidates is None else candidates
+    feed, _ = Feed.objects.get_or_create(viewer=viewer)
+    seen = seen_decode(bytes(feed.seen))
+    me = _features([getattr(viewer, name) for name in _FEATURE_FIELDS])
+    best = heapq.nlargest(
+        settings.FEED_SIZE,
+        ((score(me, c), -c.pk) for c in candidates if c.pk != viewer.pk and c.pk not in seen),
+    )
+    with transaction.atomic():
+        # Profiles marked seen while we were scoring must not slip back in.
+        seen = _locked_seen(feed)
+        feed.entries.all().delete()
+        FeedEntry.objects.bulk_create(
+            [FeedEntry(feed=feed, candidate_id=-neg_pk, score=s) for s, neg_pk in best if -neg_pk not in seen]
+        )
+        feed.basis = basis(viewer)
+        feed.cursor = max((c.change_version for c in candidates), default=0)
+        feed.built_at = timezone.now()
+        Feed.objects.filter(pk=feed.pk).update(basis=feed.basis, cursor=feed.cursor, built_at=feed.built_at)
+    return feed
+
+
+def _apply_changes(feed, viewer, changed):
+    """Rescore the profiles in `changed` the feed has not seen yet."""
+    me = _features([getattr(viewer, name) for name in _FEATURE_FIELDS])
+    candidates = [c for c in changed if c.change_version > feed.cursor and c.pk != viewer.pk]
+    cursor = max([feed.cursor, *(c.change_version for c in changed)])
+    with transaction.atomic():
+        seen = _locked_seen(feed) if candidates else set()
+        rows = [FeedEntry(feed=feed, candidate_id=c.pk, score=score(me, c)) for c in candidates if c.pk not in seen]
+        if rows:
+            FeedEntry.objects.bulk_create(
+                rows, update_conflicts=True, unique_fields=['feed', 'candidate'], update_fields=['score'],
+            )
+            _trim(feed)
+        Feed.objects.filter(pk=feed.pk).update(cursor=cursor, built_at=timezone.now())
+    return len(rows)
+
+
+def refresh(*, batch_size=200, rebuild=False) -> dict:
+    """
+    Bring every feed up to date: full rebuilds where the viewer's scoring
+    fields changed (or `rebuild`), incremental rescoring of changed profiles
+    everywhere else.
+    """
+    stats = {'rebuilt': 0, 'refreshed': 0, 'rescored': 0, 'backfilled': 0}
+    missing = Profile.objects.filter(type='human', feed__isnull=True).values_list('pk', flat=True)
+    Feed.objects.bulk_create([Feed(viewer_id=pk) for pk in missing.iterator()], ignore_conflicts=True)
+    all_features = None
+    last_pk = 0
+    while True:
+        feeds = list(
+            Feed.objects.select_related('viewer').defer('seen').filter(pk__gt=last_pk).order_by('pk')[:batch_size]
+        )
+        if not feeds:
+            return stats
+        last_pk = feeds[-1].pk
+        stale = [f for f in feeds if rebuild or f.built_at is None or f.basis != basis(f.viewer)]
+        current = [f for f in feeds if f not in stale]
+        if stale:
+            all_features = load_features() if all_features is None else all_features
+            for feed in stale:
+                build(feed.viewer, all_features)
+                stats['rebuilt'] += 1
+        if current:
+            since = min(f.cursor for f in current)
+            changed = load_features(Profile.objects.filter(change_version__gt=since))
+            for feed in current:
+                stats['rescored'] += _apply_changes(feed, feed.viewer, changed)
+                stats['refreshed'] += 1
+            sizes = dict(
+                FeedEntry.objects.filter(feed__in=current).values_list('feed').annotate(n=Count('pk'))
+            )
+            low = [f for f in current if sizes.get(f.pk, 0) < settings.FEED_LOW_WATER]
+            if low:
+                all_features = load_features() if all_features is None else all_features
+                for feed in low:
+                    seen = seen_decode(bytes(feed.seen))
+                    pool = sum(1 for c in all_features if c.pk != feed.viewer_id and c.pk not in seen)
+                    if pool > sizes.get(feed.pk, 0):
+                        build(feed.viewer, all_features)
+                        stats['backfilled'] += 1
+
+
+# ── Serving ───────────────────────────────────────────────────────────────────
+
+def get_feed(viewer) -> Feed | None:
+    """
+    The viewer's feed, or None until build_feeds has built it. Asking
+    creates an empty feed, so the next run builds it even for a viewer who
+    signed up after the last one.
+    """
+    feed, _ = Feed.objects.defer('seen').get_or_create(viewer=viewer)
+    return feed if feed.built_at is not None else None
+
+
+def candidate_filter(*, q='', kind='', interests=(), prefix='') -> Q:
+    """
+    The Discover page's filters as a Q over Profile fields, reached through
+    `prefix` ('candidate__' from FeedEntry): `q` in the name, location or
+    interests, profile `kind` ('human'/'ai'), and any one of `interests`.
+    """
+    where = Q()
+    if q:
+        where &= (
+            Q(**{f'{prefix}display_name__icontains': q})
+            | Q(**{f'{prefix}location__icontains': q})
+            | Q(**{f'{prefix}interests__icontains': q})
+        )
+    if kind:
+        where &= Q(**{f'{prefix}type': kind})
+    if interests:
+        # Matched against the stored JSON text, quotes included, so a tag only matches whole.
+        where &= functools.reduce(
+            operator.or_, (Q(**{f'{prefix}interests__icontains': json.dumps(tag)}) for tag in interests),
+        )
+    return where
+
+
+def parse_cursor(cursor: str):
+    """(score, candidate_id) from a page cursor. Raises ValueError."""
+    value, candidate_id = cursor.rsplit(':', 1)
+    return float(value), int(candidate_id)
+
+
+def page(feed, cursor=None, limit=20, filters=None):
+    """
+    ([candidate ids], next cursor or None): the next `limit` entries after
+    `cursor` in rank order, optionally only candidates matching `filters`
+    (candidate_filter() keywords). Seen profiles have no entries,
+    so a page is short only at the end of the feed. A filtered page may scan
+    past non-matching entries, at most the FEED_SIZE the feed holds.
+    """
+    entries = feed.entries.order_by('-score', 'candidate_id')
+    if filters:
+        entries = entries.filter(candidate_filter(prefix='candidate__', **filters))
+    if cursor:
+        value, candidate_id = parse_cursor(cursor)
+        entries = entries.filter(Q(score__lt=value) | Q(score=value, candidate_id__gt=candidate_id))
+    rows = list(entries.values_list('score', 'candidate_id')[:limit + 1])
+    more = len(rows) > limit
+    rows = rows[:limit]
+    ids = [pk for _, pk in rows]
+    next_cursor = f'{rows[-1][0]!r}:{rows[-1][1]}' if more else None
+    return ids, next_cursor
+
+
+NEWEST_CURSOR_PREFIX = 'new:'
+
+
+def newest_page(viewer, cursor=None, limit=20, filters=None):
+    """
+    page() for a viewer whose feed is not built yet: other profiles, newest
+    first, skipping seen ones and those not matching `filters`. One
+    primary-key range scan after the cursor.
+    """
+    seen = Feed.objects.filter(viewer=viewer).values_list('seen', flat=True).first()
+    profiles = Profile.objects.exclude(pk=viewer.pk).order_by('-pk')
+    if filters:
+        profiles = profiles.filter(candidate_filter(**filters))
+    if seen:
+        profiles = profiles.exclude(pk__in=seen_decode(bytes(seen)))
+    if cursor:
+        profiles = profiles.filter(pk__lt=int(cursor.removeprefix(NEWEST_CURSOR_PREFIX)))
+    ids = list(profiles.values_list('pk', flat=True)[:limit + 1])
+    next_cursor = f'{NEWEST_CURSOR_PREFIX}{ids[limit - 1]}' if len(ids) > limit else None
+    return ids[:limit], next_cursor
+
+
+def mark_seen(viewer, profile_ids) -> None:
+    """Record profiles as seen and drop them from the viewer's feed."""
+    profile_ids = [pk for pk in set(profile_ids) if pk != viewer.pk]
+    if not profile_ids:
+        return
+    with transaction.atomic():
+        feed, _ = Feed.objects.select_for_update().get_or_create(viewer=viewer)
+        feed.seen = seen_encode(seen_decode(bytes(feed.seen)) | set(profile_ids))
+        Feed.objects.filter(pk=feed.pk).update(seen=feed.seen)
+        feed.entries.filter(candidate_id__in=profile_ids).delete()
@@ -0,0 +1,196 @@
+"""
+Offline location resolution and geohash proximity queries.
+
+Profile.location is free text. At save time it is resolved against the
+bundled gazetteer (api/data/gazetteer.csv) and the coordinates are stored on
+the profile together with a geohash. Every point inside a geohash cell shares
+the cell's prefix, so a "near me" query becomes a handful of indexed prefix
+lookups on that column instead of a scan of the whole table.
+"""
+import csv
+import math
+from functools import lru_cache
+from pathlib import Path
+
+GAZETTEER_PATH = Path(__file__).resolve().parent / "data" / "gazetteer.csv"
+
+GEOHASH_PRECISION = 9
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+# ── Gazetteer ─────────────────────────────────────────────────────────────────
+
+def _normalize(text: str) -> str:
+    return " ".join(text.replace(".", "").lower().split())
+
+
+@lru_cache(maxsize=1)
+def _gazetteer() -> dict[str, tuple[float, float]]:
+    """Map every accepted spelling of a place to its (lat, lon).
+
+    A place is reachable as "name", "name, region", "name, country" and
+    "name, region, country". When two places share a key the first row in
+    the file wins, so local cities are listed first.
+    """
+    index: dict[str, tuple[float, float]] = {}
+    with open(GAZETTEER_PATH, newline="", encoding="utf-8") as fh:
+        for row in csv.DictReader(fh):
+            coords = (float(row["latitude"]), float(row["longitude"]))
+            name, region, country = (_normalize(row[k]) for k in ("name", "region", "country"))
+            for key in (
+                name,
+                f"{name}, {region}",
+                f"{name}, {country}",
+                f"{name}, {region}, {country}",
+            ):
+                index.setdefault(key, coords)
+    return index
+
+
+def resolve_location(text: str) -> tuple[float, float] | None:
+    """Resolve free-text location to (lat, lon), or None if unknown."""
+    if not text:
+        return None
+    parts = [p for p in (_normalize(p) for p in text.split(",")) if p]
+    if not parts:
+        return None
+    index = _gazetteer()
+    # Most specific first: "Waterloo, ON, Canada" → "waterloo, on, canada",
+    # "waterloo, on", "waterloo".
+    for n in range(len(parts), 0, -1):
+        coords = index.get(", ".join(parts[:n]))
+        if coords:
+            return coords
+    return None
+
+
+# ── Geohash ───────────────────────────────────────────────────────────────────
+
+def geohash_encode(lat: float, lon: float, precision: int = GEOHASH_PRECISION) -> str:
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            if lon >= mid:
+                value = (value << 1) | 1
+                lon_lo = mid
+            else:
+                value <<= 1
+                lon_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                value = (value << 1) | 1
+                lat_lo = mid
+            else:
+                value <<= 1
+                lat_hi = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            bits = 0
+            value = 0
+    return "".join(chars)
+
+
+def _cell_size_deg(precision: int) -> tuple[float, float]:
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+
+def geohash_block(lat: float, lon: float, precision: int) -> set[str]:
+    """The cell containing (lat, lon) plus its eight neighbours."""
+    if precision == 0:
+        return {""}
+    dlat, dlon = _cell_size_deg(precision)
+    cells = set()
+    for i in (-1, 0, 1):
+        for j in (-1, 0, 1):
+            nlat = lat + i * dlat
+            if not -90 <= nlat <= 90:
+                continue
+            nlon = (lon + j * dlon + 180) % 360 - 180
+            cells.add(geohash_encode(nlat, nlon, precision))
+    return cells
+
+
+def block_radius_km(lat: float, precision: int) -> float:
+    """Distance from any point guaranteed to be covered by its 3×3 block."""
+    if precision == 0:
+        return math.inf
+    dlat, dlon = _cell_size_deg(precision)
+    return min(dlat, dlon * math.cos(math.radians(min(abs(lat), 89.9)))) * KM_PER_DEGREE
+
+
+def precision_for_radius(lat: float, radius_km: float) -> int:
+    """Finest precision whose 3×3 block still covers radius_km around lat."""
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        if block_radius_km(lat, precision) >= radius_km:
+            return precision
+    return 0
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+# ── Queryset helpers ──────────────────────────────────────────────────────────
+
+def _prefix_filter(cells):
+    from django.db.models import Q
+
+    q = Q()
+    for cell in cells:
+        if not cell:
+            return Q(geohash__gt="")
+        # LIKE 'cell%' — served by the geohash index (Django adds a
+        # pattern_ops index for it on PostgreSQL).
+        q |= Q(geohash__startswith=cell)
+    return q
+
+
+def _with_distance(profiles, lat, lon):
+    out = []
+    for p in profiles:
+        p.distance_km = haversine_km(lat, lon, p.latitude, p.longitude)
+        out.append(p)
+    out.sort(key=lambda p: p.distance_km)
+    return out
+
+
+def within_radius(queryset, lat: float, lon: float, radius_km: float) -> list:
+    """Profiles within radius_km of (lat, lon), nearest first."""
+    cells = geohash_block(lat, lon, precision_for_radius(lat, radius_km))
+    candidates = queryset.filter(_prefix_filter(cells))
+    return [p for p in _with_distance(candidates, lat, lon) if p.distance_km <= radius_km]
+
+
+def nearest(queryset, lat: float, lon: float, k: int) -> list:
+    """The k profiles closest to (lat, lon), nearest first.
+
+    Starts from a small block and widens it until the k-th candidate lies
+    inside the radius that block is guaranteed to cover.
+    """
+    for precision in range(GEOHASH_PRECISION - 2, -1, -1):
+        cells = geohash_block(lat, lon, precision)
+        candidates = queryset.filter(_prefix_filter(cells))
+        if precision and candidates.count() < k:
+            continue
+        ranked = _with_distance(candidates, lat, lon)
+        if len(ranked) < k or ranked[k - 1].distance_km <= block_radius_km(lat, precision):
+            return ranked[:k]
+    return []
@@ -0,0 +1,100 @@
+"""
+Image processing helpers that run outside Django.
+
+Nothing here touches settings or models, so the functions can be handed to a
+ProcessPoolExecutor with the `spawn` start method without setting up Django
+in the workers.
+"""
+import io
+import math
+import os
+import tempfile
+
+from PIL import Image, ImageOps
+
+# Formats written back as-is; anything else is re-encoded as JPEG.
+_KEEP_FORMATS = {'JPEG': '.jpg', 'PNG': '.png', 'WEBP': '.webp', 'GIF': '.gif'}
+_EXIF_ORIENTATION = 0x0112
+
+# What Pillow raises for files it can't (or won't) decode.
+IMAGE_ERRORS = (OSError, ValueError, Image.DecompressionBombError)
+
+
+def normalize_image(path, max_size):
+    """
+    Validate the image at `path` and make it upload-ready.
+
+    Returns (bytes, extension). Images that are already upright and no larger
+    than `max_size` pixels on their long side are returned byte-for-byte;
+    others are rotated per their EXIF orientation, downscaled and re-encoded.
+    Raises OSError / Image.DecompressionBombError for unreadable files.
+    """
+    with open(path, 'rb') as fh:
+        data = fh.read()
+    with Image.open(io.BytesIO(data)) as img:
+        fmt = img.format
+        rotated = img.getexif().get(_EXIF_ORIENTATION, 1) != 1
+        scale = min(1.0, max_size / max(img.size))
+        if fmt in _KEEP_FORMATS and not rotated and scale == 1.0:
+            # Decode anyway so truncated files are caught, not just bad headers.
+            # JPEG can decode at 1/8 scale, which still reads every scan.
+            img.draft(img.mode, (max(1, img.width // 8), max(1, img.height // 8)))
+            img.load()
+            return data, _KEEP_FORMATS[fmt]
+        # Let JPEG decode straight to the smallest scale still >= the target.
+        img.draft(img.mode, (math.ceil(img.width * scale), math.ceil(img.height * scale)))
+        upright = ImageOps.exif_transpose(img)
+        upright.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+        if fmt not in _KEEP_FORMATS:
+            fmt = 'JPEG'
+        if fmt == 'JPEG' and upright.mode not in ('RGB', 'L'):
+            upright = upright.convert('RGB')
+        out = io.BytesIO()
+        upright.save(out, fmt, **({'quality': 88, 'optimize': True} if fmt == 'JPEG' else {}))
+    return out.getvalue(), _KEEP_FORMATS[fmt]
+
+
+def dhash(fp) -> int:
+    """
+    64-bit difference hash of an image (path or open binary file).
+
+    The upright image is reduced to 9x8 grey pixels and each bit records
+    whether a pixel is brighter than its right-hand neighbour. Re-encoded,
+    resized or lightly edited copies land within a few bits of each other.
+    """
+    with Image.open(fp) as img:
+        img.draft('L', (64, 64))  # JPEG: decode at reduced scale, greyscale
+        small = ImageOps.exif_transpose(img).convert('L').resize((9, 8), Image.Resampling.LANCZOS)
+    px = small.tobytes()
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            value = (value << 1) | (px[row * 9 + col] > px[row * 9 + col + 1])
+    return value
+
+
+def normalize_and_hash(path, max_size):
+    """normalize_image() plus the dHash of the result, for the import pool."""
+    data, ext = normalize_image(path, max_size)
+    return data, ext, dhash(io.BytesIO(data))
+
+
+def normalize_to_file(path, max_size, staging_dir):
+    """
+    normalize_and_hash(), writing the image to a new file in `staging_dir`
+    instead of returning it, so only (staged path, extension, hash) travel
+    back from the import pool.
+    """
+    data, ext, phash = normalize_and_hash(path, max_size)
+    fd, staged = tempfile.mkstemp(suffix=ext, dir=staging_dir)
+    with os.fdopen(fd, 'wb') as fh:
+        fh.write(data)
+    return staged, ext, phash
+
+
+def dhash_file(path):
+    """dhash() of the file at `path`, or None if it isn't a readable image (backfill pool)."""
+    try:
+        return dhash(path)
+    except IMAGE_ERRORS:
+        return None
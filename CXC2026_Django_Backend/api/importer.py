@@ -0,0 +1,310 @@
+"""
+Bulk import of AI profiles from a JSONL manifest plus an image directory.
+
+One persona per manifest line; image paths are relative to the image
+directory and every key but `email` is optional:
+
+    {"email": "nova@ai.example", "display_name": "Nova", "age": 27,
+     "bio": "...", "location": "Waterloo, ON", "interests": ["jazz"],
+     "avatar": "nova/avatar.jpg", "banner": "nova/banner.jpg",
+     "personal": ["nova/1.jpg", "nova/2.jpg"]}
+
+The email is the idempotency key: rows whose user already exists are
+skipped, so an interrupted import resumes by running it again.
+
+Images are validated, normalized and perceptually hashed in a process pool
+(api/imaging.py) one batch ahead of the database work. Workers write each
+image to a staging directory under MEDIA_ROOT and hand back only its path
+and hash; storing it is then a rename, so image data never piles up in the
+parent process. Each batch's users, profiles and bucket
+rows are then written with bulk_create in a single transaction. bulk_create
+bypasses Profile.save() and the signals, so this module fills in what they
+would: coordinates, change versions, image hashes, and an unusable password (AI personas
+never log in).
+"""
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import traceback
+from datetime import timedelta
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+from django.core.validators import validate_email
+from django.db import connection, transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from .imaging import normalize_to_file
+from .models import (
+    BucketAvatarImage, BucketBannerImage, BucketPersonalImage,
+    ImportJob, Profile, next_change_versions,
+)
+
+PROFILE_FIELDS = (
+    'display_name', 'age', 'gender', 'bio', 'location', 'looking_for', 'interests',
+    'avatar_x', 'avatar_y', 'banner_x', 'banner_y',
+)
+IMAGE_KEYS = (('avatar', BucketAvatarImage), ('banner', BucketBannerImage), ('personal', BucketPersonalImage))
+MAX_REPORTED_ERRORS = 100
+
+
+class _InlineExecutor:
+    """Executor stand-in for workers=0: runs each call immediately."""
+
+    def submit(self, fn, *args):
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as exc:
+            future.set_exception(exc)
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+def resolve_import_path(relative: str) -> Path:
+    """Resolve a path given to the admin API; it must exist inside IMPORT_ROOT."""
+    root = Path(settings.IMPORT_ROOT).resolve()
+    path = (root / relative).resolve()
+    if not path.is_relative_to(root):
+        raise ValueError(f'{relative!r} is outside the import directory.')
+    if not path.exists():
+        raise ValueError(f'{relative!r} does not exist.')
+    return path
+
+
+# ── Manifest parsing ──────────────────────────────────────────────────────────
+
+def _parse_row(line, images_dir):
+    data = json.loads(line)
+    if not isinstance(data, dict):
+        raise ValueError('expected a JSON object')
+    email = str(data.get('email', '')).strip().lower()
+    validate_email(email)
+    max_length = User._meta.get_field('username').max_length
+    if len(email) > max_length:
+        raise ValueError(f'email: longer than {max_length} characters')
+
+    fields = {}
+    for name in PROFILE_FIELDS:
+        if name in data:
+            # Field.clean applies the same max_length/type checks a form would.
+            fields[name] = Profile._meta.get_field(name).clean(data[name], None)
+
+    images = []
+    for key, model in IMAGE_KEYS:
+        value = data.get(key) or []
+        for rel in [value] if isinstance(value, str) else value:
+            if images_dir is None:
+                raise ValueError(f'{key}: no image directory given')
+            path = (images_dir / rel).resolve()
+            if not path.is_relative_to(images_dir):
+                raise ValueError(f'{key}: {rel!r} is outside the image directory')
+            images.append((key, model, path))
+    return {'email': email, 'fields': fields, 'images': images}
+
+
+def _read_manifest(manifest, images_dir, stats):
+    """Yield parsed rows with their line numbers; bad lines are counted and reported."""
+    with open(manifest, encoding='utf-8') as fh:
+        for line_no, line in enumerate(fh, 1):
+            if not line.strip():
+                continue
+            try:
+                row = _parse_row(line, images_dir)
+            except (ValueError, ValidationError) as exc:
+                _fail(stats, line_no, exc)
+                continue
+            row['line'] = line_no
+            yield row
+
+
+def _fail(stats, line_no, exc):
+    stats['failed'] += 1
+    if len(stats['errors']) < MAX_REPORTED_ERRORS:
+        message = '; '.join(exc.messages) if isinstance(exc, ValidationError) else str(exc)
+        stats['errors'].append({'line': line_no, 'error': message})
+
+
+# ── Batches ───────────────────────────────────────────────────────────────────
+
+def _submit_batch(rows, pool, seen, stats, staging_dir):
+    """Drop rows already imported, then queue their images on the pool."""
+    existing = set(
+        User.objects.filter(username__in=[r['email'] for r in rows]).values_list('username', flat=True)
+    )
+    fresh = []
+    for row in rows:
+        if row['email'] in existing or row['email'] in seen:
+            stats['skipped'] += 1
+            continue
+        seen.add(row['email'])
+        row['futures'] = [
+            (key, model, pool.submit(normalize_to_file, str(path), settings.IMPORT_IMAGE_MAX_SIZE, staging_dir))
+            for key, model, path in row['images']
+        ]
+        fresh.append(row)
+    return fresh
+
+
+def _first_image(model):
+    return Subquery(model.objects.filter(profile=OuterRef('pk')).order_by('pk').values('pk')[:1])
+
+
+def _move_into_storage(img, staged, filename):
+    """Rename a staged file to the storage name `img.file` would give it."""
+    name = default_storage.get_available_name(img.file.field.generate_filename(img, filename))
+    target = Path(default_storage.path(name))
+    target.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(staged, target)
+    if settings.FILE_UPLOAD_PERMISSIONS is not None:
+        os.chmod(target, settings.FILE_UPLOAD_PERMISSIONS)
+    img.file.name = name
+
+
+def _store_batch(rows, stats):
+    """
+    Move one batch's staged image files into place and write its rows.
+    Files are removed again if the insert fails.
+    """
+    profiles, emails, images, saved = [], [], [], []
+    try:
+        for row in rows:
+            errors = [future.exception() for _, _, future in row['futures']]
+            if any(errors):
+                # Its other staged files are removed with the staging directory.
+                _fail(stats, row['line'], next(exc for exc in errors if exc))
+                continue
+            profile = Profile(type='ai', **row['fields'])
+            profile.resolve_location()
+            for key, model, future in row['futures']:
+                staged, ext, phash = future.result()
+                img = model(profile=profile)
+                img.set_phash(phash)
+                _move_into_storage(img, staged, f'{key}{ext}')
+                saved.append(img.file.name)
+                images.append(img)
+            profiles.append(profile)
+            emails.append(row['email'])
+
+        if not profiles:
+            return
+        with transaction.atomic():
+            users = User.objects.bulk_create([
+                User(username=email, email=email, password=make_password(None)) for email in emails
+            ])
+            for profile, user, version in zip(profiles, users, next_change_versions(len(profiles))):
+                profile.user = user
+                profile.change_version = version
+            Profile.objects.bulk_create(profiles)
+            for _, model in IMAGE_KEYS:
+                model.objects.bulk_create([img for img in images if type(img) is model])
+            # The first avatar/banner listed becomes the active one: one UPDATE
+            # per column instead of a per-row CASE from bulk_update.
+            Profile.objects.filter(pk__in=[p.pk for p in profiles]).update(
+                active_avatar=_first_image(BucketAvatarImage), active_banner=_first_image(BucketBannerImage),
+            )
+    except BaseException:
+        for name in saved:
+            default_storage.delete(name)
+        raise
+    stats['created'] += len(profiles)
+
+
+def run_import(manifest, images_dir=None, *, batch_size=1000, workers=None, progress=None) -> dict:
+    """
+    Import the manifest. `workers` sizes the image process pool (default: CPU
+    count, 0 processes images inline). `progress(stats)` is called after each
+    batch. Returns {'created', 'skipped', 'failed', 'errors'}.
+    """
+    images_dir = Path(images_dir).resolve() if images_dir else None
+    stats = {'created': 0, 'skipped': 0, 'failed': 0, 'errors': []}
+    if workers == 0:
+        pool = _InlineExecutor()
+    else:
+        # spawn: safe from threaded callers (the admin API), and imaging.py needs no Django setup.
+        pool = ProcessPoolExecutor(workers or os.cpu_count(), mp_context=multiprocessing.get_context('spawn'))
+
+    rows = _read_manifest(manifest, images_dir, stats)
+    seen = set()
+    # Inside MEDIA_ROOT so moving a staged file into its bucket is a rename.
+    Path(settings.MEDIA_ROOT).mkdir(parents=True, exist_ok=True)
+    staging_dir = tempfile.mkdtemp(prefix='.import-', dir=settings.MEDIA_ROOT)
+    try:
+        pending = None
+        while batch := list(islice(rows, batch_size)):
+            queued = _submit_batch(batch, pool, seen, stats, staging_dir)
+            if pending is not None:
+                _store_batch(pending, stats)
+                if progress:
+                    progress(stats)
+            pending = queued
+        if pending is not None:
+            _store_batch(pending, stats)
+            if progress:
+                progress(stats)
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+        shutil.rmtree(staging_dir, ignore_errors=True)  # images of rows that were never stored
+    return stats
+
+
+# ── Admin API jobs ────────────────────────────────────────────────────────────
+
+def start_job(job):
+    """
+    Run `job` in its own process (`import_profiles --job`), in a new session
+    so recycling or restarting the web worker does not take it down.
+    """
+    return subprocess.Popen(
+        [sys.executable, str(settings.BASE_DIR / 'manage.py'), 'import_profiles', '--job', str(job.pk)],
+        stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True,
+    )
+
+
+def fail_stale_jobs() -> int:
+    """
+    Mark unfinished jobs whose process stopped reporting (e.g. the machine
+    restarted) as failed. Running jobs heartbeat after every batch.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.IMPORT_JOB_STALE_SECONDS)
+    return ImportJob.objects.filter(status__in=('pending', 'running'), heartbeat_at__lt=cutoff).update(
+        status='failed', error='The import process stopped responding.', finished_at=timezone.now(),
+    )
+
+
+def run_job(job_id):
+    jobs = ImportJob.objects.filter(pk=job_id)
+
+    def report(stats):
+        jobs.update(
+            created=stats['created'], skipped=stats['skipped'], failed=stats['failed'], errors=stats['errors'],
+            heartbeat_at=timezone.now(),
+        )
+
+    try:
+        jobs.update(status='running', heartbeat_at=timezone.now())
+        job = jobs.get()
+        stats = run_import(
+            resolve_import_path(job.manifest),
+            resolve_import_path(job.images_dir) if job.images_dir else None,
+            progress=report,
+        )
+        report(stats)
+        jobs.update(status='done', finished_at=timezone.now())
+    except Exception:
+        jobs.update(status='failed', error=traceback.format_exc(limit=5), finished_at=timezone.now())
+    finally:
+        connection.close()
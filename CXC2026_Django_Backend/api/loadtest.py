@@ -0,0 +1,220 @@
+"""
+In-process load generator behind `./manage.py benchmark`.
+
+Everything runs inside this process: REST calls go through the Django test
+client (full middleware/auth/serializer stack, no sockets) and WebSocket
+traffic through channels' WebsocketCommunicator against config.asgi.
+"""
+import asyncio
+import contextlib
+import io
+import math
+import random
+import resource
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.db import close_old_connections
+from django.test import Client, override_settings
+
+from .models import BucketAvatarImage, Profile
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(pct / 100 * len(sorted_values))
+    return sorted_values[max(0, min(len(sorted_values), rank) - 1)]
+
+
+def max_rss_mb():
+    # ru_maxrss is KiB on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def summarize(name, latencies_ms, errors, wall_s, error_types=None):
+    latencies_ms = sorted(latencies_ms)
+    count = len(latencies_ms)
+    return {
+        'scenario': name,
+        'requests': count,
+        'errors': errors,
+        'error_types': dict(sorted((error_types or {}).items())),
+        'rps': count / wall_s if wall_s else 0.0,
+        'p50_ms': percentile(latencies_ms, 50),
+        'p95_ms': percentile(latencies_ms, 95),
+        'p99_ms': percentile(latencies_ms, 99),
+        'max_rss_mb': max_rss_mb(),
+    }
+
+
+def sample_jpeg(size=(640, 480)):
+    from PIL import Image
+
+    buf = io.BytesIO()
+    Image.new('RGB', size, (200, 120, 80)).save(buf, 'JPEG', quality=80)
+    return buf.getvalue()
+
+
+# ── Seeding ───────────────────────────────────────────────────────────────────
+
+def seed(count, with_images=True):
+    """Create `count` users with profiles (and an active avatar each). Returns profile ids."""
+    jpeg = sample_jpeg() if with_images else None
+    locations = ['Waterloo', 'Toronto', 'Kitchener', 'Guelph', 'Hamilton', '']
+    ids = []
+    for i in range(count):
+        email = f'bench{i}@example.com'
+        user = User.objects.create_user(username=email, email=email, password='bench-password')
+        profile = Profile.objects.create(
+            user=user, display_name=f'Bench {i}', age=18 + i % 40,
+            bio='Benchmark profile. ' * 5, location=locations[i % len(locations)],
+            interests=['music', 'hiking', 'coffee'][: 1 + i % 3],
+            type='ai' if i % 4 == 0 else 'human',
+        )
+        if jpeg:
+            img = BucketAvatarImage(profile=profile)
+            img.file.save(f'bench{i}.jpg', ContentFile(jpeg), save=True)
+            profile.active_avatar = img
+            profile.save(update_fields=['active_avatar'])
+        ids.append(profile.pk)
+    return ids
+
+
+def access_token(user):
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    return str(AccessToken.for_user(user))
+
+
+# ── REST scenarios ────────────────────────────────────────────────────────────
+
+def _rest_scenarios(profile_ids, jpeg):
+    return {
+        'profiles_list': lambda c, rng: c.get('/api/profiles/'),
+        'profile_detail': lambda c, rng: c.get(f'/api/profiles/{rng.choice(profile_ids)}/'),
+        'my_profile_put': lambda c, rng: c.put(
+            '/api/profiles/me/', {'bio': f'Updated {rng.random()}'}, content_type='application/json',
+        ),
+        'avatar_upload': lambda c, rng: c.post(
+            '/api/profiles/me/avatar/', {'avatar': ContentFile(jpeg, name='upload.jpg')},
+        ),
+    }
+
+
+def run_rest(name, profile_ids, tokens, requests, concurrency):
+    """Fire `requests` calls of scenario `name` from `concurrency` threads."""
+    jpeg = sample_jpeg((320, 320))
+    call = _rest_scenarios(profile_ids, jpeg)[name]
+    local = threading.local()
+    lock = threading.Lock()
+    latencies, error_types = [], Counter()
+
+    def one(i):
+        if not hasattr(local, 'client'):
+            local.client = Client(
+                HTTP_HOST='localhost', HTTP_AUTHORIZATION=f'Bearer {tokens[i % len(tokens)]}',
+            )
+            local.rng = random.Random(i)
+        start = time.perf_counter()
+        try:
+            # The test client re-raises view exceptions; count them like a 500.
+            status = call(local.client, local.rng).status_code
+            error = f'HTTP {status}' if status >= 400 else None
+        except Exception as exc:
+            error = type(exc).__name__
+        elapsed = (time.perf_counter() - start) * 1000
+        with lock:
+            latencies.append(elapsed)
+            if error:
+                error_types[error] += 1
+
+    def worker_one(i):
+        try:
+            one(i)
+        finally:
+            close_old_connections()
+
+    start = time.perf_counter()
+    if concurrency <= 1:
+        for i in range(requests):
+            one(i)
+    else:
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(worker_one, range(requests)))
+    return summarize(name, latencies, error_types.total(), time.perf_counter() - start, error_types)
+
+
+REST_SCENARIOS = ('profiles_list', 'profile_detail', 'my_profile_put', 'avatar_upload')
+
+
+# ── WebSocket scenario ────────────────────────────────────────────────────────
+
+async def _ws_relay(pairs, messages, tokens):
+    from channels.testing import WebsocketCommunicator
+
+    from config.asgi import application
+
+    latencies, errors = [], 0
+
+    async def pair(i):
+        nonlocal errors
+        profile_id = 1_000_000 + i  # one relay group per pair
+        agent = WebsocketCommunicator(application, f'/ws/agent/{profile_id}/')
+        browser = WebsocketCommunicator(
+            application, f'/ws/chat/{profile_id}/?token={tokens[i % len(tokens)]}',
+        )
+        try:
+            if not (await agent.connect(timeout=30))[0] or not (await browser.connect(timeout=30))[0]:
+                errors += 1
+                return
+            for n in range(messages):
+                start = time.perf_counter()
+                await browser.send_to(text_data=f'{{"type":"message","n":{n}}}')
+                # Echo agent: bounce whatever arrives straight back.
+                await agent.send_to(text_data=await agent.receive_from(timeout=30))
+                await browser.receive_from(timeout=30)
+                latencies.append((time.perf_counter() - start) * 1000)
+        except Exception:
+            errors += 1
+        finally:
+            for communicator in (browser, agent):
+                # A communicator whose app already failed raises on disconnect.
+                with contextlib.suppress(Exception, asyncio.CancelledError):
+                    await communicator.disconnect()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(pair(i) for i in range(pairs)))
+    return latencies, errors, time.perf_counter() - start
+
+
+def run_websocket(pairs, messages, tokens):
+    """`pairs` browsers each exchanging `messages` round trips with an echo agent."""
+    # Measures relay throughput, so the per-user rate limits (api/relay.py) are off.
+    with override_settings(WS_RATE_LIMIT_ENABLED=False):
+        latencies, errors, wall = asyncio.run(_ws_relay(pairs, messages, tokens))
+    return summarize('ws_relay', latencies, errors, wall)
+
+
+# ── Baseline comparison ───────────────────────────────────────────────────────
+
+def compare(results, baseline, tolerance):
+    """Return human-readable regressions of `results` against `baseline`."""
+    previous = {r['scenario']: r for r in baseline.get('results', [])}
+    regressions = []
+    for r in results:
+        old = previous.get(r['scenario'])
+        if not old:
+            continue
+        if r['p95_ms'] > old['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{r['scenario']}: p95 {old['p95_ms']:.1f} → {r['p95_ms']:.1f} ms")
+        if r['rps'] < old['rps'] * (1 - tolerance):
+            regressions.append(f"{r['scenario']}: throughput {old['rps']:.0f} → {r['rps']:.0f} req/s")
+        if r['errors'] > old['errors']:
+            regressions.append(f"{r['scenario']}: errors {old['errors']} → {r['errors']}")
+    return regressions
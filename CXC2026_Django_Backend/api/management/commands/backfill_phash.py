@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from api.similarity import backfill
+
+
+class Command(BaseCommand):
+    help = "Compute perceptual hashes for bucket images stored before hashing was added. Safe to re-run."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="Rows per database round trip.")
+        parser.add_argument("--workers", type=int, default=None,
+                            help="Hashing processes (default: CPU count, 0: inline).")
+
+    def handle(self, *args, **options):
+        stats = backfill(
+            batch_size=options["batch_size"], workers=options["workers"],
+            progress=(lambda s: self.stdout.write(f"  {s['hashed']} hashed")) if options["verbosity"] > 1 else None,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Hashed {stats['hashed']} images; {stats['unreadable']} unreadable files left unhashed."
+        ))
@@ -0,0 +1,89 @@
+import io
+import statistics
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+
+def _payload(count):
+    """Shaped like GET /api/profiles/ output for `count` profiles."""
+    base = "http://localhost:8000/media"
+    return [
+        {
+            "id": i,
+            "user_id": i,
+            "uuid": str(uuid.uuid4()),
+            "display_name": f"Profile {i} ✨",
+            "age": 18 + i % 40,
+            "gender": "woman" if i % 2 else "man",
+            "bio": "Loves hiking, coffee and long walks along the Grand River. " * 3,
+            "avatar_url": f"{base}/img_avatars/HUMAN_{uuid.uuid4()}.jpg",
+            "avatar_urls": [f"{base}/img_avatars/HUMAN_{uuid.uuid4()}.jpg" for _ in range(3)],
+            "avatar_x": 50.0,
+            "avatar_y": 33.3,
+            "banner_url": None,
+            "banner_urls": [],
+            "banner_x": 50.0,
+            "banner_y": 50.0,
+            "location": "Waterloo, ON",
+            "latitude": 43.4643,
+            "longitude": -80.5204,
+            "distance_km": None,
+            "looking_for": "Relationship",
+            "interests": ["music", "travel", "board games", "climbing"],
+            "compatibility_score": 87.5,
+            "online_status": bool(i % 3),
+            "type": "ai" if i % 5 == 0 else "human",
+        }
+        for i in range(count)
+    ]
+
+
+def _time(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+class Command(BaseCommand):
+    help = "Compare the stdlib and orjson JSON renderer/parser on a profile-list payload."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--profiles", type=int, default=2000)
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        try:
+            from api.parsers import ORJSONParser
+            from api.renderers import ORJSONRenderer
+        except ImportError:
+            raise CommandError("orjson is not installed (pip install .[fast]).")
+
+        data = _payload(options["profiles"])
+        repeat = options["repeat"]
+
+        stdlib_bytes = JSONRenderer().render(data)
+        orjson_bytes = ORJSONRenderer().render(data)
+        if stdlib_bytes != orjson_bytes:
+            raise CommandError("Renderers disagree on output bytes.")
+
+        rows = [
+            ("render", lambda: JSONRenderer().render(data), lambda: ORJSONRenderer().render(data)),
+            ("parse",
+             lambda: JSONParser().parse(io.BytesIO(stdlib_bytes)),
+             lambda: ORJSONParser().parse(io.BytesIO(stdlib_bytes))),
+        ]
+        self.stdout.write(
+            f"{options['profiles']} profiles, {len(stdlib_bytes) / 1024:.0f} KiB, "
+            f"median of {repeat} runs (output bytes identical)"
+        )
+        self.stdout.write(f"{'':8}{'stdlib ms':>12}{'orjson ms':>12}{'speedup':>10}")
+        for name, stdlib_fn, orjson_fn in rows:
+            a, b = _time(stdlib_fn, repeat), _time(orjson_fn, repeat)
+            self.stdout.write(f"{name:8}{a:12.2f}{b:12.2f}{a / b:9.1f}x")
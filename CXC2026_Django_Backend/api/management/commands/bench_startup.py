@@ -0,0 +1,63 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Runs in a fresh interpreter: boot the ASGI app, then serve one request.
+_PROBE = r"""
+import json, os, sys, time
+t0 = time.perf_counter()
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+import config.asgi
+t1 = time.perf_counter()
+from django.test import Client
+status = Client(HTTP_HOST="localhost").get("/api/health/").status_code
+t2 = time.perf_counter()
+print(json.dumps({"boot_ms": (t1 - t0) * 1000, "first_request_ms": (t2 - t1) * 1000,
+                  "status": status, "modules": len(sys.modules)}))
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure cold start: ASGI app import time and first-request latency, each in a "
+        "fresh interpreter. --importtime lists the slowest imports."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=5)
+        parser.add_argument("--importtime", type=int, default=0, metavar="N",
+                            help="Also show the N slowest imports (python -X importtime).")
+
+    def _probe(self, *flags):
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": "config.settings"}
+        return subprocess.run(
+            [sys.executable, *flags, "-c", _PROBE],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, check=True,
+        )
+
+    def handle(self, *args, **options):
+        runs = [json.loads(self._probe().stdout.strip().splitlines()[-1]) for _ in range(options["runs"])]
+        if any(r["status"] != 200 for r in runs):
+            self.stderr.write("warning: probe request did not return 200")
+
+        self.stdout.write(f"{options['runs']} cold starts (median / min):")
+        for key in ("boot_ms", "first_request_ms"):
+            values = [r[key] for r in runs]
+            self.stdout.write(f"  {key:18}{statistics.median(values):9.1f}{min(values):9.1f}")
+        self.stdout.write(f"  {'modules loaded':18}{runs[0]['modules']:9d}")
+
+        if options["importtime"]:
+            rows = []
+            for line in self._probe("-X", "importtime").stderr.splitlines():
+                if not line.startswith("import time:") or "cumulative" in line:
+                    continue
+                _, self_us, cumulative_us, name = (part.strip() for part in line.replace("import time:", "|").split("|"))
+                rows.append((int(cumulative_us), int(self_us), name))
+            self.stdout.write(f"\nslowest imports (cumulative ms / self ms):")
+            for cumulative_us, self_us, name in sorted(rows, reverse=True)[:options["importtime"]]:
+                self.stdout.write(f"  {cumulative_us / 1000:9.1f}{self_us / 1000:9.1f}  {name}")
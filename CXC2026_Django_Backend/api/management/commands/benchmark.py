@@ -0,0 +1,107 @@
+import json
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from api import loadtest
+
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / "benchmarks" / "baseline.json"
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway database and media dir, then load-test the REST endpoints and the "
+        "WebSocket relay in-process. Reports throughput, p50/p95/p99 latency and peak RSS, and "
+        "fails if results regress against the stored baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--profiles", type=int, default=300, help="Profiles to seed.")
+        parser.add_argument("--requests", type=int, default=500, help="Requests per REST scenario.")
+        parser.add_argument("--concurrency", type=int, default=8, help="Client threads per REST scenario.")
+        parser.add_argument("--ws-pairs", type=int, default=1000, help="Browser/agent pairs.")
+        parser.add_argument("--ws-messages", type=int, default=5, help="Round trips per pair.")
+        parser.add_argument("--scenarios", default=",".join((*loadtest.REST_SCENARIOS, "ws_relay")))
+        parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+        parser.add_argument("--save-baseline", action="store_true",
+                            help="Write these results to --baseline instead of comparing.")
+        parser.add_argument("--tolerance", type=float, default=0.25,
+                            help="Allowed relative slowdown before a result counts as a regression.")
+
+    def handle(self, *args, **options):
+        scenarios = [s for s in options["scenarios"].split(",") if s]
+        unknown = set(scenarios) - {*loadtest.REST_SCENARIOS, "ws_relay"}
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+        with tempfile.TemporaryDirectory(prefix="bench-") as tmp:
+            # Never touch real data: separate DB (file-backed so client threads share it),
+            # separate media root, and a fast hasher for the seeded accounts.
+            test_settings = connection.settings_dict.setdefault("TEST", {})
+            if connection.vendor == "sqlite":
+                test_settings["NAME"] = str(Path(tmp) / "bench.sqlite3")
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                with override_settings(
+                    MEDIA_ROOT=str(Path(tmp) / "media"),
+                    PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"],
+                ):
+                    results = self._run(scenarios, options)
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        self._report(results)
+        baseline_path = options["baseline"]
+        if options["save_baseline"]:
+            baseline_path.parent.mkdir(parents=True, exist_ok=True)
+            baseline_path.write_text(json.dumps({"options": self._sizes(options), "results": results}, indent=2))
+            self.stdout.write(f"\nBaseline written to {baseline_path}")
+        elif baseline_path.exists():
+            baseline = json.loads(baseline_path.read_text())
+            if baseline.get("options") != self._sizes(options):
+                self.stdout.write(self.style.WARNING("\nBaseline was recorded with different sizes."))
+            regressions = loadtest.compare(results, baseline, options["tolerance"])
+            if regressions:
+                raise CommandError("Regressions against baseline:\n  " + "\n  ".join(regressions))
+            self.stdout.write(self.style.SUCCESS(f"\nNo regressions against {baseline_path}"))
+
+    @staticmethod
+    def _sizes(options):
+        return {k: options[k] for k in ("profiles", "requests", "concurrency", "ws_pairs", "ws_messages")}
+
+    def _run(self, scenarios, options):
+        self.stdout.write(f"Seeding {options['profiles']} profiles…")
+        profile_ids = loadtest.seed(options["profiles"])
+        users = User.objects.filter(profile__pk__in=profile_ids).order_by("pk")[:options["concurrency"] * 4]
+        tokens = [loadtest.access_token(u) for u in users]
+
+        results = []
+        for name in scenarios:
+            self.stdout.write(f"Running {name}…")
+            if name == "ws_relay":
+                results.append(loadtest.run_websocket(options["ws_pairs"], options["ws_messages"], tokens))
+            else:
+                results.append(loadtest.run_rest(
+                    name, profile_ids, tokens, options["requests"], options["concurrency"],
+                ))
+        return results
+
+    def _report(self, results):
+        self.stdout.write(
+            f"\n{'scenario':16}{'reqs':>7}{'errors':>8}{'req/s':>9}"
+            f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'rss MB':>9}"
+        )
+        for r in results:
+            self.stdout.write(
+                f"{r['scenario']:16}{r['requests']:7d}{r['errors']:8d}{r['rps']:9.0f}"
+                f"{r['p50_ms']:9.1f}{r['p95_ms']:9.1f}{r['p99_ms']:9.1f}{r['max_rss_mb']:9.0f}"
+            )
+        for r in results:
+            if r.get("error_types"):
+                kinds = ", ".join(f"{kind} ×{count}" for kind, count in r["error_types"].items())
+                self.stdout.write(self.style.WARNING(f"{r['scenario']} errors: {kinds}"))
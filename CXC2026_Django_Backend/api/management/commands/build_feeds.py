@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.feeds import refresh
+
+
+class Command(BaseCommand):
+    help = (
+        "Refresh materialized Discover feeds: build feeds for new users, rescore profiles changed "
+        "since each feed's last run, rebuild feeds whose viewer changed their own profile, and "
+        "refill feeds that have run low. "
+        "Use --loop to keep feeds fresh (the Procfile's worker process does)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=200, help="Feeds loaded per query.")
+        parser.add_argument("--rebuild", action="store_true", help="Rebuild every feed from scratch.")
+        parser.add_argument("--loop", type=int, default=0, metavar="SECONDS",
+                            help="Run forever, starting a run every SECONDS.")
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.monotonic()
+            stats = refresh(batch_size=options["batch_size"], rebuild=options["rebuild"])
+            self.stdout.write(
+                f"Rebuilt {stats['rebuilt']} feeds, refreshed {stats['refreshed']} "
+                f"({stats['rescored']} entries rescored, {stats['backfilled']} backfilled) "
+                f"in {time.monotonic() - started:.1f}s."
+            )
+            if not options["loop"]:
+                break
+            time.sleep(options["loop"])
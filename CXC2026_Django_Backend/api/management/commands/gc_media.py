@@ -0,0 +1,45 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.media_gc import collect
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete bucket files no image row references. Incremental: resumes from a checkpoint, "
+        "scans at most --limit files per run and is rate-limited to stay out of the way of "
+        "request I/O. Use --loop to keep it running in the background."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Report orphans without deleting them.")
+        parser.add_argument("--limit", type=int, default=None, help="Files to scan this run (default: rest of cycle).")
+        parser.add_argument("--batch-size", type=int, default=500, help="Files per database lookup.")
+        parser.add_argument("--rate", type=float, default=1000, help="Max files scanned per second (0: unthrottled).")
+        parser.add_argument("--grace", type=int, default=3600,
+                            help="Never delete files modified within this many seconds.")
+        parser.add_argument("--loop", type=int, default=0, metavar="SECONDS",
+                            help="Run forever, starting a run every SECONDS.")
+        parser.add_argument("--nice", type=int, default=10, help="CPU niceness increment for this process.")
+
+    def handle(self, *args, **options):
+        if options["nice"]:
+            os.nice(options["nice"])
+        verbose = options["verbosity"] > 1 or options["dry_run"]
+        while True:
+            stats = collect(
+                dry_run=options["dry_run"], limit=options["limit"], batch_size=options["batch_size"],
+                rate=options["rate"] or None, grace=options["grace"],
+                on_orphan=(lambda name, size: self.stdout.write(f"  {name} ({size} bytes)")) if verbose else None,
+            )
+            verb = "would delete" if options["dry_run"] else "deleted"
+            self.stdout.write(
+                f"Scanned {stats['scanned']} files, {verb} {stats['orphans']} orphans "
+                f"({stats['bytes'] / 1e6:.1f} MB); {stats['too_recent']} too recent to touch. "
+                + ("Cycle complete." if stats["cycle_complete"] else "Will resume from checkpoint.")
+            )
+            if not options["loop"]:
+                break
+            time.sleep(options["loop"])
@@ -0,0 +1,57 @@
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.importer import run_import, run_job
+from api.models import ImportJob
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-import AI profiles from a JSONL manifest and an image directory. Rows whose "
+        "email already exists are skipped, so re-running resumes an interrupted import."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("manifest", type=Path, nargs="?")
+        parser.add_argument("--job", type=int, help="Run the admin API import job with this id instead.")
+        parser.add_argument("--images", type=Path, help="Directory image paths in the manifest are relative to.")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Profiles per transaction.")
+        parser.add_argument("--workers", type=int, default=None,
+                            help="Image processes (default: CPU count; 0 processes inline).")
+
+    def handle(self, *args, **options):
+        if options["job"] is not None:
+            run_job(options["job"])
+            job = ImportJob.objects.get(pk=options["job"])
+            self.stdout.write(f"Job {job.pk} {job.status}: {job.created} created, {job.skipped} skipped, "
+                              f"{job.failed} failed.")
+            return
+        manifest, images = options["manifest"], options["images"]
+        if manifest is None:
+            raise CommandError("Give a manifest or --job.")
+        if not manifest.is_file():
+            raise CommandError(f"Manifest not found: {manifest}")
+        if images is not None and not images.is_dir():
+            raise CommandError(f"Image directory not found: {images}")
+
+        start = time.perf_counter()
+
+        def progress(stats):
+            done = stats["created"] + stats["skipped"] + stats["failed"]
+            rate = stats["created"] / (time.perf_counter() - start)
+            self.stdout.write(
+                f"{done} rows: {stats['created']} created, {stats['skipped']} skipped, "
+                f"{stats['failed']} failed ({rate:.0f} profiles/s)"
+            )
+
+        stats = run_import(
+            manifest, images, batch_size=options["batch_size"], workers=options["workers"], progress=progress,
+        )
+        for error in stats["errors"]:
+            self.stderr.write(f"line {error['line']}: {error['error']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {stats['created']} profiles in {time.perf_counter() - start:.1f}s "
+            f"({stats['skipped']} skipped, {stats['failed']} failed)."
+        ))
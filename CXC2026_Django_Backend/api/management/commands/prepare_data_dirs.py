@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from config.data_dirs import ensure_data_dirs
+
+
+class Command(BaseCommand):
+    help = (
+        "Create DATA_DIR and the bucket, log, session and import directories below it. "
+        "Run before migrate on a fresh checkout or volume; gunicorn does this itself on start."
+    )
+
+    def handle(self, *args, **options):
+        ensure_data_dirs()
@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.profiling import make_token
+
+
+class Command(BaseCommand):
+    help = "Print a signed token that turns on the sampling profiler for a request or WebSocket."
+
+    def handle(self, *args, **options):
+        if not settings.PROFILING_ENABLED:
+            self.stderr.write(self.style.WARNING("PROFILING_ENABLED is off; the token will be ignored."))
+        self.stdout.write(make_token())
+        self.stderr.write(
+            f"Valid for {settings.PROFILING_TOKEN_MAX_AGE}s. Send as 'X-Profile: <token>' or "
+            f"'?_profile=<token>' (WebSockets: query string only)."
+        )
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from api.media_layout import shard_all
+
+
+class Command(BaseCommand):
+    help = (
+        "Move bucket files from the flat layout into hash-prefix fan-out directories "
+        "(img_avatars/ab/cd/...). Runs online in batches; old URLs keep working until every "
+        "row has moved, then the old names are removed. Safe to interrupt and re-run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="Rows per transaction.")
+        parser.add_argument("--pause", type=float, default=0.0, help="Seconds to sleep between batches.")
+        parser.add_argument("--dry-run", action="store_true", help="Count what would move; change nothing.")
+        parser.add_argument("--keep-old", action="store_true", help="Leave the old flat names in place.")
+
+    def handle(self, *args, **options):
+        verb = "would move" if options["dry_run"] else "moved"
+
+        def log(bucket, stats):
+            self.stdout.write(f"{bucket}: {verb} {stats['moved']} files ({stats['missing']} already missing)")
+
+        stats = shard_all(
+            batch_size=options["batch_size"], pause=options["pause"],
+            dry_run=options["dry_run"], keep_old=options["keep_old"], log=log,
+        )
+        unlinked = sum(s.get("unlinked", 0) for s in stats.values() if isinstance(s, dict))
+        if stats["finished"] and not options["keep_old"]:
+            self.stdout.write(self.style.SUCCESS(f"Done; removed {unlinked} old flat names."))
+        elif not options["dry_run"]:
+            self.stdout.write("Old flat names kept; re-run to finish.")
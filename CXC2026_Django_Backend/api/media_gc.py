@@ -0,0 +1,176 @@
+"""
+Garbage collection of bucket files that no database row points at.
+
+Cascaded Profile/User deletes, failed uploads and aborted imports leave files
+behind under img_avatars/, img_banners/ and img_personal/. The collector
+walks those trees with os.scandir, so listings are streamed rather than held
+in memory. Each batch of names is checked against the owning bucket table
+with a single IN query.
+
+Walk order is deterministic: subdirectories are sorted, and a directory's
+files are visited before its subdirectories, in scandir order. After every
+batch the position reached (directory + entries consumed) is saved to a
+checkpoint file. The next run resumes there, and a new cycle starts from
+the top once the walk completes. Files modified within the grace period are
+never deleted. This covers uploads and imports whose file is written before
+the row commits. Files created or removed between runs can shift a
+directory's scandir order slightly. Anything skipped that way is picked up
+on the next cycle.
+"""
+import json
+import os
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+from .models import BucketAvatarImage, BucketBannerImage, BucketPersonalImage
+
+BUCKET_MODELS = {
+    'img_avatars': BucketAvatarImage,
+    'img_banners': BucketBannerImage,
+    'img_personal': BucketPersonalImage,
+}
+
+
+def default_checkpoint_path() -> Path:
+    return Path(settings.DATA_DIR) / 'media_gc.checkpoint.json'
+
+
+def _load_checkpoint(path):
+    try:
+        data = json.loads(Path(path).read_text())
+    except (OSError, ValueError):
+        return None
+    return tuple(data['dir'].split('/')), data['offset']
+
+
+def _save_checkpoint(path, directory, offset):
+    tmp = Path(f'{path}.tmp')
+    tmp.write_text(json.dumps({'dir': '/'.join(directory), 'offset': offset}))
+    os.replace(tmp, path)
+
+
+def _walk(root, directory, resume):
+    """
+    Yield (directory, index, DirEntry) for files under root/directory.
+
+    `resume` is a (directory, offset) checkpoint: everything that sorts
+    before it in walk order is skipped without being listed again, except
+    the directories on the path leading to it.
+    """
+    resume_dir, resume_offset = resume or ((), 0)
+    if directory == resume_dir:
+        skip_files = resume_offset
+    elif directory == resume_dir[:len(directory)]:
+        skip_files = None  # an ancestor of the checkpoint: its files were done
+    else:
+        skip_files = 0
+
+    subdirs = []
+    try:
+        entries = os.scandir(os.path.join(root, *directory))
+    except FileNotFoundError:
+        return
+    with entries:
+        index = 0
+        for entry in entries:
+            if entry.name.startswith('.'):
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.name)
+                continue
+            if skip_files is not None and index >= skip_files:
+                yield directory, index, entry
+            index += 1
+
+    for name in sorted(subdirs):
+        child = (*directory, name)
+        if child < resume_dir[:len(child)]:
+            continue  # whole subtree precedes the checkpoint
+        yield from _walk(root, child, resume)
+
+
+def _orphans(batch):
+    """Entries in `batch` whose file name is not referenced by their bucket table."""
+    by_bucket = {}
+    for directory, _, entry in batch:
+        by_bucket.setdefault(directory[0], []).append(('/'.join((*directory, entry.name)), entry))
+    orphans = []
+    for bucket, items in by_bucket.items():
+        model = BUCKET_MODELS[bucket]
+        known = set(model.objects.filter(file__in=[name for name, _ in items]).values_list('file', flat=True))
+        orphans.extend((name, entry) for name, entry in items if name not in known)
+    return orphans
+
+
+def collect(*, dry_run=False, limit=None, batch_size=500, rate=None, grace=3600,
+            checkpoint=None, on_orphan=None) -> dict:
+    """
+    Scan up to `limit` files (None: to the end of the cycle) and delete the
+    orphans older than `grace` seconds. `rate` caps files scanned per second.
+    A dry run reports what would be deleted and leaves the checkpoint alone.
+    `on_orphan(name, size)` is called for every orphan found.
+    """
+    root = str(settings.MEDIA_ROOT)
+    checkpoint = Path(checkpoint or default_checkpoint_path())
+    resume = _load_checkpoint(checkpoint)
+    stats = {'scanned': 0, 'orphans': 0, 'deleted': 0, 'bytes': 0, 'too_recent': 0, 'cycle_complete': False}
+    cutoff = time.time() - grace
+
+    def walk_all():
+        for bucket in sorted(BUCKET_MODELS):
+            if resume and (bucket,) < resume[0][:1]:
+                continue
+            yield from _walk(root, (bucket,), resume)
+
+    def flush(batch):
+        for name, entry in _orphans(batch):
+            try:
+                st = entry.stat(follow_symlinks=False)
+            except FileNotFoundError:
+                continue
+            if st.st_mtime > cutoff:
+                stats['too_recent'] += 1
+                continue
+            if st.st_nlink > 1:
+                # Another name still refers to this file (e.g. the old path
+                # kept by shard_media until a move finishes); unlinking this
+                # one would free nothing.
+                continue
+            stats['orphans'] += 1
+            stats['bytes'] += st.st_size
+            if on_orphan:
+                on_orphan(name, st.st_size)
+            if not dry_run:
+                try:
+                    os.unlink(entry.path)
+                except FileNotFoundError:
+                    continue
+                stats['deleted'] += 1
+        directory, index, _ = batch[-1]
+        if not dry_run:
+            _save_checkpoint(checkpoint, directory, index + 1)
+
+    batch = []
+    started = time.monotonic()
+    for item in walk_all():
+        if limit is not None and stats['scanned'] >= limit:
+            break
+        batch.append(item)
+        stats['scanned'] += 1
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+            if rate:
+                # Sleep off whatever is ahead of the allowed pace.
+                ahead = stats['scanned'] / rate - (time.monotonic() - started)
+                if ahead > 0:
+                    time.sleep(ahead)
+    else:
+        stats['cycle_complete'] = True
+    if batch:
+        flush(batch)
+    if stats['cycle_complete'] and not dry_run:
+        checkpoint.unlink(missing_ok=True)
+    return stats
@@ -0,0 +1,132 @@
+"""
+Online move of bucket files from the old flat layout to fan-out directories.
+
+New uploads already land in img_xxx/ab/cd/<name> (models.bucket_shard).
+Files stored before that are moved by `./manage.py shard_media`:
+
+1. For a batch of rows, hard-link each file under its sharded path, then
+   point the rows at the new names in one transaction. The owning profiles
+   are touched so sync clients pick up the new URLs.
+2. Once no flat rows are left, unlink the old flat names.
+
+Until step 2 both names refer to the same inode. URLs handed out before the
+move keep resolving, and the move takes no extra disk space. Re-running
+after an interruption is safe: rows already moved are skipped, and links
+left behind by a half-finished batch are reused.
+"""
+import errno
+import filecmp
+import os
+import re
+import shutil
+import time
+import uuid as uuid_lib
+
+from django.conf import settings
+from django.db import transaction
+
+from .media_gc import BUCKET_MODELS
+from .models import bucket_shard, touch_profiles
+
+SHARDED_PATTERN = r'^[^/]+/[0-9a-f]{2}/[0-9a-f]{2}/[^/]+$'
+_UUID_RE = re.compile(r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}')
+
+
+def sharded_name(name: str, image_uuid) -> str:
+    bucket, base = name.split('/', 1)[0], name.rsplit('/', 1)[-1]
+    return f'{bucket}/{bucket_shard(image_uuid)}/{base}'
+
+
+def _same_file(a, b) -> bool:
+    return os.path.samefile(a, b) or filecmp.cmp(a, b, shallow=False)
+
+
+def _link(src, dst):
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    try:
+        os.link(src, dst)
+    except FileExistsError:
+        if not _same_file(src, dst):
+            raise
+    except OSError as exc:
+        if exc.errno != errno.EXDEV:
+            raise
+        shutil.copy2(src, dst)  # media root spans filesystems: fall back to a copy
+
+
+def pending(model):
+    """Rows of `model` whose file is still in the flat layout."""
+    return model.objects.exclude(file='').exclude(file__regex=SHARDED_PATTERN)
+
+
+def move_bucket(model, *, batch_size=500, pause=0.0, dry_run=False) -> dict:
+    """Link files of flat rows under their sharded names and repoint the rows, in pk batches."""
+    root = str(settings.MEDIA_ROOT)
+    stats = {'moved': 0, 'missing': 0}
+    last_pk = 0
+    while True:
+        rows = list(
+            pending(model).filter(pk__gt=last_pk).order_by('pk').only('pk', 'uuid', 'file', 'profile_id')[:batch_size]
+        )
+        if not rows:
+            return stats
+        last_pk = rows[-1].pk
+        moved = []
+        for row in rows:
+            src = os.path.join(root, row.file.name)
+            new = sharded_name(row.file.name, row.uuid)
+            if not os.path.exists(src):
+                # Already broken; repoint it anyway so the move can finish.
+                stats['missing'] += 1
+            elif not dry_run:
+                _link(src, os.path.join(root, new))
+            row.file.name = new
+            moved.append(row)
+        if moved and not dry_run:
+            with transaction.atomic():
+                model.objects.bulk_update(moved, ['file'])
+                touch_profiles(row.profile_id for row in moved)
+        stats['moved'] += len(moved)
+        if pause:
+            time.sleep(pause)
+
+
+def unlink_flat(bucket, *, dry_run=False) -> int:
+    """
+    Remove flat names in `bucket` whose sharded twin exists. Flat files with
+    no twin (never moved, or orphaned) are left for gc_media.
+    """
+    directory = os.path.join(str(settings.MEDIA_ROOT), bucket)
+    removed = 0
+    try:
+        entries = os.scandir(directory)
+    except FileNotFoundError:
+        return 0
+    with entries:
+        for entry in entries:
+            if not entry.is_file(follow_symlinks=False):
+                continue
+            uuids = _UUID_RE.findall(entry.name)
+            if not uuids:
+                continue
+            # Names are <prefix>_<profile uuid>_<image uuid>_...: the image uuid is the last one.
+            twin = os.path.join(directory, bucket_shard(uuid_lib.UUID(uuids[-1])), entry.name)
+            if os.path.exists(twin) and _same_file(entry.path, twin):
+                if not dry_run:
+                    os.unlink(entry.path)
+                removed += 1
+    return removed
+
+
+def shard_all(*, batch_size=500, pause=0.0, dry_run=False, keep_old=False, log=None) -> dict:
+    stats = {}
+    for bucket, model in BUCKET_MODELS.items():
+        stats[bucket] = move_bucket(model, batch_size=batch_size, pause=pause, dry_run=dry_run)
+        if log:
+            log(bucket, stats[bucket])
+    finished = not any(pending(model).exists() for model in BUCKET_MODELS.values())
+    if finished and not keep_old:
+        for bucket in BUCKET_MODELS:
+            stats[bucket]['unlinked'] = unlink_flat(bucket, dry_run=dry_run)
+    stats['finished'] = finished
+    return stats
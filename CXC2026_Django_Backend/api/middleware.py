@@ -0,0 +1,193 @@
+import hashlib
+import zlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    from compression import zstd  # Python 3.14+
+except ImportError:
+    try:
+        import zstandard as zstd
+    except ImportError:
+        zstd = None
+
+
+# ── Codecs ────────────────────────────────────────────────────────────────────
+# Each codec is (compress(body) -> bytes, stream() -> (push(chunk), finish())).
+# Streams flush after every chunk so clients receive data as it is produced.
+
+def _gzip_compress(body):
+    z = zlib.compressobj(6, zlib.DEFLATED, 31)
+    return z.compress(body) + z.flush()
+
+
+def _gzip_stream():
+    z = zlib.compressobj(6, zlib.DEFLATED, 31)
+    return (lambda chunk: z.compress(chunk) + z.flush(zlib.Z_SYNC_FLUSH)), z.flush
+
+
+def _br_compress(body):
+    return brotli.compress(body, quality=5)
+
+
+def _br_stream():
+    c = brotli.Compressor(quality=5)
+    return (lambda chunk: c.process(chunk) + c.flush()), c.finish
+
+
+def _zstd_compress(body):
+    return zstd.compress(body, 3)
+
+
+def _zstd_stream():
+    if hasattr(zstd, 'CompressionParameter'):  # compression.zstd
+        c = zstd.ZstdCompressor(level=3)
+        return (lambda chunk: c.compress(chunk, c.FLUSH_BLOCK)), (lambda: c.flush(c.FLUSH_FRAME))
+    c = zstd.ZstdCompressor(level=3).compressobj()
+    return (lambda chunk: c.compress(chunk) + c.flush(zstd.COMPRESSOBJ_FLUSH_BLOCK)), c.flush
+
+
+CODECS = {'gzip': (_gzip_compress, _gzip_stream)}
+if brotli is not None:
+    CODECS['br'] = (_br_compress, _br_stream)
+if zstd is not None:
+    CODECS['zstd'] = (_zstd_compress, _zstd_stream)
+
+
+def negotiate_encoding(accept_encoding: str, preference) -> str | None:
+    """
+    Pick the codec to use for an Accept-Encoding header: highest q-value
+    wins, ties go to the earliest entry in `preference`.
+    """
+    weights = {}
+    for item in accept_encoding.split(','):
+        name, _, params = item.strip().partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name] = q
+
+    best, best_q = None, 0.0
+    for name in preference:
+        if name not in CODECS:
+            continue
+        q = weights.get(name, weights.get('*', 0.0))
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+
+# Already compressed (or pointless to compress) payloads.
+_SKIP_CONTENT_TYPES = (
+    'image/', 'video/', 'audio/', 'font/woff',
+    'application/zip', 'application/gzip', 'application/x-gzip',
+    'application/zstd', 'application/x-brotli', 'application/pdf',
+    'application/octet-stream',
+)
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Compress responses with zstd, brotli or gzip depending on Accept-Encoding.
+
+    zstd and brotli are used when their packages are installed; gzip always
+    works. Image and other already-compressed media pass through untouched.
+    Compressed bodies of large responses are kept in the `compression` cache
+    keyed by a digest of the uncompressed body, so a hot response (e.g. the
+    same profile list served to many clients) is compressed only once.
+
+    Settings:
+        API_COMPRESSION_ENCODINGS     codec preference order
+        API_COMPRESSION_MIN_SIZE      don't bother below this many bytes
+        API_COMPRESSION_CACHE_MIN_SIZE  cache compressed bodies from this size
+        API_COMPRESSION_EXCLUDE_PATHS  path prefixes never compressed (BREACH:
+                                       responses carrying secrets)
+    """
+
+    def process_response(self, request, response):
+        if response.has_header('Content-Encoding') or response.status_code == 206:
+            return response
+        if not response.streaming and len(response.content) < settings.API_COMPRESSION_MIN_SIZE:
+            return response
+        content_type = response.get('Content-Type', '').lower()
+        if content_type.startswith(_SKIP_CONTENT_TYPES) and 'svg' not in content_type:
+            return response
+        if request.path.startswith(tuple(settings.API_COMPRESSION_EXCLUDE_PATHS)):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        encoding = negotiate_encoding(
+            request.META.get('HTTP_ACCEPT_ENCODING', ''), settings.API_COMPRESSION_ENCODINGS,
+        )
+        if encoding is None:
+            return response
+        compress, stream = CODECS[encoding]
+
+        if response.streaming:
+            if response.is_async:
+                original_iterator = response.streaming_content
+
+                async def compressed_async():
+                    push, finish = stream()
+                    async for chunk in original_iterator:
+                        data = push(chunk)
+                        if data:
+                            yield data
+                    yield finish()
+
+                response.streaming_content = compressed_async()
+            else:
+                response.streaming_content = self._compressed_sync(response.streaming_content, stream)
+            # The compressed size isn't known until the stream is done.
+            del response.headers['Content-Length']
+        else:
+            content = response.content
+            compressed = self._compress_cached(content, encoding, compress)
+            if len(compressed) >= len(content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        # A strong ETag no longer matches the bytes on the wire (RFC 9110 8.8.1).
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    @staticmethod
+    def _compressed_sync(chunks, stream):
+        push, finish = stream()
+        for chunk in chunks:
+            data = push(chunk)
+            if data:
+                yield data
+        yield finish()
+
+    @staticmethod
+    def _compress_cached(content, encoding, compress):
+        if len(content) < settings.API_COMPRESSION_CACHE_MIN_SIZE:
+            return compress(content)
+        cache = caches['compression']
+        key = f'api.compress:{encoding}:{hashlib.blake2b(content, digest_size=20).hexdigest()}'
+        compressed = cache.get(key)
+        if compressed is None:
+            compressed = compress(content)
+            cache.set(key, compressed)
+        return compressed
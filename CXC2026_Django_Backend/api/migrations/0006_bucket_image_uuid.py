@@ -0,0 +1,39 @@
+import uuid
+
+from django.db import migrations, models
+
+BUCKET_MODELS = ('bucketavatarimage', 'bucketbannerimage', 'bucketpersonalimage')
+
+
+def populate_uuids(apps, schema_editor):
+    for name in BUCKET_MODELS:
+        Model = apps.get_model('api', name)
+        for img in Model.objects.filter(uuid__isnull=True).only('pk'):
+            Model.objects.filter(pk=img.pk).update(uuid=uuid.uuid4())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_remove_profile_avatar_profile_banner_x_and_more'),
+    ]
+
+    operations = [
+        *(
+            migrations.AddField(
+                model_name=name,
+                name='uuid',
+                field=models.UUIDField(null=True, editable=False),
+            )
+            for name in BUCKET_MODELS
+        ),
+        migrations.RunPython(populate_uuids, migrations.RunPython.noop),
+        *(
+            migrations.AlterField(
+                model_name=name,
+                name='uuid',
+                field=models.UUIDField(default=uuid.uuid4, editable=False, unique=True),
+            )
+            for name in BUCKET_MODELS
+        ),
+    ]
@@ -0,0 +1,46 @@
+from django.db import migrations, models
+
+
+def resolve_locations(apps, schema_editor):
+    from api import geo
+
+    Profile = apps.get_model('api', 'Profile')
+    batch = []
+    for profile in Profile.objects.exclude(location='').only('pk', 'location').iterator():
+        coords = geo.resolve_location(profile.location)
+        if coords is None:
+            continue
+        profile.latitude, profile.longitude = coords
+        profile.geohash = geo.geohash_encode(*coords)
+        batch.append(profile)
+        if len(batch) >= 500:
+            Profile.objects.bulk_update(batch, ['latitude', 'longitude', 'geohash'])
+            batch = []
+    if batch:
+        Profile.objects.bulk_update(batch, ['latitude', 'longitude', 'geohash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_bucket_image_uuid'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, max_length=12),
+        ),
+        migrations.RunPython(resolve_locations, migrations.RunPython.noop),
+    ]
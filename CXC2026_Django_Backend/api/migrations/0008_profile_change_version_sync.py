@@ -0,0 +1,44 @@
+from django.db import migrations, models
+
+
+def seed_change_versions(apps, schema_editor):
+    Profile = apps.get_model('api', 'Profile')
+    SyncCounter = apps.get_model('api', 'SyncCounter')
+    version = 0
+    for pk in Profile.objects.order_by('pk').values_list('pk', flat=True).iterator():
+        version += 1
+        Profile.objects.filter(pk=pk).update(change_version=version)
+    SyncCounter.objects.create(pk=1, value=version)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_profile_location_geohash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProfileTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('profile_id', models.BigIntegerField()),
+                ('uuid', models.UUIDField()),
+                ('change_version', models.BigIntegerField(db_index=True)),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='change_version',
+            field=models.BigIntegerField(db_index=True, default=0),
+        ),
+        migrations.RunPython(seed_change_versions, migrations.RunPython.noop),
+    ]
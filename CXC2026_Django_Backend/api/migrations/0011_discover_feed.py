@@ -0,0 +1,38 @@
+# Generated by Django 5.1.15 on 2026-10-19 11:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_image_perceptual_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Feed',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seen', models.BinaryField(default=bytes)),
+                ('basis', models.CharField(blank=True, max_length=32)),
+                ('cursor', models.BigIntegerField(default=0)),
+                ('built_at', models.DateTimeField(blank=True, null=True)),
+                ('viewer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='feed', to='api.profile')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='FeedEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('candidate', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.profile')),
+                ('feed', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='entries', to='api.feed')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['feed', '-score', 'candidate'], name='feed_rank')],
+                'constraints': [models.UniqueConstraint(fields=('feed', 'candidate'), name='unique_feed_candidate')],
+            },
+        ),
+    ]
@@ -0,0 +1,59 @@
+from django.db import migrations
+
+
+def _bitmap_ids(bitmap):
+    return [i * 8 + bit for i, byte in enumerate(bitmap) for bit in range(8) if byte >> bit & 1]
+
+
+def _varints(ids):
+    out = bytearray()
+    previous = 0
+    for n in sorted(ids):
+        gap, previous = n - previous, n
+        while gap >= 0x80:
+            out.append(gap & 0x7f | 0x80)
+            gap >>= 7
+        out.append(gap)
+    return bytes(out)
+
+
+def _varint_ids(blob):
+    ids, n, gap, shift = [], 0, 0, 0
+    for byte in blob:
+        gap |= (byte & 0x7f) << shift
+        shift += 7
+        if not byte & 0x80:
+            n += gap
+            ids.append(n)
+            gap = shift = 0
+    return ids
+
+
+def _convert(apps, decode, encode):
+    Feed = apps.get_model('api', 'Feed')
+    for pk, seen in Feed.objects.exclude(seen=b'').values_list('pk', 'seen').iterator():
+        Feed.objects.filter(pk=pk).update(seen=encode(decode(bytes(seen))))
+
+
+def bitmaps_to_varints(apps, schema_editor):
+    _convert(apps, _bitmap_ids, _varints)
+
+
+def varints_to_bitmaps(apps, schema_editor):
+    def bitmap(ids):
+        out = bytearray(max(ids, default=-1) // 8 + 1)
+        for n in ids:
+            out[n >> 3] |= 1 << (n & 7)
+        return bytes(out)
+    _convert(apps, _varint_ids, bitmap)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_import_job_heartbeat'),
+    ]
+
+    operations = [
+        migrations.RunPython(bitmaps_to_varints, varints_to_bitmaps),
+    ]
@@ -1,30 +1,75 @@
 import os
 import uuid as uuid_lib
 
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
 from django.contrib.auth.models import User
+from django.utils import timezone
+
+from . import geo
 
 
 def _prefix(profile) -> str:
     return 'BOT' if profile.type == 'ai' else 'HUMAN'
 
 
-def _avatar_path(instance, filename):
+def bucket_shard(image_uuid) -> str:
+    """
+    Fan-out directories for an image: 'ab/cd' from its uuid. uuid4 is random,
+    so files spread evenly over 65,536 directories per bucket.
+    """
+    h = image_uuid.hex
+    return f"{h[:2]}/{h[2:4]}"
+
+
+def focal_token(focal) -> str:
+    """
+    Short focal-point tag for rendition cache names and the `v` URL
+    parameter. Lives here, not in api/renditions.py, so serializing
+    profiles doesn't import Pillow.
+    """
+    return '{:g},{:g}'.format(*focal)
+
+
+def _bucket_path(bucket, instance, filename):
     p = instance.profile
     ext = os.path.splitext(filename)[1].lower()
-    return f"img_avatars/{_prefix(p)}_{p.uuid}_{instance.uuid}_{ext[1:].upper()}{ext}"
+    return f"{bucket}/{bucket_shard(instance.uuid)}/{_prefix(p)}_{p.uuid}_{instance.uuid}_{ext[1:].upper()}{ext}"
+
+
+def _avatar_path(instance, filename):
+    return _bucket_path('img_avatars', instance, filename)
 
 
 def _banner_path(instance, filename):
-    p = instance.profile
-    ext = os.path.splitext(filename)[1].lower()
-    return f"img_banners/{_prefix(p)}_{p.uuid}_{instance.uuid}_{ext[1:].upper()}{ext}"
+    return _bucket_path('img_banners', instance, filename)
 
 
 def _personal_path(instance, filename):
-    p = instance.profile
-    ext = os.path.splitext(filename)[1].lower()
-    return f"img_personal/{_prefix(p)}_{p.uuid}_{instance.uuid}_{ext[1:].upper()}{ext}"
+    return _bucket_path('img_personal', instance, filename)
+
+
+# ── Change tracking for delta sync ────────────────────────────────────────────
+
+class SyncCounter(models.Model):
+    """Single row holding the last change version handed out."""
+    value = models.BigIntegerField(default=0)
+
+
+def next_change_versions(count=1) -> range:
+    """
+    Reserve `count` consecutive change versions.
+
+    The UPDATE takes a row lock that is held until the caller's transaction
+    commits, so versions become visible in the order they were handed out and
+    a client cursor never skips over a change that commits late.
+    """
+    with transaction.atomic():
+        if not SyncCounter.objects.filter(pk=1).update(value=F('value') + count):
+            SyncCounter.objects.get_or_create(pk=1)
+            SyncCounter.objects.filter(pk=1).update(value=F('value') + count)
+        last = SyncCounter.objects.values_list('value', flat=True).get(pk=1)
+    return range(last - count + 1, last + 1)
 
 
 class Profile(models.Model):
@@ -47,6 +92,10 @@ class Profile(models.Model):
     banner_x = models.FloatField(default=50.0)
     banner_y = models.FloatField(default=50.0)
     location = models.CharField(max_length=100, blank=True)
+    # Resolved from `location` on save; see api/geo.py.
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    geohash = models.CharField(max_length=12, blank=True, db_index=True)
     looking_for = models.CharField(max_length=100, blank=True)
     interests = models.JSONField(default=list)
     compatibility_score = models.FloatField(default=0)
@@ -58,14 +107,147 @@ class Profile(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Bumped from SyncCounter on every write; drives /profiles/sync/.
+    change_version = models.BigIntegerField(default=0, db_index=True)
 
     def __str__(self):
         return f"{self.display_name or self.user.email}"
 
+    def resolve_location(self):
+        """Fill latitude/longitude/geohash from the free-text location."""
+        coords = geo.resolve_location(self.location)
+        if coords is None:
+            self.latitude = self.longitude = None
+            self.geohash = ''
+        else:
+            self.latitude, self.longitude = coords
+            self.geohash = geo.geohash_encode(*coords)
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = {*update_fields, 'change_version'}
+        if update_fields is None or 'location' in update_fields:
+            self.resolve_location()
+            if update_fields is not None:
+                update_fields |= {'latitude', 'longitude', 'geohash'}
+        if update_fields is not None:
+            kwargs['update_fields'] = update_fields
+        with transaction.atomic():
+            self.change_version = next_change_versions()[0]
+            super().save(*args, **kwargs)
+
+    def save_if_unchanged(self, fields) -> bool:
+        """
+        Write `fields` (already set on this instance) in one conditional
+        UPDATE, unless another write bumped change_version since the row was
+        loaded. Returns False, writing nothing, if one did.
+        """
+        fields = set(fields)
+        if 'location' in fields:
+            self.resolve_location()
+            fields |= {'latitude', 'longitude', 'geohash'}
+        loaded = self.change_version
+        self.updated_at = timezone.now()
+        with transaction.atomic():
+            # Reserving the version writes first, so SQLite takes its write lock
+            # up front instead of failing to upgrade a read lock under contention.
+            self.change_version = next_change_versions()[0]
+            return bool(Profile.objects.filter(pk=self.pk, change_version=loaded).update(
+                change_version=self.change_version, updated_at=self.updated_at,
+                **{name: getattr(self, name) for name in fields},
+            ))
+
+    def touch(self):
+        """Record a change to data serialized with the profile (e.g. its images)."""
+        with transaction.atomic():
+            self.change_version = next_change_versions()[0]
+            self.updated_at = timezone.now()
+            Profile.objects.filter(pk=self.pk).update(
+                change_version=self.change_version, updated_at=self.updated_at,
+            )
+
+
+def touch_profiles(profile_ids):
+    """Profile.touch() for many profiles, reserving their versions in one go."""
+    profile_ids = sorted(set(profile_ids))
+    now = timezone.now()
+    with transaction.atomic():
+        for pk, version in zip(profile_ids, next_change_versions(len(profile_ids))):
+            Profile.objects.filter(pk=pk).update(change_version=version, updated_at=now)
+
+
+class ProfileTombstone(models.Model):
+    """Deleted profiles, so sync clients can drop them from their cache."""
+    profile_id = models.BigIntegerField()
+    uuid = models.UUIDField()
+    change_version = models.BigIntegerField(db_index=True)
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
 
 # ── Bucket image tables ───────────────────────────────────────────────────────
 
-class BucketAvatarImage(models.Model):
+class PerceptualHash(models.Model):
+    """
+    64-bit dHash of the image file (api/imaging.dhash), computed on first
+    save. It is stored whole and as four 16-bit chunks, each indexed, for the
+    multi-index near-duplicate lookup in api/similarity.py.
+    """
+    phash = models.BigIntegerField(null=True, blank=True)  # unsigned value stored as signed 64-bit
+    phash_0 = models.PositiveIntegerField(null=True, blank=True, db_index=True)
+    phash_1 = models.PositiveIntegerField(null=True, blank=True, db_index=True)
+    phash_2 = models.PositiveIntegerField(null=True, blank=True, db_index=True)
+    phash_3 = models.PositiveIntegerField(null=True, blank=True, db_index=True)
+
+    PHASH_FIELDS = ['phash', 'phash_0', 'phash_1', 'phash_2', 'phash_3']
+
+    class Meta:
+        abstract = True
+
+    @property
+    def phash_value(self):
+        """The hash as an unsigned int, or None."""
+        return None if self.phash is None else self.phash & 0xFFFF_FFFF_FFFF_FFFF
+
+    def set_phash(self, value):
+        if value is None:
+            self.phash = self.phash_0 = self.phash_1 = self.phash_2 = self.phash_3 = None
+            return
+        self.phash = value - (1 << 64) if value >= 1 << 63 else value
+        self.phash_0, self.phash_1, self.phash_2, self.phash_3 = phash_chunks(value)
+
+    def compute_phash(self):
+        """dHash of the (possibly not yet committed) file, or None if it isn't a readable image."""
+        from .imaging import IMAGE_ERRORS, dhash
+
+        field_file = self.file
+        try:
+            field_file.open('rb')
+            try:
+                return dhash(field_file)
+            finally:
+                if getattr(field_file, '_committed', True):
+                    field_file.close()
+                else:
+                    field_file.seek(0)  # the upload is written to storage next
+        except IMAGE_ERRORS:
+            return None
+
+    def save(self, *args, **kwargs):
+        if self.phash is None and self.file:
+            self.set_phash(self.compute_phash())
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, *self.PHASH_FIELDS}
+        super().save(*args, **kwargs)
+
+
+def phash_chunks(value) -> tuple[int, int, int, int]:
+    """Split an unsigned 64-bit hash into four 16-bit chunks, high first."""
+    return tuple((value >> shift) & 0xFFFF for shift in (48, 32, 16, 0))
+
+
+class BucketAvatarImage(PerceptualHash):
     """img_avatars bucket — profile pictures."""
     uuid = models.UUIDField(default=uuid_lib.uuid4, editable=False, unique=True)
     profile = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name='avatar_images')
@@ -76,7 +258,7 @@ class BucketAvatarImage(models.Model):
         return self.file.name
 
 
-class BucketBannerImage(models.Model):
+class BucketBannerImage(PerceptualHash):
     """img_banners bucket — profile banner/hero images."""
     uuid = models.UUIDField(default=uuid_lib.uuid4, editable=False, unique=True)
     profile = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name='banner_images')
@@ -87,7 +269,7 @@ class BucketBannerImage(models.Model):
         return self.file.name
 
 
-class BucketPersonalImage(models.Model):
+class BucketPersonalImage(PerceptualHash):
     """img_personal bucket — additional personal photos."""
     uuid = models.UUIDField(default=uuid_lib.uuid4, editable=False, unique=True)
     profile = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name='personal_images')
@@ -96,3 +278,54 @@ class BucketPersonalImage(models.Model):
 
     def __str__(self):
         return self.file.name
+
+
+# ── Bulk import ───────────────────────────────────────────────────────────────
+
+class ImportJob(models.Model):
+    """One run of the bulk AI-profile importer started through the admin API."""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed'),
+    ]
+
+    manifest = models.CharField(max_length=500)
+    images_dir = models.CharField(max_length=500, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    created = models.IntegerField(default=0)
+    skipped = models.IntegerField(default=0)
+    failed = models.IntegerField(default=0)
+    # First few per-line problems, e.g. {"line": 12, "error": "avatar: cannot identify image file"}.
+    errors = models.JSONField(default=list)
+    error = models.TextField(blank=True)
+    created_by = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Bumped by the import process after every batch; see importer.fail_stale_jobs.
+    heartbeat_at = models.DateTimeField(default=timezone.now)
+
+
+# ── Discover feeds ────────────────────────────────────────────────────────────
+
+class Feed(models.Model):
+    """
+    A viewer's materialized Discover feed (api/feeds.py). The ranked
+    candidates are FeedEntry rows; `seen` holds the ids of profiles the
+    viewer has seen (feeds.seen_encode), so they are never re-added.
+    """
+    viewer = models.OneToOneField(Profile, on_delete=models.CASCADE, related_name='feed')
+    seen = models.BinaryField(default=bytes)
+    # Digest of the viewer fields scoring depends on; a change means a full rebuild.
+    basis = models.CharField(max_length=32, blank=True)
+    # Candidates with change_version above this have not been scored yet.
+    cursor = models.BigIntegerField(default=0)
+    built_at = models.DateTimeField(null=True, blank=True)
+
+
+class FeedEntry(models.Model):
+    feed = models.ForeignKey(Feed, on_delete=models.CASCADE, related_name='entries')
+    candidate = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['feed', 'candidate'], name='unique_feed_candidate')]
+        indexes = [models.Index(fields=['feed', '-score', 'candidate'], name='feed_rank')]
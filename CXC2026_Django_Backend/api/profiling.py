@@ -0,0 +1,224 @@
+"""
+Opt-in sampling profiler for HTTP requests and WebSocket handlers.
+
+While a capture is active a background thread samples the profiled thread's
+call stack every PROFILING_INTERVAL_MS and counts identical stacks. The
+result is written to DATA_DIR/logs/profiles/ in the "folded" format that
+flamegraph.pl, speedscope and inferno read directly.
+
+HTTP captures cover one request on its worker thread. WebSocket captures
+cover one connection, from connect to disconnect (at most
+PROFILING_MAX_SECONDS). The event loop thread runs every connection, so
+only samples taken while that connection's task is running are kept.
+
+A request is profiled when it carries a signed token (X-Profile header or
+`_profile` query parameter, minted with `./manage.py profiling_token`) or
+falls in the random PROFILING_SAMPLE_RATE fraction. With PROFILING_ENABLED
+off the middleware removes itself and the consumer hook is one settings
+lookup per connection.
+"""
+import asyncio
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import MiddlewareNotUsed
+
+_SALT = 'api.profiling'
+_active = 0
+_active_lock = threading.Lock()
+
+
+def make_token() -> str:
+    return signing.TimestampSigner(salt=_SALT).sign('profile')
+
+
+def token_is_valid(token: str) -> bool:
+    try:
+        signing.TimestampSigner(salt=_SALT).unsign(token, max_age=settings.PROFILING_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def is_selected(token: str | None) -> bool:
+    """Whether to profile a request/connection presenting `token` (may be None)."""
+    if not settings.PROFILING_ENABLED:
+        return False
+    if token:
+        return token_is_valid(token)
+    rate = settings.PROFILING_SAMPLE_RATE
+    return rate > 0 and random.random() < rate
+
+
+def _acquire_slot() -> bool:
+    """Bound how many captures run at once (PROFILING_MAX_CONCURRENT)."""
+    global _active
+    with _active_lock:
+        if _active >= settings.PROFILING_MAX_CONCURRENT:
+            return False
+        _active += 1
+        return True
+
+
+def _release_slot():
+    global _active
+    with _active_lock:
+        _active -= 1
+
+
+class StackSampler(threading.Thread):
+    """
+    Samples thread `target_ident`. With `root_frame`, keeps only stacks
+    running inside that frame (e.g. one asyncio task's coroutine), cut at it.
+    Releases its concurrency slot when it finishes.
+    """
+
+    def __init__(self, target_ident, interval, max_seconds, root_frame=None):
+        super().__init__(name='profiling-sampler', daemon=True)
+        self.target_ident = target_ident
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.root_frame = root_frame
+        self.counts = Counter()
+        self._stop_event = threading.Event()
+
+    @staticmethod
+    def _frame_label(frame):
+        code = frame.f_code
+        return f"{getattr(code, 'co_qualname', code.co_name)} ({Path(code.co_filename).name}:{code.co_firstlineno})"
+
+    def run(self):
+        try:
+            deadline = time.monotonic() + self.max_seconds
+            while not self._stop_event.wait(self.interval) and time.monotonic() < deadline:
+                self._sample()
+        finally:
+            _release_slot()
+
+    def _sample(self):
+        frame = sys._current_frames().get(self.target_ident)
+        stack = []
+        while frame is not None:
+            stack.append(self._frame_label(frame))
+            if frame is self.root_frame:
+                break
+            frame = frame.f_back
+        else:
+            if self.root_frame is not None:
+                return  # some other task (or the idle loop) was running
+        if stack:
+            self.counts[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def folded(self) -> str:
+        return ''.join(f'{stack} {count}\n' for stack, count in self.counts.most_common())
+
+
+def _output_path(label: str) -> Path:
+    slug = re.sub(r'[^A-Za-z0-9]+', '-', label).strip('-')[:80] or 'profile'
+    stamp = time.strftime('%Y%m%d-%H%M%S')
+    directory = Path(settings.LOGS_DIR) / 'profiles'
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory / f'{stamp}-{int(time.time() * 1000) % 1000:03d}-{slug}.folded'
+
+
+def start_sampler(root_frame=None) -> StackSampler | None:
+    """Start sampling the calling thread; None if PROFILING_MAX_CONCURRENT captures are running."""
+    if not _acquire_slot():
+        return None
+    sampler = StackSampler(
+        threading.get_ident(), settings.PROFILING_INTERVAL_MS / 1000, settings.PROFILING_MAX_SECONDS,
+        root_frame,
+    )
+    sampler.start()
+    return sampler
+
+
+def finish_sampler(sampler: StackSampler, label: str) -> Path | None:
+    """Stop `sampler` and write what it recorded; the output path, or None if empty."""
+    sampler.stop()
+    if not sampler.counts:
+        return None
+    path = _output_path(label)
+    path.write_text(sampler.folded(), encoding='utf-8')
+    return path
+
+
+@contextmanager
+def capture(label: str):
+    """
+    Sample the calling thread for the duration of the block. Yields a dict
+    whose 'path' is filled with the output file on exit (None if the
+    concurrency limit was hit and nothing was recorded).
+    """
+    result = {'path': None}
+    sampler = start_sampler()
+    try:
+        yield result
+    finally:
+        if sampler is not None:
+            result['path'] = finish_sampler(sampler, label)
+
+
+class ProfilingMiddleware:
+    """
+    Profiles selected HTTP requests and names the output in an
+    X-Profile-Output response header. Listed last in MIDDLEWARE so it wraps
+    the view; it is sync-only so the view runs in its thread under ASGI too.
+    """
+    sync_capable = True
+    async_capable = False
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = request.headers.get('X-Profile') or request.GET.get('_profile')
+        if not is_selected(token):
+            return self.get_response(request)
+        with capture(f'http {request.method} {request.path}') as result:
+            response = self.get_response(request)
+        if result['path'] is not None:
+            response['X-Profile-Output'] = result['path'].name
+        return response
+
+
+class ProfiledConsumerMixin:
+    """
+    Profiles WebSocket connections selected at connect (`_profile` query
+    parameter or PROFILING_SAMPLE_RATE): one sampler per connection, limited
+    to this consumer's task, written out off the event loop on disconnect.
+    """
+
+    async def websocket_connect(self, message):
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+        self._sampler = None
+        if is_selected(query.get('_profile', [None])[0]):
+            task = asyncio.current_task()
+            root = getattr(task.get_coro(), 'cr_frame', None) if task is not None else None
+            if root is not None:
+                self._sampler = start_sampler(root)
+        return await super().websocket_connect(message)
+
+    async def websocket_disconnect(self, message):
+        try:
+            return await super().websocket_disconnect(message)
+        finally:
+            sampler, self._sampler = getattr(self, '_sampler', None), None
+            if sampler is not None:
+                await sync_to_async(finish_sampler, thread_sensitive=False)(sampler, f'ws {type(self).__name__}')
@@ -0,0 +1,201 @@
+"""
+Flow control and liveness for the chat relay consumers.
+
+Rate limits: frames from a browser pass through token buckets before they
+are relayed. There is one pair per connection (messages, bytes) and one
+pair shared by all of a user's connections in this process. A frame is
+relayed only if every bucket can pay for it. Otherwise it is dropped and
+the client gets {"type": "error", "code": "rate_limited"}. Client pings and
+unsolicited pongs are charged like chat frames; only the pong answering an
+outstanding server ping is free. A client that
+keeps flooding (WS_MAX_DROPPED frames in a row) is disconnected. Per-user
+buckets exist only while the user has a connection open, so limiter state
+grows with active users, not with everyone who ever connected.
+
+Frames larger than WS_MAX_FRAME_BYTES close the socket, whether or not rate
+limiting is on and whichever side sent them.
+
+Keepalive: every WS_PING_INTERVAL seconds the server sends {"type": "ping"}.
+The peer must answer {"type": "pong"} (or any frame) within WS_PONG_TIMEOUT,
+or the connection is treated as dead. Agents get these pings only with
+WS_AGENT_KEEPALIVE set, since external agents may not know to answer them;
+otherwise the server's protocol-level pings (config/workers.py) are what
+detect a dead agent connection. Browsers are also dropped after
+WS_IDLE_TIMEOUT seconds with no chat traffic either way. Reaping leaves the
+channel-layer group before closing, so a half-open socket never keeps its
+membership until the layer's group expiry.
+"""
+import asyncio
+import json
+import time
+
+from django.conf import settings
+
+CLOSE_RATE_LIMITED = 4008
+CLOSE_IDLE = 4009
+CLOSE_TIMEOUT = 4010
+CLOSE_TOO_BIG = 1009
+
+_CONTROL_MAX_LEN = 64  # longer frames are never ping/pong
+
+
+class TokenBucket:
+    """`rate` tokens per second, holding at most `capacity`."""
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+def consume(buckets, amounts, now=None) -> bool:
+    """Take amounts[i] from buckets[i], all or nothing."""
+    now = time.monotonic() if now is None else now
+    for bucket in buckets:
+        bucket.refill(now)
+    if any(bucket.tokens < amount for bucket, amount in zip(buckets, amounts)):
+        return False
+    for bucket, amount in zip(buckets, amounts):
+        bucket.tokens -= amount
+    return True
+
+
+# Per-user buckets: user id -> [message bucket, byte bucket, open connections].
+_users = {}
+
+
+def acquire_user_buckets(user_id):
+    entry = _users.get(user_id)
+    if entry is None:
+        entry = _users[user_id] = [
+            TokenBucket(settings.WS_USER_MSG_RATE, settings.WS_USER_MSG_BURST),
+            TokenBucket(settings.WS_USER_BYTE_RATE, settings.WS_USER_BYTE_BURST),
+            0,
+        ]
+    entry[2] += 1
+    return entry[0], entry[1]
+
+
+def release_user_buckets(user_id):
+    entry = _users.get(user_id)
+    if entry is not None:
+        entry[2] -= 1
+        if entry[2] <= 0:
+            del _users[user_id]
+
+
+def control_type(text_data):
+    """'ping' / 'pong' for keepalive frames, else None. Cheap for ordinary chat frames."""
+    if not text_data or len(text_data) > _CONTROL_MAX_LEN or 'p' not in text_data:
+        return None
+    try:
+        data = json.loads(text_data)
+    except ValueError:
+        return None
+    kind = data.get('type') if isinstance(data, dict) else None
+    return kind if kind in ('ping', 'pong') else None
+
+
+class RelayGuardMixin:
+    """
+    Keepalive, plus optional idle reaping and rate limiting, for a relay
+    consumer. Consumers call guard_start() once accepted,
+    guard_release() on disconnect, and guard_receive() first thing in
+    receive(). Relay handlers call guard_activity() for outbound traffic.
+    """
+
+    def guard_start(self, *, rate_limit_user=None, idle_timeout=None, keepalive=True):
+        """
+        `rate_limit_user`: apply the limits, sharing per-user buckets.
+        `idle_timeout`: seconds, or None. `keepalive`: send application pings.
+        """
+        now = time.monotonic()
+        self._idle_timeout = idle_timeout
+        self._last_heard = self._last_active = now
+        self._dropped = 0
+        self._awaiting_pong = False
+        self._released = False
+        self._buckets = None
+        self._user_id = None
+        if rate_limit_user is not None and settings.WS_RATE_LIMIT_ENABLED:
+            self._user_id = rate_limit_user
+            self._buckets = (
+                TokenBucket(settings.WS_CONN_MSG_RATE, settings.WS_CONN_MSG_BURST),
+                TokenBucket(settings.WS_CONN_BYTE_RATE, settings.WS_CONN_BYTE_BURST),
+                *acquire_user_buckets(rate_limit_user),
+            )
+        self._keepalive_task = asyncio.ensure_future(self._keepalive()) if keepalive else None
+
+    async def guard_release(self):
+        """Leave the group and drop per-connection state. Safe to call twice."""
+        if getattr(self, '_released', True):
+            return
+        self._released = True
+        task = self._keepalive_task
+        if task is not None and task is not asyncio.current_task():
+            task.cancel()
+        if self._user_id is not None:
+            release_user_buckets(self._user_id)
+        await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    def guard_activity(self):
+        self._last_active = time.monotonic()
+
+    async def guard_receive(self, text_data, bytes_data) -> bool:
+        """Handle keepalive and limits for one inbound frame; True if it should be relayed."""
+        now = time.monotonic()
+        self._last_heard = now
+        kind = control_type(text_data)
+        if kind == 'pong' and self._awaiting_pong:
+            self._awaiting_pong = False
+            return False
+
+        size = len(text_data.encode()) if text_data is not None else len(bytes_data or b'')
+        if size > settings.WS_MAX_FRAME_BYTES:
+            await self._reap(CLOSE_TOO_BIG)
+            return False
+        if self._buckets is not None:
+            if not consume(self._buckets, (1, size, 1, size), now):
+                self._dropped += 1
+                if self._dropped >= settings.WS_MAX_DROPPED:
+                    await self._reap(CLOSE_RATE_LIMITED)
+                else:
+                    await self.send(text_data='{"type":"error","code":"rate_limited"}')
+                return False
+            self._dropped = 0
+        if kind == 'ping':
+            await self.send(text_data='{"type":"pong"}')
+        if kind is not None:
+            return False
+        self._last_active = now
+        return True
+
+    async def _reap(self, code):
+        await self.guard_release()
+        await self.close(code=code)
+
+    async def _keepalive(self):
+        interval, timeout = settings.WS_PING_INTERVAL, settings.WS_PONG_TIMEOUT
+        while True:
+            await asyncio.sleep(max(0.0, interval - timeout))
+            if self._idle_timeout is not None and time.monotonic() - self._last_active > self._idle_timeout:
+                await self._reap(CLOSE_IDLE)
+                return
+            sent = time.monotonic()
+            try:
+                self._awaiting_pong = True
+                await self.send(text_data='{"type":"ping"}')
+            except Exception:
+                # The socket closed under us; its disconnect handler may not have run yet.
+                await self.guard_release()
+                return
+            await asyncio.sleep(timeout)
+            if self._last_heard < sent:
+                await self._reap(CLOSE_TIMEOUT)
+                return
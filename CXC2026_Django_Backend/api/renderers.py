@@ -0,0 +1,43 @@
+"""
+orjson-backed JSON renderer.
+
+Enabled with API_JSON_BACKEND=orjson (see config/settings.py). For the
+default compact/unicode settings the output parses to the same values as
+DRF's JSONRenderer, and is byte-identical except for floats:
+
+- exponents are not zero-padded (1e-07 renders as 1e-7);
+- NaN and +/-Infinity render as null, where DRF's strict mode raises.
+
+Anything orjson cannot encode at all (e.g. integers wider than 64 bits)
+falls back to the stock path.
+"""
+import orjson
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+_fallback_encoder = JSONEncoder()
+
+
+class ORJSONRenderer(JSONRenderer):
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        renderer_context = renderer_context or {}
+        # orjson only does compact, non-ASCII-escaped output; pretty printing
+        # (browsable API, `; indent=`) and the non-default settings go the
+        # stock route.
+        if (self.get_indent(accepted_media_type, renderer_context) is not None
+                or self.ensure_ascii or not self.compact):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=_fallback_encoder.default, option=_OPTIONS)
+        except orjson.JSONEncodeError:
+            # e.g. integers wider than 64 bits.
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Same JavaScript-subset escaping as JSONRenderer.
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
@@ -0,0 +1,276 @@
+"""
+On-demand renditions of bucket images, cropped around the stored focal point.
+
+GET /api/images/<uuid>/rendition/?w=&ar=&fmt= crops the image exactly as
+CSS `object-fit: cover; object-position: x% y%` would for a box of aspect
+`ar`, using the profile's avatar_x/y or banner_x/y (personal photos use the
+centre), then scales it to `w` pixels wide. The client asks for its
+element's size times devicePixelRatio and gets exactly those pixels instead
+of the full original. To bound how many distinct renditions one image can
+have, `w` is rounded up to the next RENDITION_WIDTHS step and `ar` snapped
+to the nearest of ASPECTS; the element's own `object-fit: cover` absorbs
+the difference.
+
+Results are cached on disk under RENDITION_CACHE_DIR, one directory per
+image uuid. File names carry the focal point, so a moved focal point never
+serves a stale crop. Older crops are purged when the image is next rendered,
+or right away through invalidate(). The cache is held under
+RENDITION_CACHE_MAX_BYTES by evicting the least recently used files.
+Recency is the file's mtime, bumped on every hit.
+"""
+import io
+import math
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from PIL import Image, ImageOps, features
+
+from .models import BucketAvatarImage, BucketBannerImage, BucketPersonalImage, bucket_shard, focal_token
+
+FORMATS = {'jpeg': ('JPEG', 'image/jpeg'), 'webp': ('WEBP', 'image/webp'), 'png': ('PNG', 'image/png')}
+if features.check('avif'):
+    FORMATS['avif'] = ('AVIF', 'image/avif')
+_SAVE_OPTIONS = {'JPEG': {'quality': 82, 'optimize': True, 'progressive': True}, 'WEBP': {'quality': 80, 'method': 4},
+                 'AVIF': {'quality': 60}, 'PNG': {'optimize': True}}
+
+# Unreadable, missing or absurdly large source files.
+RENDER_ERRORS = (OSError, Image.DecompressionBombError)
+
+_EXIF_ORIENTATION = 0x0112
+
+# Aspect ratios (width / height) renditions are cropped to.
+ASPECTS = tuple(sorted({w / h for w, h in (
+    (1, 5), (1, 4), (1, 3), (1, 2), (9, 16), (2, 3), (3, 4), (4, 5), (1, 1),
+    (5, 4), (4, 3), (3, 2), (16, 9), (2, 1), (3, 1), (4, 1), (5, 1),
+)}))
+SWEEP_INTERVAL = 60  # seconds between eviction passes per process
+_sweep_lock = threading.Lock()
+_last_sweep = 0.0
+
+
+# ── Lookup and parameters ─────────────────────────────────────────────────────
+
+def find_image(image_uuid):
+    """(bucket image, (focal_x, focal_y)) for `image_uuid`, or (None, None)."""
+    for model, focal in (
+        (BucketAvatarImage, lambda p: (p.avatar_x, p.avatar_y)),
+        (BucketBannerImage, lambda p: (p.banner_x, p.banner_y)),
+        (BucketPersonalImage, lambda p: (50.0, 50.0)),
+    ):
+        img = model.objects.select_related('profile').filter(uuid=image_uuid).first()
+        if img is not None:
+            return img, focal(img.profile)
+    return None, None
+
+
+def snap_width(width: int) -> int:
+    """The smallest RENDITION_WIDTHS step at least `width` wide."""
+    return next((w for w in settings.RENDITION_WIDTHS if w >= width), settings.RENDITION_WIDTHS[-1])
+
+
+def snap_aspect(aspect: float) -> float:
+    """The entry of ASPECTS closest to `aspect` (by ratio, so 2:1 and 1:2 are equally far from 1:1)."""
+    return min(ASPECTS, key=lambda a: abs(math.log(a / aspect)))
+
+
+def parse_params(query, accept=''):
+    """
+    Validate rendition query parameters and snap `w` and `ar` to the allowed
+    steps. Raises ValueError with a message for the client. `fmt` defaults
+    to WebP when the client accepts it.
+    """
+    params = {}
+    try:
+        params['width'] = int(query['w']) if query.get('w') else None
+    except ValueError:
+        raise ValueError('w must be an integer.')
+    max_width = settings.RENDITION_WIDTHS[-1]
+    if params['width'] is not None:
+        if not 1 <= params['width'] <= max_width:
+            raise ValueError(f'w must be between 1 and {max_width}.')
+        params['width'] = snap_width(params['width'])
+
+    ar = query.get('ar')
+    try:
+        if not ar:
+            params['aspect'] = None
+        elif ':' in ar:
+            num, den = ar.split(':', 1)
+            params['aspect'] = float(num) / float(den)
+        else:
+            params['aspect'] = float(ar)
+    except (ValueError, ZeroDivisionError):
+        raise ValueError('ar must look like 16:9 or 1.5.')
+    if params['aspect'] is not None:
+        if not 0.1 <= params['aspect'] <= 10:
+            raise ValueError('ar must be between 0.1 and 10.')
+        params['aspect'] = snap_aspect(params['aspect'])
+
+    fmt = query.get('fmt') or ('webp' if 'image/webp' in accept else 'jpeg')
+    if fmt == 'jpg':
+        fmt = 'jpeg'
+    if fmt not in FORMATS:
+        raise ValueError(f"fmt must be one of {', '.join(FORMATS)}.")
+    params['fmt'] = fmt
+    return params
+
+
+# ── Rendering ─────────────────────────────────────────────────────────────────
+
+def cover_box(size, aspect, focal):
+    """
+    Source rectangle that `object-fit: cover` with `object-position: fx% fy%`
+    shows in a box of `aspect`: the overflow on the cropped axis is split
+    fx : (100 - fx).
+    """
+    width, height = size
+    if aspect is None:
+        return 0.0, 0.0, float(width), float(height)
+    fx, fy = (min(100.0, max(0.0, f)) / 100 for f in focal)
+    if width / height > aspect:
+        crop = height * aspect
+        left = (width - crop) * fx
+        return left, 0.0, left + crop, float(height)
+    crop = width / aspect
+    top = (height - crop) * fy
+    return 0.0, top, float(width), top + crop
+
+
+def render(path, focal, width, aspect, fmt) -> bytes:
+    with Image.open(path) as source:
+        if width:
+            # Let JPEG decode at 1/2, 1/4 or 1/8 scale when that still covers the output.
+            upright = source.size[::-1] if source.getexif().get(_EXIF_ORIENTATION, 1) in (5, 6, 7, 8) else source.size
+            left, _, right, _ = cover_box(upright, aspect, focal)
+            scale = width / (right - left)
+            if scale < 1:
+                source.draft(source.mode, (math.ceil(source.width * scale), math.ceil(source.height * scale)))
+        img = ImageOps.exif_transpose(source)  # focal points refer to the upright image
+        left, top, right, bottom = cover_box(img.size, aspect, focal)
+        crop_w, crop_h = right - left, bottom - top
+        # Never upscale: a larger request gets the crop at native resolution.
+        out_w = min(width or math.floor(crop_w), math.floor(crop_w))
+        out_h = max(1, round(out_w * crop_h / crop_w))
+        out = img.resize((max(1, out_w), out_h), Image.Resampling.LANCZOS,
+                         box=(left, top, right, bottom), reducing_gap=3.0)
+        pil_format = FORMATS[fmt][0]
+        if pil_format == 'JPEG' and out.mode not in ('RGB', 'L'):
+            out = out.convert('RGB')
+        buf = io.BytesIO()
+        out.save(buf, pil_format, **_SAVE_OPTIONS[pil_format])
+    return buf.getvalue()
+
+
+# ── Disk cache ────────────────────────────────────────────────────────────────
+
+def _ignore_missing(fn, *args):
+    try:
+        return fn(*args)
+    except FileNotFoundError:
+        return None
+
+
+def _image_dir(image_uuid) -> Path:
+    return Path(settings.RENDITION_CACHE_DIR) / bucket_shard(image_uuid) / str(image_uuid)
+
+
+def cache_name(focal, params) -> str:
+    aspect = f"{params['aspect']:.4g}" if params['aspect'] else 'orig'
+    return f"{focal_token(focal)}-w{params['width'] or 'orig'}-ar{aspect}.{params['fmt']}"
+
+
+def get_or_render(img, focal, params) -> Path:
+    """Path of the cached rendition, rendering it first on a miss."""
+    directory = _image_dir(img.uuid)
+    path = directory / cache_name(focal, params)
+    try:
+        os.utime(path)  # hit: mark as recently used
+        return path
+    except FileNotFoundError:
+        pass
+
+    data = render(img.file.path, focal, params['width'], params['aspect'], params['fmt'])
+    directory.mkdir(parents=True, exist_ok=True)
+    tmp = directory / f'.{path.name}.{os.getpid()}.{threading.get_ident()}'
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+    # Crops for an earlier focal point can never be requested again.
+    prefix = f'{focal_token(focal)}-'
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if not entry.name.startswith((prefix, '.')):
+                _ignore_missing(os.unlink, entry.path)
+    maybe_sweep()
+    return path
+
+
+def open_rendition(img, focal, params):
+    """
+    get_or_render(), opened for reading. Invalidation or a sweep in another
+    request can remove the cached file before it is opened; it is then
+    rendered once more.
+    """
+    try:
+        return open(get_or_render(img, focal, params), 'rb')
+    except FileNotFoundError:
+        return open(get_or_render(img, focal, params), 'rb')
+
+
+def invalidate(image_uuids):
+    """Drop every cached rendition of these images."""
+    for image_uuid in image_uuids:
+        shutil.rmtree(_image_dir(image_uuid), ignore_errors=True)
+
+
+def sweep(max_bytes=None):
+    """Evict least recently used renditions until the cache is under 90% of its limit."""
+    max_bytes = settings.RENDITION_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    files, total = [], 0
+    stack = [str(settings.RENDITION_CACHE_DIR)]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                    continue
+                st = _ignore_missing(entry.stat)
+                if st is not None:
+                    files.append((st.st_mtime, st.st_size, entry.path))
+                    total += st.st_size
+    if total <= max_bytes:
+        return 0
+    evicted = 0
+    target = max_bytes * 0.9
+    for _, size, path in sorted(files):
+        if total <= target:
+            break
+        _ignore_missing(os.unlink, path)
+        total -= size
+        evicted += 1
+    return evicted
+
+
+def maybe_sweep():
+    """Run sweep() on a background thread, at most once per SWEEP_INTERVAL per process."""
+    global _last_sweep
+    now = time.monotonic()
+    if now - _last_sweep < SWEEP_INTERVAL or not _sweep_lock.acquire(blocking=False):
+        return
+    _last_sweep = now
+
+    def run():
+        try:
+            sweep()
+        finally:
+            _sweep_lock.release()
+
+    threading.Thread(target=run, name='rendition-sweep', daemon=True).start()
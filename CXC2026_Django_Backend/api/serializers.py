@@ -1,6 +1,7 @@
 from django.contrib.auth.models import User
+from django.urls import reverse
 from rest_framework import serializers
-from .models import Profile, BucketAvatarImage, BucketBannerImage, BucketPersonalImage
+from .models import Profile, BucketAvatarImage, BucketBannerImage, BucketPersonalImage, ImportJob, focal_token
 
 
 class RegisterSerializer(serializers.Serializer):
@@ -35,21 +36,46 @@ class ProfileSerializer(serializers.ModelSerializer):
     avatar_urls = serializers.SerializerMethodField()
     banner_url = serializers.SerializerMethodField()
     banner_urls = serializers.SerializerMethodField()
+    distance_km = serializers.SerializerMethodField()
+    avatar_rendition_urls = serializers.SerializerMethodField()
+    banner_rendition_urls = serializers.SerializerMethodField()
 
     class Meta:
         model = Profile
         fields = [
             'id', 'user_id', 'uuid', 'display_name', 'age', 'gender', 'bio',
-            'avatar_url', 'avatar_urls', 'avatar_x', 'avatar_y',
-            'banner_url', 'banner_urls', 'banner_x', 'banner_y',
-            'location', 'looking_for', 'interests',
+            'avatar_url', 'avatar_urls', 'avatar_rendition_urls', 'avatar_x', 'avatar_y',
+            'banner_url', 'banner_urls', 'banner_rendition_urls', 'banner_x', 'banner_y',
+            'location', 'latitude', 'longitude', 'distance_km', 'looking_for', 'interests',
             'compatibility_score', 'online_status', 'type',
         ]
         read_only_fields = [
             'id', 'user_id', 'uuid', 'compatibility_score', 'type',
             'avatar_url', 'avatar_urls', 'banner_url', 'banner_urls',
+            'avatar_rendition_urls', 'banner_rendition_urls', 'latitude', 'longitude', 'distance_km',
         ]
 
+    # What a PUT to /profiles/me/ can change; the profile ETag covers exactly these.
+    EDITABLE_FIELDS = tuple(sorted(set(Meta.fields) - set(Meta.read_only_fields), key=Meta.fields.index))
+
+    def save_changes(self, *, if_unchanged=True) -> bool:
+        """
+        Use instead of save(): write only the columns whose value changes, so a
+        no-op edit writes nothing. With `if_unchanged`, returns False if a
+        concurrent write got to the row first (Profile.save_if_unchanged);
+        reload it and retry or report a conflict.
+        """
+        instance = self.instance
+        changed = [name for name, value in self.validated_data.items() if getattr(instance, name) != value]
+        for name in changed:
+            setattr(instance, name, self.validated_data[name])
+        if not changed:
+            return True
+        if if_unchanged:
+            return instance.save_if_unchanged(changed)
+        instance.save(update_fields=[*changed, 'updated_at'])
+        return True
+
     def _abs_url(self, request, file_field):
         if not file_field:
             return None
@@ -64,6 +90,11 @@ class ProfileSerializer(serializers.ModelSerializer):
         img = obj.active_banner
         return self._abs_url(self.context.get('request'), img.file if img else None)
 
+    def get_distance_km(self, obj):
+        # Only set by the proximity queries in api/geo.py.
+        d = getattr(obj, 'distance_km', None)
+        return round(d, 1) if d is not None else None
+
     def get_avatar_urls(self, obj):
         request = self.context.get('request')
         return [self._abs_url(request, img.file) for img in obj.avatar_images.all()]
@@ -71,3 +102,30 @@ class ProfileSerializer(serializers.ModelSerializer):
     def get_banner_urls(self, obj):
         request = self.context.get('request')
         return [self._abs_url(request, img.file) for img in obj.banner_images.all()]
+
+    def _rendition_urls(self, images, focal):
+        # Parallel to *_urls. `v` changes with the focal point, so clients may
+        # cache these forever; append &w=&ar= for the displayed size.
+        request = self.context.get('request')
+        version = focal_token(focal)
+        urls = []
+        for img in images:
+            url = f"{reverse('image_rendition', args=[img.uuid])}?v={version}"
+            urls.append(request.build_absolute_uri(url) if request else url)
+        return urls
+
+    def get_avatar_rendition_urls(self, obj):
+        return self._rendition_urls(obj.avatar_images.all(), (obj.avatar_x, obj.avatar_y))
+
+    def get_banner_rendition_urls(self, obj):
+        return self._rendition_urls(obj.banner_images.all(), (obj.banner_x, obj.banner_y))
+
+
+class ImportJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ImportJob
+        fields = [
+            'id', 'manifest', 'images_dir', 'status', 'created', 'skipped', 'failed',
+            'errors', 'error', 'started_at', 'finished_at',
+        ]
+        read_only_fields = [f for f in fields if f not in ('manifest', 'images_dir')]
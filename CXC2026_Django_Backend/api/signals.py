@@ -0,0 +1,36 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import (
+    BucketAvatarImage, BucketBannerImage, BucketPersonalImage,
+    Profile, ProfileTombstone, next_change_versions,
+)
+
+
+@receiver(post_delete, sender=Profile)
+def record_profile_tombstone(sender, instance, **kwargs):
+    ProfileTombstone.objects.create(
+        profile_id=instance.pk,
+        uuid=instance.uuid,
+        change_version=next_change_versions()[0],
+    )
+
+
+@receiver(post_save, sender=BucketAvatarImage)
+@receiver(post_save, sender=BucketBannerImage)
+@receiver(post_save, sender=BucketPersonalImage)
+@receiver(post_delete, sender=BucketAvatarImage)
+@receiver(post_delete, sender=BucketBannerImage)
+@receiver(post_delete, sender=BucketPersonalImage)
+def touch_profile_on_image_change(sender, instance, **kwargs):
+    """Image lists are part of the serialized profile, so they bump its version."""
+    Profile(pk=instance.profile_id).touch()
+
+
+@receiver(post_delete, sender=BucketAvatarImage)
+@receiver(post_delete, sender=BucketBannerImage)
+@receiver(post_delete, sender=BucketPersonalImage)
+def drop_image_renditions(sender, instance, **kwargs):
+    from .renditions import invalidate  # keeps Pillow out of app startup
+
+    invalidate([instance.uuid])
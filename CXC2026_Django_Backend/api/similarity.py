@@ -0,0 +1,114 @@
+"""
+Near-duplicate lookup over the bucket images' perceptual hashes.
+
+Each image stores its 64-bit dHash whole and as four indexed 16-bit chunks
+(models.PerceptualHash). Multi-index hashing: if two hashes differ in at most
+k bits, then by pigeonhole at least one of the four chunks differs in at
+most k // 4 bits. A query therefore enumerates, per chunk, every 16-bit
+value within that radius of the probe's chunk. It fetches the rows matching
+any of them through the chunk indexes, then checks the full distance with a
+popcount. For the distances this is useful at (k <= 12, radius <= 3) that
+is at most 4 x 697 index probes per table, independent of the table size.
+
+Rows saved through the ORM are hashed on save. Imports hash in their worker
+pool, and `./manage.py backfill_phash` hashes rows that predate the columns.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import reduce
+from itertools import combinations
+from operator import or_
+
+from django.db.models import Q
+
+from .imaging import dhash_file
+from .media_gc import BUCKET_MODELS
+from .models import phash_chunks
+
+MAX_DISTANCE = 12
+DEFAULT_DISTANCE = 6
+_CHUNK_FIELDS = ('phash_0', 'phash_1', 'phash_2', 'phash_3')
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def _neighbours(value: int, radius: int) -> list[int]:
+    """Every 16-bit value within `radius` bits of `value`."""
+    out = [value]
+    for r in range(1, radius + 1):
+        for bits in combinations(range(16), r):
+            out.append(value ^ sum(1 << b for b in bits))
+    return out
+
+
+def candidate_filter(phash: int, k: int) -> Q:
+    """Q matching every row that could be within `k` bits of `phash` (a superset)."""
+    radius = k // 4
+    return reduce(or_, (
+        Q(**{f'{field}__in': _neighbours(chunk, radius)})
+        for field, chunk in zip(_CHUNK_FIELDS, phash_chunks(phash))
+    ))
+
+
+def find_similar(phash: int, k: int = DEFAULT_DISTANCE, *, exclude=None) -> list:
+    """
+    (bucket, image, distance) for every bucket image within `k` bits of
+    `phash`, closest first. `exclude` is an image uuid to leave out.
+    """
+    if not 0 <= k <= MAX_DISTANCE:
+        raise ValueError(f'k must be between 0 and {MAX_DISTANCE}.')
+    where = candidate_filter(phash, k)
+    matches = []
+    for bucket, model in BUCKET_MODELS.items():
+        rows = model.objects.filter(where).only('uuid', 'file', 'profile_id', 'phash')
+        if exclude is not None:
+            rows = rows.exclude(uuid=exclude)
+        for img in rows:
+            distance = hamming(phash, img.phash_value)
+            if distance <= k:
+                matches.append((bucket, img, distance))
+    matches.sort(key=lambda m: m[2])
+    return matches
+
+
+def backfill(*, batch_size=500, workers=None, progress=None) -> dict:
+    """
+    Hash bucket rows that have a file but no phash yet. Files are read in a
+    process pool (`workers`, default CPU count; 0 hashes inline). Unreadable
+    files are counted and left unhashed.
+    """
+    stats = {'hashed': 0, 'unreadable': 0}
+    pool = None
+    if workers != 0:
+        pool = ProcessPoolExecutor(workers or os.cpu_count(), mp_context=multiprocessing.get_context('spawn'))
+    try:
+        for model in BUCKET_MODELS.values():
+            last_pk = 0
+            while True:
+                rows = list(
+                    model.objects.filter(phash__isnull=True, pk__gt=last_pk).exclude(file='')
+                    .order_by('pk').only('pk', 'file')[:batch_size]
+                )
+                if not rows:
+                    break
+                last_pk = rows[-1].pk
+                paths = [row.file.path for row in rows]
+                hashes = pool.map(dhash_file, paths) if pool else map(dhash_file, paths)
+                done = []
+                for row, value in zip(rows, hashes):
+                    if value is None:
+                        stats['unreadable'] += 1
+                        continue
+                    row.set_phash(value)
+                    done.append(row)
+                model.objects.bulk_update(done, model.PHASH_FIELDS)
+                stats['hashed'] += len(done)
+                if progress:
+                    progress(stats)
+    finally:
+        if pool:
+            pool.shutdown(wait=True, cancel_futures=True)
+    return stats
@@ -1,26 +1,1072 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import decimal
+import gzip
+import io
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+from unittest import mock, skipIf
+from urllib.parse import quote
 
-# Create your tests here.
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import User
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image, ImageFilter
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
 
+from config.asgi import application
+from config.data_dirs import ensure_data_dirs
 
-# Note: The tests below rely upon static assets (for the rendered templates), so require that either:
-# 1. The static assets have been processed - ie: `./manage.py collectstatic` has been run.
-# 2. Or, the tests are run in debug mode (which means WhiteNoise will use auto-refresh mode),
-#    using: `./manage.py test --debug-mode`
-class ExampleTest(TestCase):
-    def test_index_page(self):
-        response = self.client.get("/")
-        self.assertContains(
-            response, "Getting Started with Python on Heroku", status_code=200
+from . import loadtest, relay, renditions
+from .feeds import refresh, seen_decode, seen_encode
+from .geo import geohash_encode
+from .importer import run_import
+from .loadtest import percentile, sample_jpeg
+from .media_gc import collect
+from .media_layout import shard_all
+from .middleware import CompressionMiddleware, negotiate_encoding
+from .models import (
+    BucketAvatarImage, BucketBannerImage, BucketPersonalImage, Feed, ImportJob, Profile, bucket_shard,
+)
+from .consumers import AgentConsumer, ChatConsumer
+from .profiling import ProfilingMiddleware, StackSampler, make_token
+from .renditions import cover_box, snap_aspect, snap_width, sweep
+from .similarity import find_similar, hamming
+from .views import PROFILE_PUT_ATTEMPTS
+
+try:
+    from .parsers import ORJSONParser
+    from .renderers import ORJSONRenderer
+except ImportError:  # orjson is an optional extra
+    ORJSONParser = ORJSONRenderer = None
+
+
+def setUpModule():
+    # What gunicorn's on_starting hook does before serving: the session store needs its directory.
+    ensure_data_dirs()
+
+
+class APITestCase(TestCase):
+    """Helpers for tests that call the API as a logged-in user."""
+
+    def make_profile(self, username, **fields):
+        user = User.objects.create_user(username=username, email=username if "@" in username else "")
+        return Profile.objects.create(user=user, **fields)
+
+    def authenticate(self, user):
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+
+    def use_temp_dir(self, **subdirs):
+        """A temp dir for this test; each keyword sets that setting to a subdirectory of it."""
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        overrides = override_settings(**{name: str(Path(tmp.name, sub)) for name, sub in subdirs.items()})
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        return Path(tmp.name)
+
+
+class ProfileProximityTest(APITestCase):
+    def setUp(self):
+        for email, location in [
+            ("me@example.com", "Waterloo, ON"),
+            ("kitchener@example.com", "Kitchener"),
+            ("toronto@example.com", "Toronto, ON, CA"),
+            ("vancouver@example.com", "Vancouver"),
+            ("nowhere@example.com", "Somewhere unknown"),
+        ]:
+            self.make_profile(email, display_name=email, location=location)
+        self.me = User.objects.get(username="me@example.com")
+        self.authenticate(self.me)
+
+    def names(self, response):
+        self.assertEqual(response.status_code, 200)
+        return [p["display_name"] for p in response.json()]
+
+    def test_geohash_encode(self):
+        self.assertEqual(geohash_encode(42.6, -5.6, 5), "ezs42")
+
+    def test_location_resolved_on_save(self):
+        profile = Profile.objects.get(user=self.me)
+        self.assertAlmostEqual(profile.latitude, 43.4643)
+        self.assertTrue(profile.geohash.startswith("dpwxr"))
+        profile.location = "nowhere"
+        profile.save(update_fields=["location"])
+        profile.refresh_from_db()
+        self.assertIsNone(profile.latitude)
+        self.assertEqual(profile.geohash, "")
+
+    def test_radius(self):
+        response = self.client.get("/api/profiles/", {"near": "me", "radius_km": 20})
+        self.assertEqual(self.names(response), ["me@example.com", "kitchener@example.com"])
+        response = self.client.get("/api/profiles/", {"near": "me", "radius_km": 150})
+        self.assertIn("toronto@example.com", self.names(response))
+
+    def test_k_nearest(self):
+        response = self.client.get("/api/profiles/", {"lat": 43.7, "lon": -79.4, "k": 2})
+        self.assertEqual(self.names(response), ["toronto@example.com", "kitchener@example.com"])
+        self.assertIsNotNone(response.json()[0]["distance_km"])
+
+    def test_invalid_params(self):
+        response = self.client.get("/api/profiles/", {"lat": "abc", "lon": 1})
+        self.assertEqual(response.status_code, 400)
+        for radius in ("nan", "inf", "-1"):
+            response = self.client.get("/api/profiles/", {"near": "me", "radius_km": radius})
+            self.assertEqual(response.status_code, 400)
+
+    def test_limits_are_clamped(self):
+        response = self.client.get("/api/profiles/", {"near": "me", "radius_km": 1e300})
+        self.assertNotIn("vancouver@example.com", self.names(response))  # clamped to 500 km
+        self.assertEqual(len(self.names(self.client.get("/api/profiles/", {"near": "me", "k": 10**9}))), 4)
+
+
+class ProfileSyncTest(APITestCase):
+    def setUp(self):
+        self.profiles = [self.make_profile(f"u{i}@example.com", display_name=f"u{i}") for i in range(3)]
+        self.authenticate(self.profiles[0].user)
+
+    def sync(self, since=0, **params):
+        response = self.client.get("/api/profiles/sync/", {"since": since, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_snapshot_then_delta(self):
+        snapshot = self.sync()
+        self.assertEqual([p["display_name"] for p in snapshot["changed"]], ["u0", "u1", "u2"])
+        self.assertFalse(snapshot["has_more"])
+
+        self.assertEqual(self.sync(snapshot["cursor"])["changed"], [])
+
+        self.profiles[1].bio = "updated"
+        self.profiles[1].save()
+        deleted_id = self.profiles[2].pk
+        self.profiles[2].user.delete()
+
+        delta = self.sync(snapshot["cursor"])
+        self.assertEqual([p["display_name"] for p in delta["changed"]], ["u1"])
+        self.assertEqual(delta["deleted"], [deleted_id])
+        self.assertGreater(delta["cursor"], snapshot["cursor"])
+
+    def test_paging(self):
+        page = self.sync(limit=2)
+        self.assertEqual(len(page["changed"]), 2)
+        self.assertTrue(page["has_more"])
+        page = self.sync(page["cursor"], limit=2)
+        self.assertEqual([p["display_name"] for p in page["changed"]], ["u2"])
+        self.assertFalse(page["has_more"])
+
+    def test_image_change_bumps_version(self):
+        cursor = self.sync()["cursor"]
+        img = BucketPersonalImage(profile=self.profiles[0], file="img_personal/x.jpg")
+        img.save()
+        self.assertEqual([p["display_name"] for p in self.sync(cursor)["changed"]], ["u0"])
+
+
+class ProfileBatchTest(APITestCase):
+    def setUp(self):
+        self.profiles = [self.make_profile(f"b{i}@example.com", display_name=f"b{i}") for i in range(3)]
+        self.authenticate(self.profiles[0].user)
+
+    def test_batch_by_id_and_uuid(self):
+        a, b, _ = self.profiles
+        ids = f"{a.pk},999999,nope,99999999999999999999999,-1"
+        with self.assertNumQueries(3):  # one IN query + one pass per prefetched relation
+            response = self.client.get("/api/profiles/batch/", {"ids": ids, "uuids": str(b.uuid)})
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body["results"][str(a.pk)]["display_name"], "b0")
+        self.assertEqual(body["results"][str(b.uuid)]["display_name"], "b1")
+        self.assertEqual(body["errors"], {
+            "999999": "Not found.", "nope": "Invalid id.", "99999999999999999999999": "Invalid id.", "-1": "Invalid id.",
+        })
+
+    def test_batch_limit(self):
+        ids = ",".join(str(i) for i in range(101))
+        self.assertEqual(self.client.get("/api/profiles/batch/", {"ids": ids}).status_code, 400)
+        self.assertEqual(self.client.get("/api/profiles/batch/").status_code, 400)
+
+
+@skipIf(ORJSONRenderer is None, "orjson not installed")
+class ORJSONRendererTest(TestCase):
+    def test_matches_stdlib_renderer(self):
+        data = {
+            "uuid": uuid.UUID("12345678-1234-5678-1234-567812345678"),
+            "when": datetime.datetime(2026, 1, 2, 3, 4, 5, 678901, tzinfo=datetime.timezone.utc),
+            "day": datetime.date(2026, 1, 2),
+            "price": decimal.Decimal("12.50"),
+            "text": "h\u00e9llo \u2028 w\u00f6rld \u2029",
+            "nested": [{"a": 1.5, "b": None, "c": True}],
+            7: "int key",
+        }
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(ORJSONRenderer().render(None), b"")
+
+    def test_documented_float_differences(self):
+        self.assertEqual(ORJSONRenderer().render([1e-07, 1e16]), b"[1e-7,1e+16]")
+        self.assertEqual(json.loads(ORJSONRenderer().render([1e-07])), json.loads(JSONRenderer().render([1e-07])))
+        self.assertEqual(ORJSONRenderer().render([float("nan")]), b"[null]")
+
+    def test_parser(self):
+        self.assertEqual(ORJSONParser().parse(io.BytesIO('{"a": [1, "é"]}'.encode())), {"a": [1, "é"]})
+        with self.assertRaises(ParseError):
+            ORJSONParser().parse(io.BytesIO(b'{"a": NaN}'))
+
+
+class CompressionMiddlewareTest(APITestCase):
+    def setUp(self):
+        for i in range(20):
+            profile = self.make_profile(f"c{i}@example.com", display_name=f"c{i}", bio="lorem ipsum " * 20)
+        self.authenticate(profile.user)
+
+    def test_negotiation(self):
+        self.assertEqual(negotiate_encoding("gzip, deflate", ["zstd", "br", "gzip"]), "gzip")
+        self.assertEqual(negotiate_encoding("gzip;q=0.5, br;q=0, *;q=0.1", ["gzip"]), "gzip")
+        self.assertIsNone(negotiate_encoding("gzip;q=0", ["gzip"]))
+        self.assertIsNone(negotiate_encoding("", ["gzip"]))
+
+    def test_gzip_json(self):
+        plain = self.client.get("/api/profiles/")
+        self.assertNotIn("Content-Encoding", plain)
+        with override_settings(API_COMPRESSION_ENCODINGS=["gzip"]):
+            for _ in range(2):  # second hit is served from the compressed-body cache
+                response = self.client.get("/api/profiles/", HTTP_ACCEPT_ENCODING="gzip, br")
+                self.assertEqual(response["Content-Encoding"], "gzip")
+                self.assertIn("Accept-Encoding", response["Vary"])
+                self.assertEqual(gzip.decompress(response.content), plain.content)
+
+    def test_streaming_and_images(self):
+        request = RequestFactory().get("/media/x", HTTP_ACCEPT_ENCODING="gzip")
+        with override_settings(API_COMPRESSION_ENCODINGS=["gzip"]):
+            image = HttpResponse(b"\xff" * 4096, content_type="image/jpeg")
+            response = CompressionMiddleware(lambda r: image)(request)
+            self.assertNotIn("Content-Encoding", response)
+
+            stream = StreamingHttpResponse((b"chunk %d\n" % i for i in range(500)), content_type="text/plain")
+            response = CompressionMiddleware(lambda r: stream)(request)
+            self.assertEqual(response["Content-Encoding"], "gzip")
+            body = gzip.decompress(b"".join(response.streaming_content))
+            self.assertEqual(body, b"".join(b"chunk %d\n" % i for i in range(500)))
+
+
+class HealthTest(TestCase):
+    def test_health(self):
+        response = self.client.get("/api/health/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["status"], "ok")
+
+    def test_url_conf_does_not_import_pillow(self):
+        script = (
+            "import sys, django; django.setup(); from django.urls import get_resolver; "
+            "get_resolver().url_patterns; sys.exit('PIL' in sys.modules)"
+        )
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": "config.settings"}
+        self.assertEqual(subprocess.run([sys.executable, "-c", script], env=env).returncode, 0)
+
+
+class WebSocketRelayTest(TestCase):
+    async def test_relay_through_lazy_router(self):
+        class FakeUser:
+            id = 1
+
+        token = str(AccessToken.for_user(FakeUser()))
+        agent = WebsocketCommunicator(application, "/ws/agent/7/")
+        browser = WebsocketCommunicator(application, f"/ws/chat/7/?token={token}")
+        self.assertTrue((await agent.connect())[0])
+        self.assertTrue((await browser.connect())[0])
+
+        await browser.send_to(text_data='{"message": "hi"}')
+        self.assertEqual(await agent.receive_from(), '{"message": "hi"}')
+        await agent.send_to(text_data='{"message": "hello"}')
+        self.assertEqual(await browser.receive_from(), '{"message": "hello"}')
+
+        await browser.disconnect()
+        await agent.disconnect()
+
+    async def test_chat_requires_token(self):
+        browser = WebsocketCommunicator(application, "/ws/chat/7/")
+        connected, code = await browser.connect()
+        self.assertFalse(connected)
+        self.assertEqual(code, 4001)
+
+
+class RelayGuardTest(TestCase):
+    def _token(self, user_id):
+        class FakeUser:
+            id = user_id
+
+        return str(AccessToken.for_user(FakeUser()))
+
+    async def test_rate_limits_per_connection_and_per_user(self):
+        with override_settings(WS_CONN_MSG_RATE=0.001, WS_CONN_MSG_BURST=3,
+                               WS_USER_MSG_RATE=0.001, WS_USER_MSG_BURST=4, WS_MAX_DROPPED=3):
+            agent = WebsocketCommunicator(application, "/ws/agent/8/")
+            first = WebsocketCommunicator(application, f"/ws/chat/8/?token={self._token(5)}")
+            second = WebsocketCommunicator(application, f"/ws/chat/8/?token={self._token(5)}")
+            for communicator in (agent, first, second):
+                self.assertTrue((await communicator.connect())[0])
+
+            for n in range(4):
+                await first.send_to(text_data=f'{{"n": {n}}}')
+            self.assertEqual([await agent.receive_from() for _ in range(3)], ['{"n": 0}', '{"n": 1}', '{"n": 2}'])
+            self.assertEqual(await first.receive_json_from(), {"type": "error", "code": "rate_limited"})
+
+            # The second connection still has its own burst, but the user's is nearly spent.
+            await second.send_to(text_data='{"n": 4}')
+            self.assertEqual(await agent.receive_from(), '{"n": 4}')
+            await second.send_to(text_data='{"n": 5}')
+            self.assertEqual(await second.receive_json_from(), {"type": "error", "code": "rate_limited"})
+            self.assertTrue(await agent.receive_nothing())
+
+            # A client that keeps flooding is cut off.
+            await first.send_to(text_data='{"n": 6}')
+            await first.receive_json_from()
+            await first.send_to(text_data='{"n": 7}')
+            self.assertEqual(await first.receive_output(), {"type": "websocket.close", "code": relay.CLOSE_RATE_LIMITED})
+
+            await second.disconnect()
+            await agent.disconnect()
+        self.assertNotIn(5, relay._users)
+
+    async def test_control_frames_are_rate_limited_too(self):
+        with override_settings(WS_CONN_MSG_RATE=0.001, WS_CONN_MSG_BURST=2, WS_MAX_DROPPED=2):
+            browser = WebsocketCommunicator(application, f"/ws/chat/12/?token={self._token(9)}")
+            self.assertTrue((await browser.connect())[0])
+            for _ in range(2):
+                await browser.send_to(text_data='{"type":"ping"}')
+                self.assertEqual(await browser.receive_json_from(), {"type": "pong"})
+            await browser.send_to(text_data='{"type":"pong"}')  # no server ping is waiting for it
+            self.assertEqual(await browser.receive_json_from(), {"type": "error", "code": "rate_limited"})
+            await browser.send_to(text_data='{"type":"ping"}')
+            self.assertEqual(await browser.receive_output(), {"type": "websocket.close", "code": relay.CLOSE_RATE_LIMITED})
+        self.assertNotIn(9, relay._users)
+
+    async def test_unresponsive_and_idle_sockets_are_reaped(self):
+        with override_settings(WS_PING_INTERVAL=0.1, WS_PONG_TIMEOUT=0.05, WS_IDLE_TIMEOUT=0.5,
+                               WS_AGENT_KEEPALIVE=True):
+            agent = WebsocketCommunicator(application, "/ws/agent/9/")
+            browser = WebsocketCommunicator(application, f"/ws/chat/9/?token={self._token(6)}")
+            self.assertTrue((await agent.connect())[0])
+            self.assertTrue((await browser.connect())[0])
+            self.assertEqual(len(get_channel_layer().groups["chat_9"]), 2)
+
+            # The browser answers pings until the idle timeout; the agent never does.
+            async def answer_pings():
+                while True:
+                    message = await browser.receive_output(timeout=2)
+                    if message["type"] == "websocket.close":
+                        return message["code"]
+                    await browser.send_to(text_data='{"type":"pong"}')
+
+            browser_closed = asyncio.ensure_future(answer_pings())
+            self.assertEqual(await agent.receive_json_from(), {"type": "ping"})
+            self.assertEqual(await agent.receive_output(), {"type": "websocket.close", "code": relay.CLOSE_TIMEOUT})
+            self.assertEqual(len(get_channel_layer().groups["chat_9"]), 1)
+            self.assertEqual(await asyncio.wait_for(browser_closed, 3), relay.CLOSE_IDLE)
+            self.assertNotIn("chat_9", get_channel_layer().groups)
+        self.assertNotIn(6, relay._users)
+
+    async def test_agents_are_not_pinged_by_default_and_big_frames_always_close(self):
+        with override_settings(WS_PING_INTERVAL=0.1, WS_PONG_TIMEOUT=0.05, WS_RATE_LIMIT_ENABLED=False,
+                               WS_MAX_FRAME_BYTES=100):
+            agent = WebsocketCommunicator(application, "/ws/agent/10/")
+            browser = WebsocketCommunicator(application, f"/ws/chat/10/?token={self._token(7)}")
+            self.assertTrue((await agent.connect())[0])
+            self.assertTrue((await browser.connect())[0])
+            await browser.send_to(text_data="x" * 101)
+            self.assertEqual(await browser.receive_output(), {"type": "websocket.close", "code": relay.CLOSE_TOO_BIG})
+
+            self.assertTrue(await agent.receive_nothing(timeout=0.3))
+            await agent.send_to(text_data="x" * 101)
+            self.assertEqual(await agent.receive_output(), {"type": "websocket.close", "code": relay.CLOSE_TOO_BIG})
+            self.assertNotIn("chat_10", get_channel_layer().groups)
+
+    async def test_keepalive_stops_quietly_when_the_socket_is_gone(self):
+        with override_settings(WS_PING_INTERVAL=0.1, WS_PONG_TIMEOUT=0.05):
+            browser = WebsocketCommunicator(application, f"/ws/chat/11/?token={self._token(8)}")
+            self.assertTrue((await browser.connect())[0])
+
+            async def closed_send(*args, **kwargs):
+                raise RuntimeError("socket closed")
+
+            with mock.patch.object(ChatConsumer, "send", closed_send):
+                await asyncio.sleep(0.2)
+            self.assertNotIn("chat_11", get_channel_layer().groups)
+            self.assertNotIn(8, relay._users)
+            await browser.disconnect()
+
+
+class LoadTestHarnessTest(TestCase):
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([], 95), 0.0)
+
+    def test_view_exceptions_are_counted_not_raised(self):
+        responses = iter([HttpResponse(), HttpResponse(status=503), None, HttpResponse()])
+
+        def call(client, rng):
+            response = next(responses)
+            if response is None:
+                raise ZeroDivisionError
+            return response
+
+        with mock.patch.object(loadtest, "_rest_scenarios", return_value={"flaky": call}):
+            result = loadtest.run_rest("flaky", [1], ["token"], requests=4, concurrency=2)
+        self.assertEqual((result["requests"], result["errors"]), (4, 2))
+        self.assertEqual(result["error_types"], {"HTTP 503": 1, "ZeroDivisionError": 1})
+
+    def test_small_run_and_compare(self):
+        with tempfile.TemporaryDirectory() as media, override_settings(
+            MEDIA_ROOT=media, PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"],
+        ):
+            ids = loadtest.seed(3)
+            tokens = [loadtest.access_token(u) for u in User.objects.filter(profile__pk__in=ids)]
+            results = [
+                loadtest.run_rest(name, ids, tokens, requests=3, concurrency=1)
+                for name in loadtest.REST_SCENARIOS
+            ]
+            results.append(loadtest.run_websocket(pairs=3, messages=2, tokens=tokens))
+
+        self.assertEqual([r["errors"] for r in results], [0] * 5)
+        self.assertEqual(results[-1]["requests"], 6)
+        self.assertEqual(loadtest.compare(results, {"results": results}, 0.25), [])
+        slower = [{**r, "p95_ms": r["p95_ms"] * 2 + 1} for r in results]
+        self.assertEqual(len(loadtest.compare(slower, {"results": results}, 0.25)), 5)
+
+
+class ProfilingTest(TestCase):
+    def _middleware(self, view):
+        return ProfilingMiddleware(view)
+
+    def test_disabled_middleware_removes_itself(self):
+        with override_settings(PROFILING_ENABLED=False), self.assertRaises(MiddlewareNotUsed):
+            self._middleware(lambda r: None)
+
+    def test_token_selects_request_and_writes_folded_stacks(self):
+        def slow_view(request):
+            deadline = time.monotonic() + 0.1
+            while time.monotonic() < deadline:
+                sum(range(1000))
+            return HttpResponse("ok")
+
+        with tempfile.TemporaryDirectory() as logs, override_settings(
+            PROFILING_ENABLED=True, PROFILING_SAMPLE_RATE=0, PROFILING_INTERVAL_MS=1, LOGS_DIR=logs,
+        ):
+            middleware = self._middleware(slow_view)
+            plain = middleware(RequestFactory().get("/api/profiles/"))
+            forged = middleware(RequestFactory().get("/api/profiles/", HTTP_X_PROFILE="nope"))
+            self.assertNotIn("X-Profile-Output", plain)
+            self.assertNotIn("X-Profile-Output", forged)
+
+            response = middleware(RequestFactory().get("/api/profiles/", {"_profile": make_token()}))
+            output = Path(logs) / "profiles" / response["X-Profile-Output"]
+            lines = output.read_text().splitlines()
+
+        self.assertTrue(lines)
+        self.assertTrue(any("slow_view" in line for line in lines))
+        stack, count = lines[0].rsplit(" ", 1)
+        self.assertGreater(int(count), 0)
+
+    def test_sampler_keeps_only_stacks_under_root_frame(self):
+        def spin():
+            deadline = time.monotonic() + 0.05
+            while time.monotonic() < deadline:
+                sum(range(1000))
+
+        def mine(sampler):
+            sampler.root_frame = sys._getframe()
+            spin()
+
+        def elsewhere():
+            spin()
+
+        sampler = StackSampler(threading.get_ident(), 0.001, 5)
+        sampler.start()
+        mine(sampler)
+        elsewhere()
+        sampler.stop()
+        self.assertTrue(sampler.counts)
+        self.assertTrue(all(stack.startswith("ProfilingTest.test_sampler_keeps_only_stacks_under_root_frame.<locals>.mine")
+                            for stack in sampler.counts))
+
+    async def test_websocket_connection_is_profiled_once_with_its_own_frames(self):
+        def spin():
+            deadline = time.monotonic() + 0.05
+            while time.monotonic() < deadline:
+                sum(range(1000))
+
+        async def busy_receive(consumer, text_data=None, bytes_data=None):
+            spin()
+
+        with tempfile.TemporaryDirectory() as logs, override_settings(
+            PROFILING_ENABLED=True, PROFILING_SAMPLE_RATE=0, PROFILING_INTERVAL_MS=1, LOGS_DIR=logs,
+        ), mock.patch.object(AgentConsumer, "receive", busy_receive):
+            # Signed tokens contain ':', which clients send percent-encoded.
+            agent = WebsocketCommunicator(application, f"/ws/agent/11/?_profile={quote(make_token())}")
+            self.assertTrue((await agent.connect())[0])
+            for n in range(2):
+                await agent.send_to(text_data=f'{{"n": {n}}}')
+            self.assertTrue(await agent.receive_nothing(0.2))
+            spin()  # another task on the same loop: must not show up
+            await agent.disconnect()
+            (output,) = (Path(logs) / "profiles").iterdir()
+            stacks = output.read_text()
+        self.assertIn("busy_receive", stacks)
+        # Every stack is rooted in the connection's task, not the test's.
+        self.assertTrue(all(line.startswith("ProtocolTypeRouter.__call__") for line in stacks.splitlines()))
+
+
+class BulkImportTest(APITestCase):
+    def setUp(self):
+        self.root = root = self.use_temp_dir()
+        self.images = root / "images"
+        self.images.mkdir()
+        Image.new("RGB", (64, 64), "red").save(self.images / "a.jpg")
+        Image.new("RGBA", (3000, 1000), "blue").save(self.images / "big.png")
+        (self.images / "broken.jpg").write_bytes(b"\xff\xd8 not really a jpeg")
+        rows = [
+            {"email": "Nova@ai.example", "display_name": "Nova", "location": "Waterloo",
+             "avatar": "a.jpg", "banner": "big.png", "personal": ["a.jpg", "a.jpg"]},
+            {"email": "orion@ai.example", "age": 31, "interests": ["jazz"]},
+            {"email": "nova@ai.example", "display_name": "duplicate"},
+            {"email": "lyra@ai.example", "avatar": "broken.jpg"},
+            {"email": "vega@ai.example", "avatar": "../escape.jpg"},
+            {"email": "sol@ai.example", "avatar": "a.jpg"},
+            {"email": "x" * 140 + "@ai.example"},  # longer than User.username allows
+        ]
+        self.manifest = root / "manifest.jsonl"
+        self.manifest.write_text("\n".join([*map(json.dumps, rows), "{not json"]) + "\n")
+        self.media = root / "media"
+
+    def test_import_is_bulk_and_idempotent(self):
+        with override_settings(MEDIA_ROOT=str(self.media)):
+            # Per batch: one existence check plus a fixed set of bulk statements.
+            with self.assertNumQueries(25):
+                stats = run_import(self.manifest, self.images, batch_size=2, workers=0)
+            self.assertEqual((stats["created"], stats["skipped"], stats["failed"]), (3, 1, 4))
+            self.assertEqual(sorted(e["line"] for e in stats["errors"]), [4, 5, 7, 8])
+            self.assertIn("longer than 150", {e["line"]: e["error"] for e in stats["errors"]}[7])
+
+            nova = Profile.objects.get(user__email="nova@ai.example")
+            self.assertEqual(nova.type, "ai")
+            self.assertFalse(nova.user.has_usable_password())
+            self.assertTrue(nova.geohash.startswith("dpwxr"))
+            self.assertEqual(nova.personal_images.count(), 2)
+            self.assertTrue(nova.active_avatar.file.storage.exists(nova.active_avatar.file.name))
+            banner = BucketBannerImage.objects.get(profile=nova)
+            self.assertEqual(nova.active_banner, banner)
+            self.assertEqual(max(banner.file.width, banner.file.height), 2048)
+            versions = list(Profile.objects.values_list("change_version", flat=True))
+            self.assertEqual(len(set(versions)), 3)
+            self.assertNotIn(0, versions)
+
+            again = run_import(self.manifest, self.images, batch_size=2, workers=0)
+        self.assertEqual((again["created"], again["skipped"], again["failed"]), (0, 4, 4))
+        self.assertEqual(Profile.objects.count(), 3)
+
+    def test_process_pool(self):
+        with override_settings(MEDIA_ROOT=str(self.media)):
+            stats = run_import(self.manifest, self.images, workers=2)
+            nova = Profile.objects.get(user__email="nova@ai.example")
+            mode = os.stat(nova.active_avatar.file.path).st_mode & 0o777
+        self.assertEqual(stats["created"], 3)
+        # Workers staged the images on disk; each was renamed into its bucket and nothing is left over.
+        self.assertEqual(sorted(p.name for p in self.media.iterdir()), ["img_avatars", "img_banners", "img_personal"])
+        self.assertEqual(mode, 0o644)
+
+    def test_admin_api(self):
+        user = self.make_profile("u@example.com").user
+        self.authenticate(user)
+        client = self.client
+        self.assertEqual(client.get("/api/admin/imports/").status_code, 403)
+
+        user.is_staff = True
+        user.save()
+        with override_settings(IMPORT_ROOT=str(self.root)), mock.patch("api.importer.start_job") as start:
+            bad = client.post("/api/admin/imports/", {"manifest": "../../etc/passwd"}, format="json")
+            self.assertEqual(bad.status_code, 400)
+            ok = client.post(
+                "/api/admin/imports/", {"manifest": "manifest.jsonl", "images_dir": "images"}, format="json",
+            )
+        self.assertEqual(ok.status_code, 202)
+        self.assertEqual(ok.json()["status"], "pending")
+        start.assert_called_once()
+        detail = client.get(f"/api/admin/imports/{ok.json()['id']}/")
+        self.assertEqual(detail.json()["manifest"], "manifest.jsonl")
+
+        # The job runs out of process; one that stops reporting is failed rather than left pending.
+        with override_settings(IMPORT_ROOT=str(self.root), MEDIA_ROOT=str(self.media)):
+            call_command("import_profiles", job=ok.json()["id"], stdout=io.StringIO())
+        self.assertEqual(client.get(f"/api/admin/imports/{ok.json()['id']}/").json()["status"], "done")
+        stuck = ImportJob.objects.create(manifest="manifest.jsonl", status="running")
+        ImportJob.objects.filter(pk=stuck.pk).update(heartbeat_at=stuck.heartbeat_at - datetime.timedelta(hours=1))
+        self.assertEqual(client.get(f"/api/admin/imports/{stuck.pk}/").json()["status"], "failed")
+
+
+class MediaGarbageCollectorTest(APITestCase):
+    def test_incremental_collection(self):
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media):
+            root = Path(media)
+            profile = self.make_profile("gc@example.com")
+            live = BucketAvatarImage(profile=profile)
+            live.file.save("a.jpg", ContentFile(sample_jpeg((8, 8))))
+            doomed = BucketPersonalImage(profile=profile)
+            doomed.file.save("p.jpg", ContentFile(b"x"))
+            BucketPersonalImage.objects.filter(pk=doomed.pk).delete()  # row gone, file stays
+
+            old = time.time() - 7200
+            orphans = [
+                root / "img_avatars" / "stale.jpg",
+                root / "img_banners" / "ab" / "cd" / "stale.jpg",
+                root / doomed.file.name,
+            ]
+            for path in orphans:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                path.write_bytes(b"orphan")
+                os.utime(path, (old, old))
+            os.utime(root / live.file.name, (old, old))
+            recent = root / "img_personal" / "uploading.jpg"
+            recent.write_bytes(b"new")
+            checkpoint = root.parent / f"{root.name}.checkpoint.json"
+
+            dry = collect(dry_run=True, checkpoint=checkpoint)
+            self.assertEqual((dry["scanned"], dry["orphans"], dry["deleted"]), (5, 3, 0))
+            self.assertTrue(all(p.exists() for p in orphans))
+
+            first = collect(limit=2, batch_size=1, checkpoint=checkpoint)
+            self.assertFalse(first["cycle_complete"])
+            self.assertTrue(checkpoint.exists())
+            rest = collect(batch_size=1, checkpoint=checkpoint)
+            self.assertTrue(rest["cycle_complete"])
+            self.assertEqual(first["scanned"] + rest["scanned"], 5)
+            self.assertEqual(first["deleted"] + rest["deleted"], 3)
+            self.assertEqual(rest["too_recent"], 1)
+            self.assertFalse(any(p.exists() for p in orphans))
+            self.assertTrue(recent.exists())
+            self.assertTrue((root / live.file.name).exists())
+            self.assertFalse(checkpoint.exists())
+
+
+class ShardedMediaLayoutTest(APITestCase):
+    def test_uploads_are_sharded_and_flat_files_move(self):
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media):
+            root = Path(media)
+            profile = self.make_profile("shard@example.com")
+
+            fresh = BucketAvatarImage(profile=profile)
+            fresh.file.save("new.jpg", ContentFile(b"new"))
+            self.assertRegex(fresh.file.name, rf"^img_avatars/{bucket_shard(fresh.uuid)}/HUMAN_")
+
+            flat = []
+            for model, bucket in ((BucketAvatarImage, "img_avatars"), (BucketPersonalImage, "img_personal")):
+                for _ in range(2):
+                    img = model(profile=profile)
+                    img.file.name = f"{bucket}/HUMAN_{profile.uuid}_{img.uuid}_JPG.jpg"
+                    (root / bucket).mkdir(exist_ok=True)
+                    (root / img.file.name).write_bytes(img.uuid.bytes)
+                    img.save()
+                    flat.append(img)
+            version = Profile.objects.get(pk=profile.pk).change_version
+
+            stats = shard_all(batch_size=1, keep_old=True)
+            self.assertTrue(stats["finished"])
+            self.assertEqual(stats["img_avatars"]["moved"], 2)
+            for img in flat:
+                img.refresh_from_db()
+                self.assertRegex(img.file.name, rf"^img_\w+/{bucket_shard(img.uuid)}/")
+                self.assertEqual((root / img.file.name).read_bytes(), img.uuid.bytes)
+            old_names = [p for p in root.glob("img_*/*") if p.is_file()]
+            self.assertEqual(len(old_names), 4)  # --keep-old: old URLs still resolve
+            self.assertTrue(all(os.stat(p).st_nlink == 2 for p in old_names))
+            self.assertGreater(Profile.objects.get(pk=profile.pk).change_version, version)
+
+            stats = shard_all()
+            self.assertEqual(stats["img_avatars"], {"moved": 0, "missing": 0, "unlinked": 2})
+            self.assertEqual([p for p in root.glob("img_*/*") if p.is_file()], [])
+            self.assertTrue(all(re.match(r"img_\w+/../../", str(p.relative_to(root)))
+                                for p in root.rglob("*.jpg")))
+
+
+class ImageRenditionTest(APITestCase):
+    def setUp(self):
+        self.tmp = self.use_temp_dir(MEDIA_ROOT="media", RENDITION_CACHE_DIR="renditions")
+        self.profile = self.make_profile("focal@example.com", avatar_x=0, avatar_y=50)
+        # Left half red, right half blue.
+        source = Image.new("RGB", (400, 200), "red")
+        source.paste((0, 0, 255), (200, 0, 400, 200))
+        buf = io.BytesIO()
+        source.save(buf, "PNG")
+        self.avatar = BucketAvatarImage(profile=self.profile)
+        self.avatar.file.save("a.png", ContentFile(buf.getvalue()))
+        self.authenticate(self.profile.user)
+        self.url = f"/api/images/{self.avatar.uuid}/rendition/"
+
+    def _pixels(self, response):
+        image = Image.open(io.BytesIO(b"".join(response.streaming_content)))
+        return image.size, image.convert("RGB").getpixel((image.width // 2, image.height // 2))
+
+    def test_cover_box_matches_css_object_position(self):
+        self.assertEqual(cover_box((400, 200), 1.0, (0, 50)), (0.0, 0.0, 200.0, 200.0))
+        self.assertEqual(cover_box((400, 200), 1.0, (100, 50)), (200.0, 0.0, 400.0, 200.0))
+        self.assertEqual(cover_box((400, 200), 1.0, (25, 0)), (50.0, 0.0, 250.0, 200.0))
+        self.assertEqual(cover_box((200, 400), 2.0, (50, 100)), (0.0, 300.0, 200.0, 400.0))
+        self.assertEqual(cover_box((400, 200), None, (0, 0)), (0.0, 0.0, 400.0, 200.0))
+
+    def test_crop_follows_focal_point_and_cache_is_invalidated(self):
+        response = self.client.get(self.url, {"w": 50, "ar": "1:1", "fmt": "png"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "image/png")
+        self.assertEqual(self._pixels(response), ((64, 64), (255, 0, 0)))  # w snapped up to 64
+        cached = list(Path(self.tmp, "renditions").rglob("*.png"))
+        self.assertEqual(len(cached), 1)
+
+        again = self.client.get(self.url, {"w": 50, "ar": "1:1", "fmt": "png"}, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(again.status_code, 304)
+
+        self.client.put("/api/profiles/me/", {"avatar_x": 100}, format="json")
+        self.assertFalse(cached[0].exists())
+        moved = self.client.get(self.url, {"w": 50, "ar": "1:1", "fmt": "png"})
+        self.assertNotEqual(moved["ETag"], response["ETag"])
+        self.assertEqual(self._pixels(moved), ((64, 64), (0, 0, 255)))
+
+        # Never upscaled; format negotiated from Accept when not given.
+        big = self.client.get(self.url, {"w": 2000}, HTTP_ACCEPT="image/webp,*/*")
+        self.assertEqual(big["Content-Type"], "image/webp")
+        self.assertEqual(self._pixels(big)[0], (400, 200))
+
+    def test_profile_links_and_validation(self):
+        profile = self.client.get(f"/api/profiles/{self.profile.pk}/").json()
+        (link,) = profile["avatar_rendition_urls"]
+        self.assertTrue(link.endswith(f"{self.url}?v=0,50"))
+        response = self.client.get(f"{link}&w=10&ar=1")
+        self.assertIn("immutable", response["Cache-Control"])
+        stale = self.client.get(f"{self.url}?v=99,50&w=10&ar=1")
+        self.assertNotIn("immutable", stale["Cache-Control"])
+
+        self.assertEqual(self.client.get(self.url, {"w": 0}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {"ar": "1:0"}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {"fmt": "bmp"}).status_code, 400)
+        self.assertEqual(self.client.get("/api/images/00000000-0000-4000-8000-000000000000/rendition/").status_code, 404)
+
+    def test_width_and_aspect_are_snapped_before_caching(self):
+        self.assertEqual([snap_width(w) for w in (1, 64, 65, 700, 2048)], [64, 64, 128, 768, 2048])
+        self.assertEqual(snap_aspect(1.02), 1.0)
+        self.assertAlmostEqual(snap_aspect(1.75), 16 / 9)
+        self.assertAlmostEqual(snap_aspect(0.1), 0.2)
+        etags = {
+            self.client.get(self.url, {"w": w, "ar": ar, "fmt": "png"})["ETag"]
+            for w in (100, 110, 128) for ar in ("1:1", "101:100", "0.98")
+        }
+        self.assertEqual(len(etags), 1)
+        self.assertEqual(len(list(Path(self.tmp, "renditions").rglob("*.png"))), 1)
+
+    def test_rendition_removed_before_it_is_opened_is_rendered_again(self):
+        get_or_render = renditions.get_or_render
+        calls = []
+
+        def evicted_first(*args):
+            path = get_or_render(*args)
+            calls.append(path)
+            if len(calls) == 1:
+                path.unlink()  # as invalidate() or a sweep in another worker would
+            return path
+
+        with mock.patch.object(renditions, "get_or_render", side_effect=evicted_first):
+            response = self.client.get(self.url, {"w": 64, "ar": "1:1", "fmt": "png"})
+        self.assertEqual((response.status_code, len(calls)), (200, 2))
+        self.assertEqual(self._pixels(response), ((64, 64), (255, 0, 0)))
+
+        os.remove(self.avatar.file.path)
+        with mock.patch.object(renditions, "get_or_render", side_effect=evicted_first):
+            self.assertEqual(self.client.get(self.url, {"w": 128}).status_code, 404)
+
+    def test_lru_sweep(self):
+        root = Path(self.tmp, "renditions", "ab", "cd")
+        root.mkdir(parents=True)
+        for i in range(10):
+            path = root / f"{i}.jpg"
+            path.write_bytes(b"x" * 100)
+            os.utime(path, (1000 + i, 1000 + i))
+        self.assertEqual(sweep(max_bytes=2000), 0)
+        self.assertEqual(sweep(max_bytes=500), 6)  # down to 90% of the limit, oldest first
+        self.assertEqual(sorted(p.name for p in root.iterdir()), ["6.jpg", "7.jpg", "8.jpg", "9.jpg"])
+
+
+class PerceptualHashTest(APITestCase):
+    def setUp(self):
+        self.use_temp_dir(MEDIA_ROOT="")
+        self.profile = self.make_profile("hash@example.com")
+        self.authenticate(User.objects.create_user(username="admin", is_staff=True))
+
+    def _png(self, seed, size=(256, 192), fmt="PNG"):
+        rng = random.Random(seed)
+        img = Image.new("RGB", (32, 24))
+        img.putdata([tuple(rng.randrange(256) for _ in range(3)) for _ in range(32 * 24)])
+        img = img.resize(size, Image.Resampling.BICUBIC).filter(ImageFilter.GaussianBlur(2))
+        buf = io.BytesIO()
+        img.save(buf, fmt, **({"quality": 60} if fmt == "JPEG" else {}))
+        return buf.getvalue()
+
+    def _upload(self, model, data, name="x.png"):
+        img = model(profile=self.profile)
+        img.file.save(name, ContentFile(data))
+        return img
+
+    def test_hash_survives_reencoding_and_is_stored_on_save(self):
+        original = self._upload(BucketAvatarImage, self._png(1))
+        copy = self._upload(BucketPersonalImage, self._png(1, size=(128, 96), fmt="JPEG"), "y.jpg")
+        other = self._upload(BucketPersonalImage, self._png(2))
+        original.refresh_from_db()
+        self.assertIsNotNone(original.phash)
+        self.assertEqual(
+            [original.phash_0, original.phash_1, original.phash_2, original.phash_3],
+            [(original.phash_value >> s) & 0xFFFF for s in (48, 32, 16, 0)],
         )
+        self.assertLessEqual(hamming(original.phash_value, copy.phash_value), 6)
+        self.assertGreater(hamming(original.phash_value, other.phash_value), 12)
+        # The file was still written in full after hashing consumed it.
+        self.assertEqual(original.file.size, len(self._png(1)))
+
+    def test_multi_index_lookup_matches_brute_force(self):
+        rng = random.Random(7)
+        probe = rng.getrandbits(64)
+        rows = []
+        for i in range(300):
+            value = probe
+            for bit in rng.sample(range(64), rng.randrange(0, 20)):
+                value ^= 1 << bit
+            row = BucketBannerImage(profile=self.profile, file=f"img_banners/{i}.png")
+            row.set_phash(value)
+            rows.append(row)
+        BucketBannerImage.objects.bulk_create(rows)
+        for k in (0, 3, 5, 9, 12):
+            expected = sorted(hamming(probe, r.phash_value) for r in rows if hamming(probe, r.phash_value) <= k)
+            self.assertEqual([d for _, _, d in find_similar(probe, k)], expected)
+
+    def test_similar_api_and_backfill(self):
+        first = self._upload(BucketAvatarImage, self._png(3))
+        dup = self._upload(BucketBannerImage, self._png(3, fmt="JPEG"), "b.jpg")
+        self._upload(BucketBannerImage, self._png(4))
+        BucketBannerImage.objects.filter(pk=dup.pk).update(phash=None, phash_0=None, phash_1=None, phash_2=None, phash_3=None)
+
+        url = f"/api/images/{first.uuid}/similar/"
+        self.assertEqual(self.client.get(url).json(), [])
+        self.assertEqual(self.client.get(url, {"k": 40}).status_code, 400)
+        call_command("backfill_phash", workers=0, stdout=open("/dev/null", "w"))
+        body = self.client.get(url).json()
+        self.assertEqual([(m["uuid"], m["bucket"]) for m in body], [(str(dup.uuid), "img_banners")])
+        self.client.force_authenticate(self.profile.user)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+
+class DiscoverFeedTest(APITestCase):
+    def make(self, name, **fields):
+        fields.setdefault("type", "ai")  # candidates; only human profiles get a feed of their own
+        return self.make_profile(f"{name}@example.com", display_name=name, **fields)
+
+    def setUp(self):
+        self.me = self.make("me", type="human", age=22, interests=["Jazz", "Hiking", "Chess"], location="Waterloo, ON")
+        self.twin = self.make("twin", age=22, interests=["jazz", "hiking", "chess"], location="Waterloo, ON")
+        self.close = self.make("close", age=23, interests=["Jazz", "Chess"], location="Waterloo, ON")
+        self.far = self.make("far", age=40, interests=["Golf"])
+        self.authenticate(self.me.user)
+        refresh()
+
+    def _names(self, response):
+        return [p["display_name"] for p in response.json()["results"]]
+
+    def test_unbuilt_feed_lists_newest_first_until_build_feeds_runs(self):
+        viewer = self.make("late", type="human")
+        self.authenticate(viewer.user)
+        self.client.post("/api/feed/seen/", {"ids": [self.close.pk]}, format="json")
+        with self.assertNumQueries(7):  # profile, feed, seen, page, profiles + 2 image prefetches
+            first = self.client.get("/api/feed/", {"limit": 2})
+        self.assertEqual(self._names(first), ["far", "twin"])
+        rest = self.client.get("/api/feed/", {"limit": 2, "cursor": first.json()["next"]})
+        self.assertEqual(self._names(rest), ["me"])
+        self.assertIsNone(rest.json()["next"])
+        self.assertEqual(self.client.get("/api/feed/", {"cursor": "new:x"}).status_code, 400)
+
+        self.assertEqual(refresh()["rebuilt"], 1)
+        self.assertEqual(self._names(self.client.get("/api/feed/"))[0], "me")
+
+    def test_ranked_pages_and_seen_profiles_never_return(self):
+        first = self.client.get("/api/feed/", {"limit": 2})
+        self.assertEqual(self._names(first), ["twin", "close"])
+        rest = self.client.get("/api/feed/", {"limit": 2, "cursor": first.json()["next"]})
+        self.assertEqual(self._names(rest), ["far"])
+        self.assertIsNone(rest.json()["next"])
+
+        self.assertEqual(self.client.post("/api/feed/seen/", {"ids": [self.twin.pk]}, format="json").status_code, 204)
+        self.assertEqual(self.client.post("/api/feed/seen/", {"ids": ["x"]}, format="json").status_code, 400)
+        self.assertEqual(self._names(self.client.get("/api/feed/")), ["close", "far"])
+        refresh(rebuild=True)
+        self.assertEqual(self._names(self.client.get("/api/feed/")), ["close", "far"])
+
+    def test_refresh_is_incremental_and_rebuilds_on_viewer_change(self):
+        self.client.get("/api/feed/")
+        self.far.interests = ["Jazz", "Hiking", "Chess", "Golf"]
+        self.far.age = 22
+        self.far.location = "Waterloo, ON"
+        self.far.save()
+        self.make("new")
+        self.assertEqual(refresh(), {"rebuilt": 0, "refreshed": 1, "rescored": 2, "backfilled": 0})
+        self.assertEqual(refresh(), {"rebuilt": 0, "refreshed": 1, "rescored": 0, "backfilled": 0})
+        self.assertEqual(self._names(self.client.get("/api/feed/"))[:2], ["twin", "far"])
+
+        self.me.interests = ["Golf"]
+        self.me.save()
+        self.assertEqual(refresh()["rebuilt"], 1)
+        self.assertEqual(self._names(self.client.get("/api/feed/"))[0], "far")
+
+    def test_filters_apply_before_paging(self):
+        self.make("golfer", type="human", interests=["Mini Golf"], location="Toronto, ON")
+        refresh()
+        for unbuilt in (False, True):
+            if unbuilt:
+                Feed.objects.filter(viewer=self.me).update(built_at=None)
+            # Whole tags only: "Golf" is not "Mini Golf".
+            self.assertCountEqual(self._names(self.client.get("/api/feed/", {"interests": "Chess,Golf"})),
+                                  ["twin", "close", "far"])
+            first = self.client.get("/api/feed/", {"limit": 1, "interests": "chess"})
+            rest = self.client.get("/api/feed/", {"limit": 1, "interests": "chess", "cursor": first.json()["next"]})
+            self.assertCountEqual(self._names(first) + self._names(rest), ["twin", "close"])
+            self.assertEqual(self._names(self.client.get("/api/feed/", {"q": "toronto"})), ["golfer"])
+            self.assertEqual(self._names(self.client.get("/api/feed/", {"type": "human"})), ["golfer"])
+            self.assertEqual(self._names(self.client.get("/api/feed/", {"q": "GOLF", "type": "ai"})), ["far"])
+        self.assertEqual(self.client.get("/api/feed/", {"type": "robot"}).status_code, 400)
+
+    @override_settings(FEED_SIZE=2, FEED_LOW_WATER=2)
+    def test_drained_feeds_are_backfilled(self):
+        refresh(rebuild=True)
+        self.assertEqual(self._names(self.client.get("/api/feed/")), ["twin", "close"])
+        self.client.post("/api/feed/seen/", {"ids": [self.twin.pk]}, format="json")
+        self.assertEqual(refresh()["backfilled"], 1)
+        self.assertEqual(self._names(self.client.get("/api/feed/")), ["close", "far"])
+
+        # Nothing unseen left to add: the feed stays short instead of rebuilding every run.
+        self.client.post("/api/feed/seen/", {"ids": [self.close.pk]}, format="json")
+        self.assertEqual(refresh()["backfilled"], 0)
+        self.assertEqual(self._names(self.client.get("/api/feed/")), ["far"])
+
+    def test_feed_is_capped_and_page_reads_only_the_page(self):
+        with override_settings(FEED_SIZE=2):
+            refresh(rebuild=True)
+            self.assertEqual(len(self._names(self.client.get("/api/feed/"))), 2)
+        seen = seen_encode([1000, 3, 17, 2 ** 40, 3])
+        self.assertEqual(len(seen), 10)  # sized by how many ids, not by the largest
+        self.assertEqual(seen_decode(seen), {3, 17, 1000, 2 ** 40})
+        self.assertEqual(seen_decode(b""), set())
+        with self.assertNumQueries(6):  # profile, feed (without seen), page, profiles + 2 image prefetches
+            self.client.get("/api/feed/", {"limit": 1})
+
+        # Seen profiles leave no holes: every page but the last is full.
+        refresh(rebuild=True)  # back to the full FEED_SIZE
+        too_big = self.client.post("/api/feed/seen/", {"ids": [self.close.pk, 2 ** 63]}, format="json")
+        self.assertEqual(too_big.status_code, 400)
+        self.client.post("/api/feed/seen/", {"ids": [self.close.pk]}, format="json")
+        first = self.client.get("/api/feed/", {"limit": 1}).json()
+        self.assertEqual([p["display_name"] for p in first["results"]], ["twin"])
+        rest = self.client.get("/api/feed/", {"limit": 1, "cursor": first["next"]}).json()
+        self.assertEqual([p["display_name"] for p in rest["results"]], ["far"])
+        self.assertIsNone(rest["next"])
+
+
+class ProfileEditTest(APITestCase):
+    def setUp(self):
+        self.profile = self.make_profile("edit@example.com", display_name="Ada", location="Waterloo, ON")
+        self.authenticate(self.profile.user)
+
+    def test_unchanged_put_writes_nothing_and_changed_put_writes_only_diff(self):
+        before = (self.profile.updated_at, self.profile.change_version)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.put("/api/profiles/me/", {"display_name": "Ada", "age": 20}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([q for q in queries if q["sql"].startswith("UPDATE")])
+        self.profile.refresh_from_db()
+        self.assertEqual((self.profile.updated_at, self.profile.change_version), before)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.put("/api/profiles/me/", {"display_name": "Ada", "bio": "hi"}, format="json")
+        [update] = [q["sql"] for q in queries if q["sql"].startswith('UPDATE "api_profile"')]
+        self.assertIn('"bio"', update)
+        self.assertNotIn('"display_name"', update)
+        self.assertNotIn('"latitude"', update)  # location untouched: no geocoding write
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.bio, "hi")
+        self.assertGreater(self.profile.change_version, before[1])
+
+    def test_if_match_rejects_stale_writes(self):
+        etag = self.client.get("/api/profiles/me/")["ETag"]
+        response = self.client.put("/api/profiles/me/", {"bio": "one"}, format="json", HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        fresh = response["ETag"]
+        self.assertNotEqual(fresh, etag)
+
+        stale = self.client.put("/api/profiles/me/", {"bio": "two"}, format="json", HTTP_IF_MATCH=etag)
+        self.assertEqual(stale.status_code, 412)
+        self.assertEqual(stale["ETag"], fresh)
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.bio, "one")
+
+        # The weak form added by response compression still matches.
+        response = self.client.put("/api/profiles/me/", {"bio": "two"}, format="json", HTTP_IF_MATCH=f"W/{fresh}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.put("/api/profiles/me/", {"bio": "x"}, format="json",
+                                         HTTP_IF_MATCH="*").status_code, 200)
+
+    def test_put_that_loses_a_race_rereads_instead_of_overwriting(self):
+        save_if_unchanged = Profile.save_if_unchanged
+        calls = []
+
+        def concurrent_edit_first(profile, fields):
+            calls.append(fields)
+            if len(calls) == 1:
+                other = Profile.objects.get(pk=profile.pk)
+                other.bio = other.bio + "!"
+                other.save(update_fields=["bio"])
+            return save_if_unchanged(profile, fields)
 
-    def test_db_page(self):
-        # Each time the page is requested, the number of recorded greetings increases.
+        with mock.patch.object(Profile, "save_if_unchanged", autospec=True, side_effect=concurrent_edit_first) as save:
+            response = self.client.put("/api/profiles/me/", {"display_name": "Bea"}, format="json")
+        self.assertEqual((response.status_code, save.call_count), (200, 2))
+        self.profile.refresh_from_db()
+        self.assertEqual((self.profile.display_name, self.profile.bio), ("Bea", "!"))
 
-        first_response = self.client.get("/db/")
-        self.assertEqual(first_response.status_code, 200)
-        self.assertEqual(len(first_response.context["greetings"]), 1)
+        calls.clear()
+        etag = self.client.get("/api/profiles/me/")["ETag"]
+        with mock.patch.object(Profile, "save_if_unchanged", autospec=True, side_effect=concurrent_edit_first):
+            stale = self.client.put("/api/profiles/me/", {"display_name": "Cy"}, format="json", HTTP_IF_MATCH=etag)
+        self.assertEqual(stale.status_code, 412)
+        self.profile.refresh_from_db()
+        self.assertEqual((self.profile.display_name, self.profile.bio), ("Bea", "!!"))
+        self.assertEqual(stale["ETag"], self.client.get("/api/profiles/me/")["ETag"])
 
-        second_response = self.client.get("/db/")
-        self.assertEqual(second_response.status_code, 200)
-        self.assertEqual(len(second_response.context["greetings"]), 2)
+        # Losing every race without If-Match still writes: 412 needs a precondition.
+        calls.clear()
+        with mock.patch.object(Profile, "save_if_unchanged", autospec=True, return_value=False) as save:
+            response = self.client.put("/api/profiles/me/", {"display_name": "Di"}, format="json")
+        self.assertEqual((response.status_code, save.call_count), (200, PROFILE_PUT_ATTEMPTS - 1))
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.display_name, "Di")
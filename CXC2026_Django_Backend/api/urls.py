@@ -3,11 +3,14 @@ from rest_framework_simplejwt.views import TokenRefreshView
 from . import views
 
 urlpatterns = [
+    path('health/', views.health, name='health'),
     path('auth/register/', views.register, name='register'),
     path('auth/login/', views.login, name='login'),
     path('auth/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('auth/me/', views.me, name='me'),
     path('profiles/', views.profiles_list, name='profiles_list'),
+    path('profiles/batch/', views.profiles_batch, name='profiles_batch'),
+    path('profiles/sync/', views.profiles_sync, name='profiles_sync'),
     path('profiles/me/', views.my_profile, name='my_profile'),
     path('profiles/me/avatar/', views.my_avatar, name='my_avatar'),
     path('profiles/me/avatar/<int:pk>/', views.my_avatar_detail, name='my_avatar_detail'),
@@ -15,5 +18,11 @@ urlpatterns = [
     path('profiles/me/banner/<int:pk>/', views.my_banner_detail, name='my_banner_detail'),
     path('profiles/me/images/', views.my_personal_image, name='my_personal_image'),
     path('profiles/me/images/<int:pk>/', views.my_personal_image_detail, name='my_personal_image_detail'),
+    path('feed/', views.feed, name='feed'),
+    path('feed/seen/', views.feed_seen, name='feed_seen'),
     path('profiles/<int:pk>/', views.profile_detail, name='profile_detail'),
+    path('images/<uuid:uuid>/rendition/', views.image_rendition, name='image_rendition'),
+    path('images/<uuid:uuid>/similar/', views.similar_images, name='similar_images'),
+    path('admin/imports/', views.import_jobs, name='import_jobs'),
+    path('admin/imports/<int:pk>/', views.import_job_detail, name='import_job_detail'),
 ]
@@ -1,13 +1,23 @@
+import hashlib
+import json
+import math
+import os
+import uuid as uuid_lib
+
 from django.contrib.auth.models import User
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
 from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import RefreshToken
 
-from django.db.models import Prefetch
-from .models import Profile, BucketAvatarImage, BucketBannerImage, BucketPersonalImage
-from .serializers import RegisterSerializer, UserSerializer, ProfileSerializer
+from django.db import connection
+from django.db.models import Prefetch, Q
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+from . import feeds, geo
+from .models import Profile, ProfileTombstone, ImportJob, BucketAvatarImage, BucketBannerImage, BucketPersonalImage
+from .serializers import RegisterSerializer, UserSerializer, ProfileSerializer, ImportJobSerializer
 
 
 def _tokens_for_user(user):
@@ -19,6 +29,14 @@ def _ctx(request):
     return {'request': request}
 
 
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def health(request):
+    """Liveness/readiness probe for load balancers; reports which worker answered."""
+    connection.ensure_connection()
+    return Response({'status': 'ok', 'pid': os.getpid()})
+
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def register(request):
@@ -55,11 +73,166 @@ def me(request):
     return Response(UserSerializer(request.user).data)
 
 
+NEAR_DEFAULT_RADIUS_KM = 50
+NEAR_MAX_RADIUS_KM = 500
+NEAR_MAX_K = 100
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def profiles_list(request):
+    """
+    All profiles, or the ones near a point when a center is given:
+        ?near=me            — center on the caller's own resolved location
+        ?lat=<f>&lon=<f>    — center on explicit coordinates
+        &radius_km=<f>      — everyone within this radius (default 50, at most NEAR_MAX_RADIUS_KM)
+        &k=<n>              — the n nearest instead of a radius (at most NEAR_MAX_K)
+    Proximity results are ordered nearest first and carry `distance_km`.
+    """
     profiles = Profile.objects.select_related('user', 'active_avatar', 'active_banner').prefetch_related('avatar_images', 'banner_images').all()
-    return Response(ProfileSerializer(profiles, many=True, context=_ctx(request)).data)
+
+    params = request.query_params
+    if 'near' not in params and 'lat' not in params:
+        return Response(ProfileSerializer(profiles, many=True, context=_ctx(request)).data)
+
+    try:
+        if params.get('near') == 'me':
+            me_profile, _ = Profile.objects.get_or_create(user=request.user)
+            if me_profile.latitude is None:
+                return Response({'detail': 'Your location could not be resolved.'},
+                                status=status.HTTP_400_BAD_REQUEST)
+            lat, lon = me_profile.latitude, me_profile.longitude
+        else:
+            lat, lon = float(params['lat']), float(params['lon'])
+        k = min(int(params['k']), NEAR_MAX_K) if 'k' in params else None
+        radius_km = float(params.get('radius_km', NEAR_DEFAULT_RADIUS_KM))
+    except (KeyError, ValueError):
+        return Response({'detail': 'Invalid proximity parameters.'}, status=status.HTTP_400_BAD_REQUEST)
+    if (not all(math.isfinite(v) for v in (lat, lon, radius_km))
+            or not (-90 <= lat <= 90 and -180 <= lon <= 180) or radius_km <= 0 or (k is not None and k <= 0)):
+        return Response({'detail': 'Invalid proximity parameters.'}, status=status.HTTP_400_BAD_REQUEST)
+    radius_km = min(radius_km, NEAR_MAX_RADIUS_KM)
+
+    if k is not None:
+        nearby = geo.nearest(profiles, lat, lon, k)
+    else:
+        nearby = geo.within_radius(profiles, lat, lon, radius_km)
+    return Response(ProfileSerializer(nearby, many=True, context=_ctx(request)).data)
+
+
+SYNC_DEFAULT_LIMIT = 500
+SYNC_MAX_LIMIT = 2000
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def profiles_sync(request):
+    """
+    Delta sync for client-side profile caches.
+        ?since=<cursor>   — cursor from the previous response (omit or 0 for a full snapshot)
+        &limit=<n>        — max changes per page
+    Returns profiles changed and ids deleted after `since`, in change order,
+    plus the cursor to send next time. Keep paging while `has_more` is true.
+    """
+    try:
+        since = int(request.query_params.get('since', 0))
+        limit = min(int(request.query_params.get('limit', SYNC_DEFAULT_LIMIT)), SYNC_MAX_LIMIT)
+    except ValueError:
+        return Response({'detail': 'Invalid cursor.'}, status=status.HTTP_400_BAD_REQUEST)
+    if since < 0 or limit <= 0:
+        return Response({'detail': 'Invalid cursor.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    changed = list(
+        Profile.objects.select_related('user', 'active_avatar', 'active_banner')
+        .prefetch_related('avatar_images', 'banner_images')
+        .filter(change_version__gt=since)
+        .order_by('change_version')[:limit + 1]
+    )
+    # A fresh client has nothing to delete, so a snapshot skips the tombstones.
+    deleted = list(
+        ProfileTombstone.objects.filter(change_version__gt=since)
+        .order_by('change_version')[:limit + 1]
+    ) if since else []
+
+    events = sorted(changed + deleted, key=lambda obj: obj.change_version)
+    has_more = len(events) > limit
+    events = events[:limit]
+    cursor = events[-1].change_version if events else since
+
+    return Response({
+        'changed': ProfileSerializer(
+            [e for e in events if isinstance(e, Profile)], many=True, context=_ctx(request),
+        ).data,
+        'deleted': [e.profile_id for e in events if isinstance(e, ProfileTombstone)],
+        'cursor': cursor,
+        'has_more': has_more,
+    })
+
+
+PROFILE_BATCH_MAX = 100
+MAX_ID = 2 ** 63 - 1  # BigAutoField
+
+
+def _split_param(request, key):
+    return [v for v in request.query_params.get(key, '').split(',') if v]
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def profiles_batch(request):
+    """
+    Several profiles in one round trip:
+        ?ids=1,2,3&uuids=<uuid>,<uuid>
+    `results` maps each requested key to its profile; keys that are invalid
+    or match nothing are reported under `errors` instead.
+    """
+    raw_ids, raw_uuids = _split_param(request, 'ids'), _split_param(request, 'uuids')
+    if not raw_ids and not raw_uuids:
+        return Response({'detail': 'Provide ids and/or uuids.'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(raw_ids) + len(raw_uuids) > PROFILE_BATCH_MAX:
+        return Response({'detail': f'At most {PROFILE_BATCH_MAX} profiles per request.'},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    errors = {}
+    ids, uuids = set(), set()
+    for raw in raw_ids:
+        try:
+            pk = int(raw)
+        except ValueError:
+            pk = 0
+        if 1 <= pk <= MAX_ID:
+            ids.add(pk)
+        else:
+            errors[raw] = 'Invalid id.'
+    for raw in raw_uuids:
+        try:
+            uuids.add(uuid_lib.UUID(raw))
+        except ValueError:
+            errors[raw] = 'Invalid uuid.'
+
+    found = Profile.objects.select_related('user', 'active_avatar', 'active_banner') \
+        .prefetch_related('avatar_images', 'banner_images') \
+        .filter(Q(pk__in=ids) | Q(uuid__in=uuids))
+    data = ProfileSerializer(found, many=True, context=_ctx(request)).data
+    by_id = {p['id']: p for p in data}
+    by_uuid = {str(p['uuid']): p for p in data}
+
+    results = {}
+    for raw in raw_ids:
+        if raw not in errors:
+            match = by_id.get(int(raw))
+            if match:
+                results[raw] = match
+            else:
+                errors[raw] = 'Not found.'
+    for raw in raw_uuids:
+        if raw not in errors:
+            match = by_uuid.get(str(uuid_lib.UUID(raw)))
+            if match:
+                results[raw] = match
+            else:
+                errors[raw] = 'Not found.'
+    return Response({'results': results, 'errors': errors})
 
 
 @api_view(['GET'])
@@ -72,19 +245,130 @@ def profile_detail(request, pk):
     return Response(ProfileSerializer(profile, context=_ctx(request)).data)
 
 
+FEED_DEFAULT_LIMIT = 20
+FEED_MAX_LIMIT = 100
+FEED_MAX_INTERESTS = 20
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def feed(request):
+    """
+    Your Discover feed, best matches first and without profiles you have seen:
+        ?cursor=<next from the previous page>&limit=<n>
+    Optional filters, kept the same across a cursor's pages:
+        &q=<text in name, location or interests>&type=human|ai&interests=<a>,<b>
+    """
+    try:
+        limit = min(int(request.query_params.get('limit', FEED_DEFAULT_LIMIT)), FEED_MAX_LIMIT)
+    except ValueError:
+        limit = 0
+    if limit <= 0:
+        return Response({'detail': 'Invalid limit.'}, status=status.HTTP_400_BAD_REQUEST)
+    kind = request.query_params.get('type', '')
+    interests = [t.strip() for t in request.query_params.get('interests', '').split(',') if t.strip()]
+    if kind not in ('', 'human', 'ai') or len(interests) > FEED_MAX_INTERESTS:
+        return Response({'detail': 'Invalid filter.'}, status=status.HTTP_400_BAD_REQUEST)
+    filters = {'q': request.query_params.get('q', '').strip()[:100], 'kind': kind, 'interests': interests}
+    me_profile, _ = Profile.objects.get_or_create(user=request.user)
+    cursor = request.query_params.get('cursor')
+    feed = feeds.get_feed(me_profile)
+    try:
+        # Until build_feeds has built it (and for pages continuing from then), newest first.
+        if feed is None or (cursor or '').startswith(feeds.NEWEST_CURSOR_PREFIX):
+            ids, next_cursor = feeds.newest_page(me_profile, cursor, limit, filters)
+        else:
+            ids, next_cursor = feeds.page(feed, cursor, limit, filters)
+    except ValueError:
+        return Response({'detail': 'Invalid cursor.'}, status=status.HTTP_400_BAD_REQUEST)
+    found = Profile.objects.select_related('user', 'active_avatar', 'active_banner') \
+        .prefetch_related('avatar_images', 'banner_images').in_bulk(ids)
+    results = [found[pk] for pk in ids if pk in found]
+    return Response({
+        'results': ProfileSerializer(results, many=True, context=_ctx(request)).data,
+        'next': next_cursor,
+    })
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def feed_seen(request):
+    """Mark profiles seen: {"ids": [1, 2, 3]}. They leave your feed for good."""
+    ids = request.data.get('ids') if isinstance(request.data, dict) else None
+    if not isinstance(ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) and 0 < i <= MAX_ID for i in ids):
+        return Response({'detail': 'ids must be a list of profile ids.'}, status=status.HTTP_400_BAD_REQUEST)
+    me_profile, _ = Profile.objects.get_or_create(user=request.user)
+    feeds.mark_seen(me_profile, ids)
+    return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+PROFILE_PUT_ATTEMPTS = 3  # optimistic writes tried before giving up (If-Match) or writing anyway
+
+
+def _profile_etag(profile):
+    """Strong ETag over the fields PUT can edit, so image uploads don't make it stale."""
+    values = json.dumps([getattr(profile, name) for name in ProfileSerializer.EDITABLE_FIELDS], default=str)
+    return f'"{hashlib.md5(values.encode()).hexdigest()}"'
+
+
+def _if_match_fails(request, etag):
+    header = request.headers.get('If-Match')
+    if not header or header.strip() == '*':
+        return False
+    # CompressionMiddleware marks our ETag weak (W/) on gzipped responses;
+    # the tag itself still identifies the same field values.
+    return not any(tag.removeprefix('W/') == etag for tag in parse_etags(header))
+
+
 @api_view(['GET', 'PUT'])
 @permission_classes([IsAuthenticated])
 def my_profile(request):
+    """
+    GET/PUT your profile. Responses carry an ETag; send it back as If-Match
+    on PUT to have the update rejected with 412 if the profile changed since.
+    Only fields whose value differs are written.
+    """
     profile, _ = Profile.objects.get_or_create(user=request.user)
 
     if request.method == 'GET':
-        return Response(ProfileSerializer(profile, context=_ctx(request)).data)
-
-    serializer = ProfileSerializer(profile, data=request.data, partial=True, context=_ctx(request))
-    if not serializer.is_valid():
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-    serializer.save()
-    return Response(serializer.data)
+        response = Response(ProfileSerializer(profile, context=_ctx(request)).data)
+        response['ETag'] = _profile_etag(profile)
+        return response
+
+    # Optimistic: the write lands only if nobody wrote the row since we read
+    # it. Losing that race means reading it again, which re-checks If-Match.
+    # Without a precondition the last write wins, so the final attempt is a
+    # plain write and only a PUT that sent If-Match can end in 412.
+    conditional = request.headers.get('If-Match', '').strip() not in ('', '*')
+    saved = False
+    for attempt in range(PROFILE_PUT_ATTEMPTS):
+        if _if_match_fails(request, _profile_etag(profile)):
+            break
+        serializer = ProfileSerializer(profile, data=request.data, partial=True, context=_ctx(request))
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        old_focal = (profile.avatar_x, profile.avatar_y), (profile.banner_x, profile.banner_y)
+        saved = serializer.save_changes(if_unchanged=conditional or attempt < PROFILE_PUT_ATTEMPTS - 1)
+        if saved:
+            break
+        profile = Profile.objects.get(pk=profile.pk)
+    if not saved:
+        response = Response({'detail': 'Your profile was changed since you loaded it.'},
+                            status=status.HTTP_412_PRECONDITION_FAILED)
+        response['ETag'] = _profile_etag(profile)
+        return response
+    avatar_moved = old_focal[0] != (profile.avatar_x, profile.avatar_y)
+    banner_moved = old_focal[1] != (profile.banner_x, profile.banner_y)
+    if avatar_moved or banner_moved:
+        from . import renditions  # deferred: imports Pillow
+
+        if avatar_moved:
+            renditions.invalidate(profile.avatar_images.values_list('uuid', flat=True))
+        if banner_moved:
+            renditions.invalidate(profile.banner_images.values_list('uuid', flat=True))
+    response = Response(serializer.data)
+    response['ETag'] = _profile_etag(profile)
+    return response
 
 
 def _avatar_list(profile, request):
@@ -228,3 +512,121 @@ def my_personal_image_detail(request, pk):
     img.file.delete(save=False)
     img.delete()
     return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def image_rendition(request, uuid):
+    """
+    Bucket image cropped around its focal point and resized:
+    ?w=<px>&ar=<w:h>&fmt=<jpeg|webp|png|avif>. Public like /media/, so it
+    works as an <img src>. With ?v=<focal token> (as in the profile's
+    *_rendition_urls) the response is cacheable forever.
+    """
+    # Deferred, like the other image modules below: Pillow is only needed by image endpoints.
+    from . import renditions
+
+    img, focal = renditions.find_image(uuid)
+    if img is None:
+        return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+    try:
+        params = renditions.parse_params(request.GET, request.headers.get('Accept', ''))
+    except ValueError as exc:
+        return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+    etag = f'"{img.uuid.hex}-{renditions.cache_name(focal, params)}"'
+    if request.headers.get('If-None-Match') == etag:
+        response = HttpResponseNotModified()
+    else:
+        try:
+            file = renditions.open_rendition(img, focal, params)
+        except renditions.RENDER_ERRORS:
+            return Response({'detail': 'Image file unavailable.'}, status=status.HTTP_404_NOT_FOUND)
+        response = FileResponse(file, content_type=renditions.FORMATS[params['fmt']][1])
+    response['ETag'] = etag
+    if request.GET.get('v') == renditions.focal_token(focal):
+        response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    else:
+        response['Cache-Control'] = 'public, max-age=300'
+    if not request.GET.get('fmt'):
+        response['Vary'] = 'Accept'
+    return response
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def similar_images(request, uuid):
+    """
+    Bucket images whose perceptual hash is within ?k= bits (default 6, max 12)
+    of this one's, closest first. For spotting re-uploaded or duplicated photos.
+    """
+    from . import renditions, similarity
+
+    img, _ = renditions.find_image(uuid)
+    if img is None:
+        return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+    if img.phash is None:
+        return Response({'detail': 'Image has not been hashed yet.'}, status=status.HTTP_409_CONFLICT)
+    try:
+        k = int(request.GET.get('k', similarity.DEFAULT_DISTANCE))
+        matches = similarity.find_similar(img.phash_value, k, exclude=img.uuid)
+    except ValueError:
+        return Response({'detail': f'k must be an integer between 0 and {similarity.MAX_DISTANCE}.'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    return Response([
+        {
+            'uuid': str(match.uuid),
+            'bucket': bucket,
+            'profile_id': match.profile_id,
+            'distance': distance,
+            'url': request.build_absolute_uri(match.file.url),
+        }
+        for bucket, match, distance in matches
+    ])
+
+
+# ── Admin: bulk import ────────────────────────────────────────────────────────
+
+@api_view(['GET', 'POST'])
+@permission_classes([IsAdminUser])
+def import_jobs(request):
+    """
+    GET: recent import jobs. POST: start one from {"manifest", "images_dir"},
+    both relative to IMPORT_ROOT (same format as `./manage.py import_profiles`).
+    """
+    from . import importer
+
+    if request.method == 'GET':
+        importer.fail_stale_jobs()
+        jobs = ImportJob.objects.order_by('-started_at')[:50]
+        return Response(ImportJobSerializer(jobs, many=True).data)
+
+    serializer = ImportJobSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    errors = {}
+    for field in ('manifest', 'images_dir'):
+        value = serializer.validated_data.get(field)
+        if value:
+            try:
+                importer.resolve_import_path(value)
+            except ValueError as exc:
+                errors[field] = [str(exc)]
+    if errors:
+        return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+    job = serializer.save(created_by=request.user)
+    importer.start_job(job)
+    return Response(ImportJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def import_job_detail(request, pk):
+    from . import importer
+
+    importer.fail_stale_jobs()
+    try:
+        job = ImportJob.objects.get(pk=pk)
+    except ImportJob.DoesNotExist:
+        return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+    return Response(ImportJobSerializer(job).data)
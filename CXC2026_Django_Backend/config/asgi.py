@@ -2,13 +2,45 @@ import os
 
 from django.core.asgi import get_asgi_application
 from channels.routing import ProtocolTypeRouter, URLRouter
-import api.routing
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
 
+# Set up Django (settings, app registry) before anything imports models.
 django_asgi_app = get_asgi_application()
 
+
+class LazyWebSocketRouter:
+    """
+    Imports the consumers (and the JWT machinery they use) on the first
+    WebSocket connection instead of at boot. Preloading servers call
+    warm_up() so forked workers start with everything already imported.
+    """
+
+    def __init__(self):
+        self.app = None
+
+    def load(self):
+        if self.app is None:
+            from api.routing import websocket_urlpatterns
+            self.app = URLRouter(websocket_urlpatterns)
+        return self.app
+
+    async def __call__(self, scope, receive, send):
+        return await self.load()(scope, receive, send)
+
+
+websocket_router = LazyWebSocketRouter()
+
 application = ProtocolTypeRouter({
     "http": django_asgi_app,
-    "websocket": URLRouter(api.routing.websocket_urlpatterns),
+    "websocket": websocket_router,
 })
+
+
+def warm_up():
+    """Import everything the first HTTP and WebSocket requests would."""
+    from django.urls import get_resolver
+
+    get_resolver().url_patterns  # imports config.urls → api.views → DRF, simplejwt
+    from api import importer, renditions, similarity  # noqa: F401 — image endpoints (Pillow)
+    websocket_router.load()
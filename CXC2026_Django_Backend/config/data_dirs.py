@@ -0,0 +1,11 @@
+from django.conf import settings
+
+
+def ensure_data_dirs():
+    """
+    Create the runtime directories under DATA_DIR. Called once per deploy or boot
+    (`manage.py prepare_data_dirs`, gunicorn's `on_starting` hook), not on import.
+    """
+    for path in (settings.DATA_DIR, settings.BUCKETS_DIR, settings.LOGS_DIR, settings.SESSIONS_DIR,
+                 settings.IMPORT_ROOT):
+        path.mkdir(parents=True, exist_ok=True)
@@ -0,0 +1,10 @@
+import logging.handlers
+import os
+
+
+class RotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """RotatingFileHandler that creates the log directory when the file is first opened."""
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
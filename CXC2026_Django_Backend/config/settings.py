@@ -3,6 +3,7 @@ import secrets
 from pathlib import Path
 
 import dj_database_url
+from corsheaders.defaults import default_headers
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -23,7 +24,6 @@ else:
 
 
 INSTALLED_APPS = [
-    "daphne",                         # must be first — overrides runserver with ASGI
     "django.contrib.auth",
     "django.contrib.contenttypes",
     "django.contrib.sessions",
@@ -33,15 +33,54 @@ INSTALLED_APPS = [
     "api",
 ]
 
+# Daphne only provides the ASGI `runserver`; production is served by gunicorn/uvicorn
+# (gunicorn.conf.py). Loading it imports Twisted and installs its reactor, which dominates
+# worker boot time, so it is on by default only in development.
+ASGI_RUNSERVER = os.environ.get("ASGI_RUNSERVER", "1" if DEBUG else "0") == "1"
+if ASGI_RUNSERVER:
+    INSTALLED_APPS.insert(0, "daphne")    # must be first — overrides runserver with ASGI
+
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "api.middleware.CompressionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
+    "api.profiling.ProfilingMiddleware",  # last: wraps only the view; inert unless enabled
 ]
 
 ROOT_URLCONF = "config.urls"
 
+# On-demand sampling profiler (api/profiling.py). Output: DATA_DIR/logs/profiles/*.folded
+PROFILING_ENABLED = os.environ.get("PROFILING_ENABLED") == "1"
+# Fraction of requests / WebSocket connections profiled without a token.
+PROFILING_SAMPLE_RATE = float(os.environ.get("PROFILING_SAMPLE_RATE", "0"))
+PROFILING_INTERVAL_MS = 5
+PROFILING_MAX_SECONDS = 30
+PROFILING_MAX_CONCURRENT = 2
+PROFILING_TOKEN_MAX_AGE = 3600
+
+# Response compression (api.middleware.CompressionMiddleware). zstd and br are
+# used only when `zstandard` / `brotli` are installed (`pip install .[fast]`).
+API_COMPRESSION_ENCODINGS = ["zstd", "br", "gzip"]
+API_COMPRESSION_MIN_SIZE = 512
+API_COMPRESSION_CACHE_MIN_SIZE = 16 * 1024
+# Login / register / refresh responses carry tokens; don't compress them (BREACH).
+API_COMPRESSION_EXCLUDE_PATHS = ["/api/auth/"]
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    # Compressed response bodies keyed by a digest of the uncompressed body.
+    "compression": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "compression",
+        "TIMEOUT": 600,
+        "OPTIONS": {"MAX_ENTRIES": 256},
+    },
+}
+
 TEMPLATES = [
     {
         "BACKEND": "django.template.backends.django.DjangoTemplates",
@@ -58,24 +97,29 @@ TEMPLATES = [
 WSGI_APPLICATION = "config.wsgi.application"
 ASGI_APPLICATION = "config.asgi.application"
 
-CHANNEL_LAYERS = {
-    "default": {
-        "BACKEND": "channels.layers.InMemoryChannelLayer",
+# The in-memory layer only relays between consumers in one process. Multi-worker
+# deployments (WEB_CONCURRENCY > 1, see gunicorn.conf.py) need Redis.
+if os.environ.get("REDIS_URL"):
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels_redis.core.RedisChannelLayer",
+            "CONFIG": {"hosts": [os.environ["REDIS_URL"]]},
+        }
+    }
+else:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels.layers.InMemoryChannelLayer",
+        }
     }
-}
 
-# Runtime data directory — override via DATA_DIR env var (e.g. for Docker volume mounts)
+# Runtime data directory — override via DATA_DIR env var (e.g. for Docker volume mounts).
+# The directories are created by `manage.py prepare_data_dirs` and gunicorn's on_starting
+# hook (config/data_dirs.py), not here, so importing settings has no filesystem side effects.
 DATA_DIR = Path(os.environ.get("DATA_DIR", str(BASE_DIR / "data")))
-DATA_DIR.mkdir(parents=True, exist_ok=True)
-
 BUCKETS_DIR = DATA_DIR / "buckets"
-BUCKETS_DIR.mkdir(exist_ok=True)
-
 LOGS_DIR = DATA_DIR / "logs"
-LOGS_DIR.mkdir(exist_ok=True)
-
 SESSIONS_DIR = DATA_DIR / "sessions"
-SESSIONS_DIR.mkdir(exist_ok=True)
 
 # File-based session store — persists in DATA_DIR/sessions/ (on the Docker volume)
 SESSION_ENGINE = "django.contrib.sessions.backends.file"
@@ -84,6 +128,38 @@ SESSION_FILE_PATH = SESSIONS_DIR
 MEDIA_ROOT = BUCKETS_DIR
 MEDIA_URL = "/media/"
 
+# Bulk AI-profile import (api/importer.py). The admin API only reads manifests
+# and image directories below IMPORT_ROOT.
+IMPORT_ROOT = DATA_DIR / "imports"
+IMPORT_IMAGE_MAX_SIZE = 2048  # px, long side
+# Unfinished jobs that have not reported progress for this long are marked failed.
+IMPORT_JOB_STALE_SECONDS = int(os.environ.get("IMPORT_JOB_STALE_SECONDS", "900"))
+
+# Focal-point image renditions (api/renditions.py), cached on disk with LRU eviction.
+RENDITION_CACHE_DIR = DATA_DIR / "renditions"
+RENDITION_CACHE_MAX_BYTES = int(os.environ.get("RENDITION_CACHE_MAX_BYTES", str(1024**3)))
+# Widths renditions are rendered at; a requested `w` is rounded up to the next one.
+RENDITION_WIDTHS = (64, 128, 256, 384, 512, 768, 1024, 1536, 2048)
+
+# WebSocket relay flow control and keepalive (api/relay.py). Rates are per second.
+WS_RATE_LIMIT_ENABLED = os.environ.get("WS_RATE_LIMIT_ENABLED", "1") == "1"
+WS_CONN_MSG_RATE, WS_CONN_MSG_BURST = 10, 30
+WS_CONN_BYTE_RATE, WS_CONN_BYTE_BURST = 32 * 1024, 128 * 1024
+WS_USER_MSG_RATE, WS_USER_MSG_BURST = 20, 60
+WS_USER_BYTE_RATE, WS_USER_BYTE_BURST = 64 * 1024, 256 * 1024
+WS_MAX_FRAME_BYTES = 64 * 1024
+WS_MAX_DROPPED = 50  # consecutive rate-limited frames before the socket is closed
+WS_PING_INTERVAL = 25
+WS_PONG_TIMEOUT = 10
+# Application-level pings to agents too; only for agents that answer {"type": "pong"}.
+WS_AGENT_KEEPALIVE = os.environ.get("WS_AGENT_KEEPALIVE", "0") == "1"
+WS_IDLE_TIMEOUT = 15 * 60
+
+# Materialized Discover feeds (api/feeds.py): ranked candidates kept per viewer.
+FEED_SIZE = int(os.environ.get("FEED_SIZE", "500"))
+# build_feeds rebuilds a feed that seen-marking and trimming have drained below this many entries.
+FEED_LOW_WATER = int(os.environ.get("FEED_LOW_WATER", str(FEED_SIZE // 5)))
+
 if IS_HEROKU_APP:
     DATABASES = {
         "default": dj_database_url.config(
@@ -127,6 +203,23 @@ REST_FRAMEWORK = {
     ],
 }
 
+# JSON backend for API responses and request bodies: "stdlib" (DRF default) or
+# "orjson" (faster; requires the optional `orjson` package — `pip install .[fast]`).
+# orjson output differs only in float formatting (1e-7 for 1e-07, null for NaN);
+# see api/renderers.py.
+# Compare the two with `./manage.py bench_json`.
+API_JSON_BACKEND = os.environ.get("API_JSON_BACKEND", "stdlib")
+if API_JSON_BACKEND == "orjson":
+    REST_FRAMEWORK["DEFAULT_RENDERER_CLASSES"] = [
+        "api.renderers.ORJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ]
+    REST_FRAMEWORK["DEFAULT_PARSER_CLASSES"] = [
+        "api.parsers.ORJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ]
+
 
 # CORS: allow all locally; in production restrict via env var.
 if IS_HEROKU_APP:
@@ -135,6 +228,9 @@ if IS_HEROKU_APP:
     ).split(",")
 else:
     CORS_ALLOW_ALL_ORIGINS = True
+# Conditional profile edits: the browser reads ETag and sends If-Match.
+CORS_EXPOSE_HEADERS = ["ETag"]
+CORS_ALLOW_HEADERS = (*default_headers, "if-match")
 
 
 LOGGING = {
@@ -151,8 +247,9 @@ LOGGING = {
     "handlers": {
         "console": {"class": "logging.StreamHandler", "formatter": "simple"},
         "file": {
-            "class": "logging.handlers.RotatingFileHandler",
+            "class": "config.log_handlers.RotatingFileHandler",
             "filename": LOGS_DIR / "django.log",
+            "delay": True,
             "maxBytes": 10 * 1024 * 1024,  # 10 MB
             "backupCount": 5,
             "formatter": "verbose",
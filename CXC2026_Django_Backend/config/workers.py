@@ -0,0 +1,21 @@
+"""
+Gunicorn worker class for serving the ASGI app (HTTP + WebSockets).
+
+Each worker runs its own uvicorn event loop; gunicorn provides the shared
+SO_REUSEPORT socket, preloading, graceful reload (SIGHUP) and recycling.
+See gunicorn.conf.py.
+"""
+from uvicorn_worker import UvicornWorker
+
+
+class ASGIWorker(UvicornWorker):
+    CONFIG_KWARGS = {
+        "loop": "auto",
+        "http": "auto",
+        # Django's ASGI handler doesn't implement the lifespan protocol.
+        "lifespan": "off",
+        # Protocol-level keepalive so dead WebSocket peers are dropped and
+        # their channel-layer group memberships released.
+        "ws_ping_interval": 20.0,
+        "ws_ping_timeout": 20.0,
+    }
@@ -18,30 +18,35 @@ import os
 # (IPv4 connections will still work so long as `IPV6_V6ONLY` hasn't been enabled.)
 bind = ["[::]:{}".format(os.environ.get("PORT", 5006))]
 
-# The default `sync` worker is more suited to CPU/network-bandwidth bound workloads, so we
-# instead use the thread based worker type for improved support of blocking I/O workloads:
-# https://docs.gunicorn.org/en/stable/design.html#server-model
-#
-# If you need to further improve the performance of blocking I/O workloads, you may want to
-# try the `gevent` worker type, though you will need to disable `preload_app`, enable DB
-# connecting pooling, and be aware that gevent's monkey patching can break some packages.
-#
-# Note: When changing the number of dynos/workers/threads you will want to make sure you
-# do not exceed the maximum number of connections to external services such as DBs:
-# https://devcenter.heroku.com/articles/python-concurrency-and-database-connections
-worker_class = "gthread"
+# The app is served over ASGI (HTTP and the WebSocket relay), so each worker process runs
+# its own uvicorn event loop instead of the WSGI `gthread` pool. All workers accept from the
+# same listening socket (see `reuse_port` below), so throughput scales with CPU cores.
+# See config/workers.py.
+wsgi_app = "config.asgi:application"
+worker_class = "config.workers.ASGIWorker"
 
 # gunicorn will start this many worker processes. The Python buildpack automatically sets a
 # default for WEB_CONCURRENCY at dyno boot, based on the number of CPUs and available RAM:
 # https://devcenter.heroku.com/articles/python-concurrency
-workers = os.environ.get("WEB_CONCURRENCY", 1)
+workers = int(os.environ.get("WEB_CONCURRENCY", 1))
+
+# The WebSocket relay pairs a browser and an agent through a channel-layer group. The
+# in-memory layer only reaches consumers in the same process, so a browser and agent landing
+# on different workers would never see each other's messages. More than one worker therefore
+# requires the Redis channel layer (enabled by setting REDIS_URL, see config/settings.py).
+# on_starting logs a warning when this caps WEB_CONCURRENCY.
+if not os.environ.get("REDIS_URL"):
+    workers = 1
 
-# Each `gthread` worker process will use a pool of this many threads.
-threads = 5
+# Recycle each worker after this many requests (plus jitter so they don't all restart at
+# once), bounding the effect of slow memory growth. Restarts are graceful: in-flight requests
+# finish and the other workers keep serving.
+max_requests = 2000
+max_requests_jitter = 200
 
-# Workers silent for more than this many seconds are killed and restarted.
-# Note: This only affects the maximum request time when using the `sync` worker.
-# For all other worker types it acts only as a worker heartbeat timeout.
+# Workers silent for more than this many seconds are killed and restarted. For the ASGI
+# worker this is a heartbeat: a worker whose event loop is blocked stops notifying the
+# arbiter and gets replaced. Send SIGHUP to the master for a graceful reload of all workers.
 timeout = 20
 
 # After receiving a restart signal, workers have this much time to finish serving requests.
@@ -63,6 +68,7 @@ if os.environ.get("ENVIRONMENT") == "development":
 else:
     # Load the app before the worker processes are forked, to reduce memory usage and boot times.
     # We don't enable this in development, since it's incompatible with `reload = True`.
+    # Note: the forked workers share no DB connections — Django opens them lazily per process.
     preload_app = True
 
     # Use `SO_REUSEPORT` on the listening socket, which allows for more even request
@@ -74,6 +80,37 @@ else:
 
     # Trust the `X-Forwarded-Proto` header set by the Heroku Router during TLS termination,
     # (https://devcenter.heroku.com/articles/http-routing#heroku-headers) so that HTTPS requests
-    # are correctly marked as secure. This allows the WSGI app (in our case, Django) to distinguish
+    # are correctly marked as secure. This allows the app (in our case, Django) to distinguish
     # between HTTP and HTTPS requests for features like HTTP->HTTPS URL redirection.
     forwarded_allow_ips = "*"
+
+
+def on_starting(server):
+    # Runs once in the master before any worker starts; creates DATA_DIR and its
+    # subdirectories so the app itself never touches the filesystem at import.
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+    from config.data_dirs import ensure_data_dirs
+    ensure_data_dirs()
+
+    requested = int(os.environ.get("WEB_CONCURRENCY", 1))
+    if not os.environ.get("REDIS_URL") and requested > 1:
+        server.log.warning("REDIS_URL is not set; running 1 worker instead of %s so the in-memory "
+                           "channel layer can relay WebSocket messages.", requested)
+
+
+def when_ready(server):
+    # With `preload_app` the app is imported in the master; finish importing the URLconf,
+    # views and consumers there too so every forked worker shares them and the first
+    # request on each worker doesn't pay for those imports.
+    if server.cfg.preload_app:
+        from config.asgi import warm_up
+        warm_up()
+
+
+def post_worker_init(worker):
+    worker.log.info("ASGI worker %s ready", worker.pid)
+
+
+def worker_abort(worker):
+    # Called when the heartbeat `timeout` expires; log it so stuck workers are visible.
+    worker.log.warning("ASGI worker %s timed out and is being replaced", worker.pid)
@@ -1,7 +1,25 @@
-import { useState, useEffect } from "react";
+import { useState, useEffect, useLayoutEffect, useRef } from "react";
+
+// Mirrors RENDITION_WIDTHS / ASPECTS in the backend (api/renditions.py), which snaps
+// requests to these anyway; asking for the snapped values keeps browser cache keys stable.
+const RENDITION_WIDTHS = [64, 128, 256, 384, 512, 768, 1024, 1536, 2048];
+const ASPECTS: [number, number][] = [
+  [1, 5], [1, 4], [1, 3], [1, 2], [9, 16], [2, 3], [3, 4], [4, 5], [1, 1],
+  [5, 4], [4, 3], [3, 2], [16, 9], [2, 1], [3, 1], [4, 1], [5, 1],
+];
+
+function renditionParams(w: number, h: number): string {
+  const px = w * window.devicePixelRatio;
+  const width = RENDITION_WIDTHS.find((step) => step >= px) ?? RENDITION_WIDTHS[RENDITION_WIDTHS.length - 1];
+  const distance = ([aw, ah]: [number, number]) => Math.abs(Math.log(aw / ah / (w / h)));
+  const [aw, ah] = ASPECTS.reduce((best, a) => (distance(a) < distance(best) ? a : best));
+  return `w=${width}&ar=${aw}:${ah}`;
+}
 
 interface Props {
   urls: string[];
+  /** Server-side crops parallel to `urls` (profile.*_rendition_urls); sized to the element. */
+  renditionUrls?: string[];
   objectX?: number;
   objectY?: number;
   alt?: string;
@@ -12,6 +30,7 @@ interface Props {
 
 export function ImageSlideshow({
   urls,
+  renditionUrls,
   objectX = 50,
   objectY = 50,
   alt = "",
@@ -20,6 +39,19 @@ export function ImageSlideshow({
   fallback,
 }: Props) {
   const [index, setIndex] = useState(0);
+  const ref = useRef<HTMLImageElement>(null);
+  const [box, setBox] = useState<{ w: number; h: number } | null>(null);
+  const sizedToBox = !!renditionUrls && renditionUrls.length === urls.length;
+
+  useLayoutEffect(() => {
+    const el = ref.current;
+    if (!el || !sizedToBox) return;
+    const measure = () => setBox({ w: el.clientWidth, h: el.clientHeight });
+    measure();
+    const observer = new ResizeObserver(measure);
+    observer.observe(el);
+    return () => observer.disconnect();
+  }, [sizedToBox, urls.length, index]);
 
   useEffect(() => {
     if (urls.length <= 1) return;
@@ -31,10 +63,18 @@ export function ImageSlideshow({
 
   if (!urls.length) return <>{fallback}</>;
 
+  let src: string | undefined = urls[index];
+  if (sizedToBox) {
+    // Ask for the element's device pixels, cropped to its aspect around the focal point,
+    // rounded to the sizes the server renders so resizing doesn't mint a rendition per pixel.
+    src = box && box.w && box.h ? `${renditionUrls![index]}&${renditionParams(box.w, box.h)}` : undefined;
+  }
+
   return (
     <img
+      ref={ref}
       key={urls[index]}
-      src={urls[index]}
+      src={src}
       alt={alt}
       className={className}
       style={{ objectPosition: `${objectX}% ${objectY}%` }}
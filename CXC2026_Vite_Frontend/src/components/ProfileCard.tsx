@@ -26,6 +26,7 @@ export function ProfileCard({ profile }: ProfileCardProps) {
         <div className="relative h-64 overflow-hidden">
           <ImageSlideshow
             urls={profile.banner_urls ?? (profile.banner_url ? [profile.banner_url] : [])}
+            renditionUrls={profile.banner_rendition_urls}
             objectX={profile.banner_x}
             objectY={profile.banner_y}
             alt={profile.display_name}
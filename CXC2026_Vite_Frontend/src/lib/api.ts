@@ -47,7 +47,8 @@ async function request(path: string, options: RequestInit = {}): Promise<Respons
  *
  * @param profileId  The Profile.id of the AI being chatted with
  * @param onMessage  Called with every parsed JSON message from the agent
- * @param onClose    Called when the socket closes (optional)
+ * @param onClose    Called when the socket closes (optional). Code 4008 = rate limited,
+ *                   4009 = idle, 4010 = keepalive timeout.
  * @returns The WebSocket instance — call .send(JSON.stringify({...})) to talk to the agent
  */
 export function createChatSocket(
@@ -60,7 +61,13 @@ export function createChatSocket(
 
   ws.onmessage = (event) => {
     try {
-      onMessage(JSON.parse(event.data as string));
+      const data = JSON.parse(event.data as string);
+      // Server keepalive: unanswered pings get the socket closed as dead.
+      if (data?.type === 'ping') {
+        ws.send('{"type":"pong"}');
+        return;
+      }
+      onMessage(data);
     } catch {
       onMessage({ type: 'raw', message: event.data });
     }
@@ -71,6 +78,9 @@ export function createChatSocket(
   return ws;
 }
 
+// ETag of the last /profiles/me/ response, sent back as If-Match on save.
+let myProfileEtag: string | null = null;
+
 export const api = {
   async register(email: string, password: string) {
     const res = await fetch(`${BASE_URL}/auth/register/`, {
@@ -104,6 +114,50 @@ export const api = {
     return res.json();
   },
 
+  /** A page of your Discover feed, best matches first; pass `next` back as `cursor` for more. */
+  async getFeed(
+    cursor: string | null = null,
+    filters: { q?: string; type?: 'human' | 'ai'; interests?: string[] } = {},
+    limit = 24,
+  ) {
+    const params = new URLSearchParams({ limit: String(limit) });
+    if (cursor) params.set('cursor', cursor);
+    if (filters.q) params.set('q', filters.q);
+    if (filters.type) params.set('type', filters.type);
+    if (filters.interests?.length) params.set('interests', filters.interests.join(','));
+    const res = await request(`/feed/?${params}`);
+    if (!res.ok) return { results: [], next: null };
+    return res.json() as Promise<{ results: Record<string, unknown>[]; next: string | null }>;
+  },
+
+  /** Mark profiles as seen so they drop out of your feed. */
+  async markSeen(ids: (string | number)[]) {
+    if (!ids.length) return;
+    await request('/feed/seen/', { method: 'POST', body: JSON.stringify({ ids: ids.map(Number) }) });
+  },
+
+  /** Profiles changed/deleted since `cursor` (0 = full snapshot). Page until `has_more` is false. */
+  async syncProfiles(cursor = 0) {
+    const res = await request(`/profiles/sync/?since=${cursor}`);
+    if (!res.ok) return null;
+    return res.json() as Promise<{
+      changed: Record<string, unknown>[];
+      deleted: number[];
+      cursor: number;
+      has_more: boolean;
+    }>;
+  },
+
+  /** Up to 100 profiles in one request; keys missing from `results` are listed in `errors`. */
+  async getProfilesBatch(ids: (string | number)[]) {
+    const res = await request(`/profiles/batch/?ids=${ids.join(',')}`);
+    if (!res.ok) return { results: {}, errors: {} };
+    return res.json() as Promise<{
+      results: Record<string, Record<string, unknown>>;
+      errors: Record<string, string>;
+    }>;
+  },
+
   async getProfile(id: string | number) {
     const res = await request(`/profiles/${id}/`);
     if (!res.ok) return null;
@@ -113,16 +167,23 @@ export const api = {
   async getMyProfile() {
     const res = await request('/profiles/me/');
     if (!res.ok) return null;
+    myProfileEtag = res.headers.get('ETag');
     return res.json();
   },
 
+  /** Saves are conditional on the profile loaded last; 412 means it was edited elsewhere. */
   async saveMyProfile(data: Record<string, unknown>) {
     const res = await request('/profiles/me/', {
       method: 'PUT',
       body: JSON.stringify(data),
+      headers: myProfileEtag ? { 'If-Match': myProfileEtag } : {},
     });
     const json = await res.json();
+    if (res.status === 412) {
+      return { data: null, error: `${json.detail} Reload the page to see the latest version.` };
+    }
     if (!res.ok) return { data: null, error: Object.values(json).flat().join(' ') };
+    myProfileEtag = res.headers.get('ETag');
     return { data: json, error: null };
   },
 
@@ -1,4 +1,4 @@
-import { useState, useEffect } from "react";
+import { useState, useEffect, useMemo } from "react";
 import { motion, AnimatePresence } from "framer-motion";
 import { FaSearch, FaFilter, FaSlidersH } from "react-icons/fa";
 import { HiSparkles } from "react-icons/hi2";
@@ -21,39 +21,57 @@ const filterMap: Record<string, string[]> = {
 export default function DiscoverPage() {
   const [profiles, setProfiles] = useState<Profile[]>([]);
   const [loading, setLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const [lastPage, setLastPage] = useState<Profile[]>([]);
   const [searchQuery, setSearchQuery] = useState("");
   const [activeFilter, setActiveFilter] = useState("All");
   const [typeFilter, setTypeFilter] = useState("All");
   const [sortBy, setSortBy] = useState<"compatibility" | "newest">("compatibility");
 
+  // Filters run on the server, so matches beyond the pages loaded so far still show up.
+  const filters = useMemo(
+    () => ({
+      q: searchQuery.trim(),
+      type: typeFilter === "Human" ? ("human" as const) : typeFilter === "AI" ? ("ai" as const) : undefined,
+      interests: filterMap[activeFilter],
+    }),
+    [searchQuery, activeFilter, typeFilter],
+  );
+
   useEffect(() => {
-    async function fetchProfiles() {
-      const data = await api.getProfiles();
-      setProfiles(data as Profile[]);
+    let cancelled = false;
+    const timer = setTimeout(async () => {
+      const page = await api.getFeed(null, filters);
+      if (cancelled) return;
+      setProfiles(page.results as unknown as Profile[]);
+      setLastPage(page.results as unknown as Profile[]);
+      setNextCursor(page.next);
       setLoading(false);
-    }
-    fetchProfiles();
-  }, []);
-
-  const filtered = profiles
-    .filter((p) => {
-      const matchesSearch =
-        !searchQuery ||
-        p.display_name.toLowerCase().includes(searchQuery.toLowerCase()) ||
-        p.location.toLowerCase().includes(searchQuery.toLowerCase()) ||
-        p.interests.some((i) => i.toLowerCase().includes(searchQuery.toLowerCase()));
-
-      const matchesType =
-        typeFilter === "All" ||
-        (typeFilter === "Human" && p.type === "human") ||
-        (typeFilter === "AI" && p.type === "ai");
-
-      if (activeFilter === "All") return matchesSearch && matchesType;
-
-      const tags = filterMap[activeFilter] || [];
-      return matchesSearch && matchesType && p.interests.some((i) => tags.includes(i));
-    })
-    .sort((a, b) => (sortBy === "compatibility" ? b.compatibility_score - a.compatibility_score : 0));
+    }, filters.q ? 300 : 0);
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [filters]);
+
+  // Loading the next page means the current ones were browsed past: mark
+  // them seen so the feed shows new people next visit.
+  async function loadMore() {
+    if (!nextCursor || loadingMore) return;
+    setLoadingMore(true);
+    api.markSeen(lastPage.map((p) => p.id));
+    const page = await api.getFeed(nextCursor, filters);
+    const results = page.results as unknown as Profile[];
+    setProfiles((prev) => [...prev, ...results]);
+    setLastPage(results);
+    setNextCursor(page.next);
+    setLoadingMore(false);
+  }
+
+  const filtered = [...profiles].sort((a, b) =>
+    sortBy === "compatibility" ? b.compatibility_score - a.compatibility_score : Number(b.id) - Number(a.id),
+  );
 
   return (
     <div className="min-h-screen pt-4 pb-20">
@@ -171,6 +189,18 @@ export default function DiscoverPage() {
           </AnimatePresence>
         )}
 
+        {!loading && nextCursor && (
+          <div className="flex justify-center mt-10">
+            <button
+              onClick={loadMore}
+              disabled={loadingMore}
+              className="px-6 py-3 glass-panel rounded-xl hover:border-[#00ffff]/30 transition-all text-sm font-body text-gray-400 disabled:opacity-50"
+            >
+              {loadingMore ? "Loading..." : "Load more"}
+            </button>
+          </div>
+        )}
+
         {!loading && filtered.length === 0 && (
           <motion.div
             initial={{ opacity: 0 }}
@@ -54,6 +54,7 @@ export default function ProfileDetailPage() {
       <div className="relative h-[50vh] sm:h-[60vh] overflow-hidden">
         <ImageSlideshow
           urls={profile.banner_urls ?? (profile.banner_url ? [profile.banner_url] : [])}
+          renditionUrls={profile.banner_rendition_urls}
           objectX={profile.banner_x}
           objectY={profile.banner_y}
           alt={profile.display_name}